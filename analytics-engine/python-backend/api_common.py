@@ -0,0 +1,392 @@
+"""
+Shared /execute Request Handling
+Request parsing, error mapping and response bodies for /execute and /execute/batch,
+used by both the Flask server (api_server.py) and the ASGI server (async_api_server.py).
+
+- Each server only reads the JSON body, awaits (or calls) the executor and wraps the
+  bodies built here in its own Response type, so the two APIs cannot drift apart
+- Stream and batch bodies are produced by one encoder each; the sync and async
+  generators differ only in how they iterate the executor's output
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import json
+import sys
+import time
+
+from schema_introspection import _normalize_connection_string
+from query_executor import RESULT_FORMATS, DEFAULT_MAX_ROWS
+from query_control import check_query_id, new_query_id, resolve_timeout, QueryTimeoutError, QueryCancelledError
+from query_templates import get_template
+from batch_executor import prepare_batch, batch_concurrency, execute_error_status
+from engine_registry import configure_pool
+from replica_routing import configure_replicas
+from cost_gate import resolve_cost_gate, QueryCostError, QueryQueuedError
+from approximate import resolve_sample_rate
+
+STREAM_MEDIA_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+
+class ExecuteRequestError(ValueError):
+    """Malformed /execute or /execute/batch request (400)"""
+    pass
+
+
+def page_options(data: dict) -> dict:
+    """
+    max_rows / page_size / page_token / fetch_limit for execute_sql_query.
+
+    EXECUTE_MAX_ROWS is the ceiling for max_rows. A request without paging options
+    is capped with fetch_limit instead; a page_token alone (continuing such a
+    response) fetches the next EXECUTE_MAX_ROWS rows.
+    """
+    max_rows = data.get('max_rows')
+    page_size = data.get('page_size')
+    page_token = data.get('page_token')
+    fetch_limit = None
+    if DEFAULT_MAX_ROWS > 0:
+        if max_rows is None and page_size is None and page_token is None:
+            fetch_limit = DEFAULT_MAX_ROWS
+        elif max_rows is None and page_size is None:
+            page_size = DEFAULT_MAX_ROWS
+        else:
+            max_rows = DEFAULT_MAX_ROWS if max_rows is None else min(max_rows, DEFAULT_MAX_ROWS)
+    return {
+        "max_rows": max_rows,
+        "page_size": page_size,
+        "page_token": page_token,
+        "fetch_limit": fetch_limit,
+    }
+
+
+def apply_pool_config(connection_string: str, data: dict):
+    """Apply optional per-datasource pool sizing sent as "pool": {"min_size": 1, "max_size": 20, ...}"""
+    pool = data.get('pool')
+    if pool:
+        configure_pool(
+            connection_string,
+            min_size=pool.get('min_size'),
+            max_size=pool.get('max_size'),
+            pool_size=pool.get('pool_size'),
+            max_overflow=pool.get('max_overflow'),
+            pool_timeout=pool.get('pool_timeout')
+        )
+
+
+def apply_replica_config(connection_string: str, data: dict):
+    """Apply optional read replicas sent as "replicas": ["mysql://...", ...] (plus "replica_strategy" / "replica_max_lag")"""
+    replicas = data.get('replicas')
+    if replicas is not None:
+        configure_replicas(connection_string, replicas, data.get('replica_strategy'), data.get('replica_max_lag'))
+
+
+def _connection_string(data: Optional[dict]) -> str:
+    """connection_string of a request body (400 when missing)"""
+    if not isinstance(data, dict):
+        raise ExecuteRequestError("JSON object body is required")
+    connection_string = data.get('connection_string')
+    if not connection_string:
+        raise ExecuteRequestError("connection_string is required")
+    return connection_string
+
+
+def _apply_datasource_options(connection_string: str, data: dict) -> str:
+    """Normalize the connection string and apply the request's pool and replica options"""
+    # Normalize connection string to handle special characters in password
+    normalized_connection_string = _normalize_connection_string(connection_string)
+    apply_pool_config(normalized_connection_string, data)
+    try:
+        apply_replica_config(normalized_connection_string, data)
+    except ValueError as e:
+        raise ExecuteRequestError(str(e)) from e
+    return normalized_connection_string
+
+
+def parse_execute_request(data: Optional[dict]) -> Dict:
+    """
+    Validate an /execute body and apply its datasource options.
+
+    Returns:
+        {"connection_string", "query", "query_id", "result_format",
+         "stream_format" (None unless streaming), "stream_kwargs", "execute_kwargs"}
+
+    Raises:
+        ExecuteRequestError: malformed request (400)
+        TemplateNotFoundError: streamed template_id is unknown (404)
+    """
+    connection_string = _connection_string(data)
+    query = data.get('query')
+    template_id = data.get('template_id')
+    if not query and not template_id:
+        raise ExecuteRequestError("query or template_id is required")
+
+    result_format = data.get('format', 'rows')
+    if result_format not in RESULT_FORMATS:
+        raise ExecuteRequestError(f"format must be one of: {', '.join(RESULT_FORMATS)}")
+
+    for option in ('max_rows', 'page_size'):
+        value = data.get(option)
+        if value is not None and (type(value) is not int or value < 1):
+            raise ExecuteRequestError(f"{option} must be a positive integer")
+
+    try:
+        query_id = check_query_id(data['query_id']) if data.get('query_id') else new_query_id()
+        timeout = resolve_timeout(data.get('timeout'))
+        cost_gate = resolve_cost_gate(data.get('cost_gate'))
+        sample_rate = resolve_sample_rate(data.get('approximate'))
+    except ValueError as e:
+        raise ExecuteRequestError(str(e)) from e
+
+    connection_string = _apply_datasource_options(connection_string, data)
+
+    stream_format = None
+    if data.get('stream'):
+        stream_format = 'ndjson' if data.get('stream_format', 'json') == 'ndjson' else 'json'
+        if template_id:
+            # Streams bind the template's SQL directly
+            query = get_template(template_id).sql
+
+    return {
+        "connection_string": connection_string,
+        "query": query,
+        "query_id": query_id,
+        "result_format": result_format,
+        "stream_format": stream_format,
+        "stream_kwargs": {
+            "chunk_size": data.get('chunk_size'),
+            "timeout": data.get('timeout'),
+            "query_id": query_id,
+            "params": data.get('params'),
+        },
+        "execute_kwargs": {
+            "use_cache": data.get('use_cache', True),
+            "result_format": result_format,
+            "timeout": timeout,
+            "query_id": query_id,
+            "params": data.get('params'),
+            "template_id": template_id,
+            "cost_gate": cost_gate,
+            "sample_rate": sample_rate,
+            "query_id_generated": not data.get('query_id'),
+            **page_options(data),
+        },
+    }
+
+
+def parse_batch_request(data: Optional[dict]) -> Tuple[str, List[Dict], int]:
+    """
+    Validate an /execute/batch body and apply its datasource options.
+
+    Returns:
+        (normalized connection string, prepared queries, max in-flight queries)
+    """
+    connection_string = _apply_datasource_options(_connection_string(data), data)
+    try:
+        prepared = prepare_batch(data.get('queries'))
+        concurrency = batch_concurrency(connection_string, data.get('max_concurrency'))
+    except ValueError as e:
+        raise ExecuteRequestError(str(e)) from e
+    return connection_string, prepared, concurrency
+
+
+def execute_error(e: Exception, query_id: Optional[str]) -> Tuple[Dict, int]:
+    """(JSON body, HTTP status) of an /execute request that raised e"""
+    if isinstance(e, ExecuteRequestError):
+        return {"error": str(e)}, 400
+    status, error = execute_error_status(e)
+    if isinstance(e, QueryQueuedError):
+        return {
+            "success": True,
+            "status": "running",
+            "query_id": query_id,
+            "job_id": e.job_id,
+            "estimate": e.estimate,
+            "details": str(e)
+        }, 202
+
+    if isinstance(e, QueryTimeoutError):
+        print(f"[PYTHON API] Query {query_id} timed out: {str(e)}", file=sys.stderr)
+    elif isinstance(e, QueryCancelledError):
+        print(f"[PYTHON API] Query {query_id} cancelled")
+    elif status == 500:
+        print(f"[PYTHON API] Error: {str(e)}", file=sys.stderr)
+
+    body = {"error": error}
+    if isinstance(e, (QueryTimeoutError, QueryCancelledError, QueryCostError)):
+        body["query_id"] = query_id
+    if isinstance(e, QueryCostError):
+        body["estimate"] = e.estimate
+    body["details"] = str(e)
+    return body, status
+
+
+def execute_payload(page, result_format: str, query_id: str) -> Tuple[Any, Dict[str, str]]:
+    """
+    Body and headers of a successful /execute response.
+
+    Returns:
+        (Arrow IPC bytes, paging headers) for the arrow format, else (JSON object, {})
+    """
+    if not isinstance(page, dict) or "next_page_token" not in page:
+        # No row cap configured and no paging requested: the whole result
+        page = {"results": page, "truncated": False, "next_page_token": None}
+    results = page["results"]
+    paging = {"truncated": page["truncated"], "next_page_token": page["next_page_token"]}
+    for extra in ("approximate", "rollup", "mirror"):
+        if extra in page:
+            paging[extra] = page[extra]
+    if page["truncated"]:
+        print(f"[PYTHON API] Result truncated (more rows available{', next page token issued' if page['next_page_token'] else ''})")
+
+    if result_format == 'arrow':
+        print(f"[PYTHON API] Query executed successfully: {len(results)} bytes of Arrow IPC returned")
+        headers = {'X-Query-Id': query_id, 'X-Truncated': 'true' if page["truncated"] else 'false'}
+        if page["next_page_token"]:
+            headers['X-Next-Page-Token'] = page["next_page_token"]
+        return results, headers
+
+    if result_format == 'columnar':
+        row_count = len(results["data"][0]) if results["data"] else 0
+        print(f"[PYTHON API] Query executed successfully: {row_count} rows returned (columnar)")
+        return {
+            "success": True,
+            "query_id": query_id,
+            "format": "columnar",
+            **results,
+            "row_count": row_count,
+            **paging
+        }, {}
+
+    print(f"[PYTHON API] Query executed successfully: {len(results)} rows returned")
+    return {
+        "success": True,
+        "query_id": query_id,
+        "results": results,
+        "row_count": len(results),
+        **paging
+    }, {}
+
+
+class _StreamEncoder:
+    """
+    Text of a streamed /execute body.
+
+    json: {"success": true, "results": [...], "row_count": N} written one chunk at a time
+    ndjson: a columns header line, one JSON array per row, then a row_count trailer line
+    """
+
+    def __init__(self, columns: List[str], stream_format: str):
+        self.columns = columns
+        self.ndjson = stream_format == 'ndjson'
+        self.row_count = 0
+
+    def header(self) -> str:
+        if self.ndjson:
+            return json.dumps({"columns": self.columns}) + '\n'
+        return '{"success": true, "results": ['
+
+    def chunk(self, rows) -> str:
+        if not rows:
+            return ''
+        if self.ndjson:
+            text = ''.join(json.dumps(row, default=str) + '\n' for row in rows)
+        else:
+            text = (',' if self.row_count else '') + ','.join(
+                json.dumps(dict(zip(self.columns, row)), default=str) for row in rows
+            )
+        self.row_count += len(rows)
+        return text
+
+    def error(self, e: Exception) -> str:
+        # Headers are already sent; report the failure inside the body
+        print(f"[PYTHON API] Streaming error: {str(e)}", file=sys.stderr)
+        if self.ndjson:
+            return json.dumps({"row_count": self.row_count, "error": "Query execution failed", "details": str(e)}) + '\n'
+        return f'], "row_count": {self.row_count}, "error": "Query execution failed", "details": {json.dumps(str(e))}}}'
+
+    def trailer(self) -> str:
+        print(f"[PYTHON API] Query streamed successfully: {self.row_count} rows returned")
+        if self.ndjson:
+            return json.dumps({"row_count": self.row_count}) + '\n'
+        return f'], "row_count": {self.row_count}}}'
+
+
+def stream_body(columns: List[str], chunks: Iterator, stream_format: str) -> Iterator[str]:
+    """Streamed /execute body for stream_sql_query chunks"""
+    encoder = _StreamEncoder(columns, stream_format)
+    yield encoder.header()
+    try:
+        for chunk in chunks:
+            text = encoder.chunk(chunk)
+            if text:
+                yield text
+    except Exception as e:
+        yield encoder.error(e)
+        return
+    finally:
+        # Client may disconnect mid-stream: release the cursor and connection now
+        chunks.close()
+    yield encoder.trailer()
+
+
+async def stream_body_async(columns: List[str], chunks: AsyncIterator, stream_format: str) -> AsyncIterator[str]:
+    """stream_body() for stream_sql_query_async chunks"""
+    encoder = _StreamEncoder(columns, stream_format)
+    yield encoder.header()
+    try:
+        async for chunk in chunks:
+            text = encoder.chunk(chunk)
+            if text:
+                yield text
+    except Exception as e:
+        yield encoder.error(e)
+        return
+    finally:
+        await chunks.aclose()
+    yield encoder.trailer()
+
+
+class _BatchSummary:
+    """Counts finished batch queries and writes the final NDJSON summary line"""
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.succeeded = 0
+        self.start = time.perf_counter()
+
+    def line(self, entry: Dict) -> str:
+        self.succeeded += entry["success"]
+        return json.dumps(entry, default=str) + '\n'
+
+    def summary(self) -> str:
+        elapsed_ms = round((time.perf_counter() - self.start) * 1000, 1)
+        print(f"[PYTHON API] Batch finished: {self.succeeded}/{self.batch_size} queries succeeded in {elapsed_ms}ms")
+        return json.dumps({
+            "batch_size": self.batch_size,
+            "succeeded": self.succeeded,
+            "failed": self.batch_size - self.succeeded,
+            "elapsed_ms": elapsed_ms
+        }) + '\n'
+
+
+def batch_body(batch_size: int, entries: Iterator[Dict]) -> Iterator[str]:
+    """One NDJSON line per finished query, then a summary line"""
+    summary = _BatchSummary(batch_size)
+    try:
+        for entry in entries:
+            yield summary.line(entry)
+    finally:
+        # Client may disconnect mid-batch: stop starting new queries
+        entries.close()
+    yield summary.summary()
+
+
+async def batch_body_async(batch_size: int, entries: AsyncIterator[Dict]) -> AsyncIterator[str]:
+    """batch_body() for execute_batch_async entries"""
+    summary = _BatchSummary(batch_size)
+    try:
+        async for entry in entries:
+            yield summary.line(entry)
+    finally:
+        await entries.aclose()
+    yield summary.summary()
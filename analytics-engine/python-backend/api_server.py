@@ -3,10 +3,28 @@ Python API Server for Schema Introspection
 Uses Flask to expose SQLAlchemy schema introspection as REST API
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from schema_introspection import introspect_sql_schema, _normalize_connection_string
-from query_executor import execute_sql_query
+from query_executor import execute_sql_query, stream_sql_query
+from query_control import cancel_query
+from query_templates import register_template, list_templates
+from batch_executor import execute_batch
+from api_common import (
+    parse_execute_request,
+    parse_batch_request,
+    execute_error,
+    execute_payload,
+    stream_body,
+    batch_body,
+    apply_pool_config,
+    ExecuteRequestError,
+    STREAM_MEDIA_TYPES,
+)
+from query_jobs import get_job, JobNotFoundError
+from rollup_store import ROLLUP_ENABLED, get_rollup_status
+from table_mirror import get_mirror_status
+from warmup import start_warmup, get_warmup_status
 from system_catalog import (
     get_system_catalog_metadata,
     get_tables_metadata,
@@ -15,6 +33,7 @@ from system_catalog import (
 )
 import os
 import sys
+import time
 
 # Check LangSmith configuration
 langsmith_enabled = os.getenv("LANGCHAIN_TRACING_V2", "false") == "true"
@@ -35,12 +54,28 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Next.js frontend
 
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({"status": "ok", "service": "schema-introspection"})
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness check for load balancers
+    Returns 200 once startup warm-up (engines + schema cache) has finished, 503 while warming
+    """
+    # Idempotent - makes sure warm-up runs under any server that imports this module
+    start_warmup()
+    status = get_warmup_status()
+    return jsonify({
+        "status": "ready" if status["ready"] else "warming",
+        "warmup": status
+    }), 200 if status["ready"] else 503
+
+
 @app.route('/introspect', methods=['POST', 'GET'])
 def introspect():
     """
@@ -85,43 +120,281 @@ def execute():
     """
     Execute SQL query on database
     
-    POST: { "connection_string": "mysql://...", "query": "SELECT ..." }
+    POST: {
+        "connection_string": "mysql://...",
+        "query": "SELECT ... WHERE day >= :start_day",
+        "params": {"start_day": "2024-01-01"},  # Optional bind parameter values
+        "template_id": "...",  # Optional registered template to run instead of "query"
+        "use_cache": true,  # Optional, false bypasses the result cache
+        "format": "rows",  # Optional: "rows" | "columnar" | "arrow" (Arrow IPC stream body)
+        "stream": false,  # Optional, true streams rows from a server-side cursor (rows format only)
+        "stream_format": "json",  # "json" (same shape as the buffered response) or "ndjson"
+        "max_rows": 1000,  # Optional row cap (default and ceiling: EXECUTE_MAX_ROWS)
+        "page_size": 500,  # Optional rows per response
+        "page_token": "...",  # Optional next_page_token from the previous response (alone: next EXECUTE_MAX_ROWS rows)
+        "timeout": 30,  # Optional statement timeout in seconds (capped at STATEMENT_TIMEOUT_MAX)
+        "query_id": "...",  # Optional client-chosen id for /execute/cancel (generated if omitted; a chosen id never joins an identical in-flight call)
+        "cost_gate": "reject",  # Optional EXPLAIN gate: "off" | "reject" | "limit" | "job" (default COST_GATE)
+        "approximate": false,  # Optional: true, a sample rate (0.05) or {"sample_rate": 0.05} for a sampled preview
+        "pool": {"min_size": 1, "max_size": 20},  # Optional per-datasource pool bounds
+        "replicas": ["mysql://...@replica1/db"],  # Optional read replicas for this datasource
+        "replica_strategy": "round_robin",  # "round_robin" | "least_busy"
+        "replica_max_lag": 30  # Seconds of replication lag after which a replica is skipped
+    }
+    
+    Rows: { "success": true, "query_id": "...", "results": [...], "row_count": N,
+            "truncated": false, "next_page_token": null }
+    truncated is true when more rows exist than were returned; next_page_token
+    (when not null) fetches the next page. Arrow and streaming responses carry
+    these as X-Query-Id / X-Truncated / X-Next-Page-Token headers.
+    Approximate responses add "approximate": {"sample_rate", "method", "confidence",
+    "scaled_columns", "error_bounds": {column: [95% half-width per row]}, ...}.
+    Results answered from a rollup (ROLLUP_STORE=on, see GET /execute/rollups) add
+    "rollup": {"refreshed_at", "age_seconds", "refresh": "full" | "incremental"}.
+    Results computed from mirrored table snapshots (see table_mirror.py) add
+    "mirror": {"tables", "snapshot_at", "age_seconds"}.
+    A timed-out statement returns 408, a cancelled one 409. A statement over the
+    cost gate returns 422 ("reject") or 202 with a job_id to poll at
+    GET /execute/jobs/<job_id> ("job"); streams are never gated.
+    
+    Columnar: { "success": true, "format": "columnar", "columns": [...], "types": [...],
+                "data": [[values of column 1], [values of column 2], ...], "row_count": N, ... }
+    
+    Streaming NDJSON: first line {"columns": [...]}, then one JSON array of values
+    per row, then a final {"row_count": N} (or {"error": ..., "details": ...}) line.
+    """
+    query_id = None
+    try:
+        execute_request = parse_execute_request(request.get_json())
+        query_id = execute_request["query_id"]
+        normalized_connection_string = execute_request["connection_string"]
+        query = execute_request["query"]
+        
+        print(f"[PYTHON API] Executing query on: {normalized_connection_string[:50]}...")
+        template_id = execute_request["execute_kwargs"]["template_id"]
+        print(f"[PYTHON API] Query: {(query or f'template {template_id}')[:100]}...")
+        
+        stream_format = execute_request["stream_format"]
+        if stream_format:
+            chunks = stream_sql_query(normalized_connection_string, query, **execute_request["stream_kwargs"])
+            # Runs the query now, so execution errors still get a 500 response
+            columns = next(chunks)
+            return Response(
+                stream_body(columns, chunks, stream_format),
+                mimetype=STREAM_MEDIA_TYPES[stream_format],
+                headers={'X-Query-Id': query_id}
+            )
+        
+        # Execute query using SQLAlchemy
+        page = execute_sql_query(normalized_connection_string, query, **execute_request["execute_kwargs"])
+        return _execute_response(page, execute_request["result_format"], query_id)
+        
+    except Exception as e:
+        body, status = execute_error(e, query_id)
+        return jsonify(body), status
+
+
+def _execute_response(page, result_format: str, query_id: str):
+    """/execute response for an execute_sql_query result"""
+    body, headers = execute_payload(page, result_format, query_id)
+    if result_format == 'arrow':
+        return Response(body, mimetype='application/vnd.apache.arrow.stream', headers=headers)
+    return jsonify(body)
+
+
+@app.route('/execute/jobs/<job_id>', methods=['GET'])
+def execute_job(job_id):
+    """
+    Status or result of a query the cost gate moved to a background job
+    
+    Returns: { "success": true, "status": "running", "job_id": "..." } while it runs,
+    the /execute response once it has succeeded, or the error (status "failed").
+    Jobs live in the worker process that started them.
+    """
+    try:
+        job = get_job(job_id)
+        if job["status"] == "running":
+            return jsonify({
+                "success": True,
+                "status": "running",
+                "job_id": job_id,
+                "running_for": round(time.time() - job["created_at"], 3)
+            })
+        if job["status"] == "failed":
+            return jsonify({
+                "success": False,
+                "status": "failed",
+                "job_id": job_id,
+                "error": "Query execution failed",
+                "details": str(job["error"])
+            })
+        return _execute_response(job["result"], job["info"].get("result_format", 'rows'), job_id)
+        
+    except JobNotFoundError as e:
+        return jsonify({
+            "error": "Unknown job_id",
+            "details": str(e)
+        }), 404
+
+
+@app.route('/execute/rollups', methods=['GET'])
+def execute_rollups():
+    """
+    Aggregate queries this worker process currently answers from its rollup store
+    
+    Returns: { "success": true, "enabled": bool, "rollups": [{"query", "params", "rows",
+               "refresh", "watermark", "age_seconds", "idle_seconds"}, ...] }
+    """
+    return jsonify({
+        "success": True,
+        "enabled": ROLLUP_ENABLED,
+        "rollups": get_rollup_status()
+    })
+
+
+@app.route('/execute/mirrors', methods=['GET'])
+def execute_mirrors():
+    """
+    Tables this worker process mirrors into local snapshots, per datasource
+    
+    Returns: { "success": true, "mirrors": {datasource: [{"table", "rows", "refresh",
+               "watermark", "age_seconds", "last_error"}, ...]} }
+    """
+    return jsonify({
+        "success": True,
+        "mirrors": get_mirror_status()
+    })
+
+
+@app.route('/execute/cancel', methods=['POST'])
+def cancel_execute():
+    """
+    Cancel a running /execute statement on the database server
+    
+    POST: {
+        "query_id": "...",  # query_id of the /execute request
+        "connection_string": "mysql://..."  # Needed when another worker process may run the query
+    }
     """
     try:
         data = request.get_json()
-        connection_string = data.get('connection_string')
-        query = data.get('query')
+        query_id = data.get('query_id')
         
-        if not connection_string:
+        if not query_id:
             return jsonify({
-                "error": "connection_string is required"
+                "error": "query_id is required"
             }), 400
         
+        connection_string = data.get('connection_string')
+        if connection_string:
+            connection_string = _normalize_connection_string(connection_string)
+        
+        cancelled = cancel_query(query_id, connection_string)
+        return jsonify({
+            "success": cancelled,
+            "query_id": query_id,
+            "cancelled": cancelled
+        }), 200 if cancelled else 404
+        
+    except ValueError as e:
+        return jsonify({
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        print(f"[PYTHON API] Cancel error: {str(e)}", file=sys.stderr)
+        return jsonify({
+            "error": "Query cancellation failed",
+            "details": str(e)
+        }), 500
+
+
+@app.route('/execute/templates', methods=['GET', 'POST'])
+def execute_templates():
+    """
+    Register a parameterized query template (POST) or list registered templates (GET)
+    
+    POST: {
+        "query": "SELECT ... WHERE day >= :start_day",
+        "template_id": "sales_by_day"  # Optional, derived from the query if omitted
+    }
+    
+    Returns: { "success": true, "template_id": "...", "params": ["start_day"] }
+    Templates registered here live in this worker process; configure
+    QUERY_TEMPLATES_FILE to give every worker the same templates.
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify({
+                "success": True,
+                "templates": list_templates()
+            })
+        
+        data = request.get_json()
+        query = data.get('query')
+        
         if not query:
             return jsonify({
                 "error": "query is required"
             }), 400
         
-        # Normalize connection string to handle special characters in password
-        normalized_connection_string = _normalize_connection_string(connection_string)
-        
-        print(f"[PYTHON API] Executing query on: {normalized_connection_string[:50]}...")
-        print(f"[PYTHON API] Query: {query[:100]}...")
-        
-        # Execute query using SQLAlchemy
-        results = execute_sql_query(normalized_connection_string, query)
-        
-        print(f"[PYTHON API] Query executed successfully: {len(results)} rows returned")
+        template = register_template(query, data.get('template_id'))
         return jsonify({
             "success": True,
-            "results": results,
-            "row_count": len(results)
+            "template_id": template.template_id,
+            "params": template.param_names
         })
         
+    except ValueError as e:
+        return jsonify({
+            "error": "Template registration failed",
+            "details": str(e)
+        }), 400
     except Exception as e:
-        print(f"[PYTHON API] Error: {str(e)}", file=sys.stderr)
+        print(f"[PYTHON API] Template error: {str(e)}", file=sys.stderr)
         return jsonify({
-            "error": "Query execution failed",
+            "error": "Template registration failed",
+            "details": str(e)
+        }), 500
+
+
+@app.route('/execute/batch', methods=['POST'])
+def execute_batch_route():
+    """
+    Run several queries against one datasource concurrently
+    
+    POST: {
+        "connection_string": "mysql://...",
+        "queries": [
+            {"id": "revenue", "query": "SELECT ...", "params": {}, "format": "rows"},
+            {"id": "top_products", "template_id": "...", "max_rows": 10},
+            ...
+        ],  # Each accepts the /execute options except stream and the "arrow" format
+        "max_concurrency": 4,  # Optional in-flight queries for this batch (default BATCH_CONCURRENCY, capped at the pool's max_size)
+        "pool": {"min_size": 1, "max_size": 20},  # Optional per-datasource pool bounds
+        "replicas": ["mysql://...@replica1/db"]  # Optional read replicas, same options as /execute
+    }
+    
+    Streams NDJSON: one line per query as it finishes, in completion order -
+    {"index": 0, "id": "revenue", "success": true, "query_id": "...", "results": [...],
+     "row_count": N, "truncated": false, "next_page_token": null, "elapsed_ms": 12.3}
+    or {"index": 1, "id": ..., "success": false, "status": 408, "error": ..., "details": ...}
+    - then a final {"batch_size": N, "succeeded": N, "failed": N, "elapsed_ms": ...} line.
+    """
+    try:
+        normalized_connection_string, prepared, concurrency = parse_batch_request(request.get_json())
+        
+        print(f"[PYTHON API] Executing batch of {len(prepared)} queries on: {normalized_connection_string[:50]}... (concurrency {concurrency})")
+        entries = execute_batch(normalized_connection_string, prepared, concurrency)
+        return Response(batch_body(len(prepared), entries), mimetype='application/x-ndjson')
+        
+    except ExecuteRequestError as e:
+        return jsonify({
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        print(f"[PYTHON API] Batch error: {str(e)}", file=sys.stderr)
+        return jsonify({
+            "error": "Batch execution failed",
             "details": str(e)
         }), 500
 
@@ -256,7 +529,8 @@ def system_catalog():
         "database_name": "optional",
         "schema_name": "optional",
         "include_system_tables": false,
-        "database_type": "mysql|postgresql|sqlserver"
+        "database_type": "mysql|postgresql|sqlserver",
+        "pool": {"min_size": 1, "max_size": 20}  # Optional per-datasource pool bounds
     }
     """
     try:
@@ -271,6 +545,8 @@ def system_catalog():
                 "error": "connection_string is required"
             }), 400
         
+        apply_pool_config(connection_string, data)
+        
         print(f"[PYTHON API] Querying system catalog for: {connection_string[:50]}...")
         
         # Check if force_refresh is requested
@@ -457,6 +733,7 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
     print(f"[PYTHON API] Starting server on port {port}...")
     print(f"[PYTHON API] Health check: http://localhost:{port}/health")
+    print(f"[PYTHON API] Readiness check: http://localhost:{port}/ready")
     print(f"[PYTHON API] Introspect endpoint: http://localhost:{port}/introspect")
     print(f"[PYTHON API] Execute endpoint: http://localhost:{port}/execute")
     print(f"[PYTHON API] System catalog endpoint: http://localhost:{port}/system-catalog")
@@ -467,5 +744,9 @@ if __name__ == '__main__':
         print(f"[PYTHON API] Agent explore-schema endpoint: http://localhost:{port}/agent/explore-schema")
     else:
         print(f"[PYTHON API] Agent endpoints not available (install LangChain dependencies)")
+    print(f"[PYTHON API] Development server - for production run: gunicorn -c gunicorn.conf.py wsgi:app")
+    # The debug reloader runs this block twice; only warm up in the serving child process
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup()
     app.run(host='0.0.0.0', port=port, debug=True)
 
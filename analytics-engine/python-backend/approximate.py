@@ -0,0 +1,415 @@
+"""
+Approximate (Sampled) Query Mode
+Runs single-table SELECTs on a sample for fast previews and scales the aggregates back up.
+
+SAMPLING:
+- PostgreSQL: TABLESAMPLE SYSTEM (sample_rate x 100 percent of the table's pages)
+- MySQL / SQLite: APPROX_KEY_RANGES random ranges of an integer primary key (rowid on
+  SQLite), one per stratum of the key space, read as index range scans
+- Tables under APPROX_MIN_TABLE_ROWS rows (and queries the sampler cannot
+  place) run exactly; the response then reports sample_rate 1.0 and method "exact"
+
+ESTIMATES (rows format: one value per result row):
+- COUNT(...) and SUM(...) select items are divided by the effective sample rate
+- 95% error bounds (half-widths) assume rows were sampled independently:
+  COUNT: 1.96 x sqrt(n (1 - p)) / p, SUM: 1.96 x sqrt((1 - p) x sum of squares) / p.
+  Page (TABLESAMPLE SYSTEM) and key-range sampling draw rows in clusters, so real
+  errors run larger when values correlate with physical order / key order
+- AVG is reported as sampled (unbiased, no bound); MIN, MAX, COUNT(DISTINCT) and other
+  aggregate expressions are sample values and listed as unscaled
+- Groups too rare to appear in the sample are missing from the result
+
+SUPPORTED QUERIES:
+- SELECT ... FROM one table [WHERE ...] [GROUP BY ...] [ORDER BY ...] [LIMIT ...]
+- No joins, subqueries, set operations or HAVING (its thresholds would apply to sample values)
+"""
+
+from sqlalchemy import inspect, text, types
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import math
+import os
+import random
+import threading
+import time
+
+_default_sample_rate = float(os.getenv('APPROX_SAMPLE_RATE', 0.01))
+_min_table_rows = int(os.getenv('APPROX_MIN_TABLE_ROWS', 100000))
+_key_ranges = int(os.getenv('APPROX_KEY_RANGES', 32))
+_metadata_ttl = int(os.getenv('APPROX_METADATA_TTL', 300))  # Seconds to reuse table sizes / key bounds
+
+_Z = 1.96  # 95% confidence
+_SQUARE_ALIAS = '_approx_sq_'
+
+_AGGREGATES = frozenset("""
+    COUNT SUM AVG MIN MAX STDDEV STDDEV_POP STDDEV_SAMP VARIANCE VAR_POP VAR_SAMP
+    GROUP_CONCAT STRING_AGG ARRAY_AGG JSON_AGG JSONB_AGG JSON_ARRAYAGG JSON_OBJECTAGG
+    BIT_AND BIT_OR BIT_XOR BOOL_AND BOOL_OR EVERY PERCENTILE_CONT PERCENTILE_DISC MEDIAN MODE
+""".split())
+
+_CLAUSE_KEYWORDS = frozenset(['WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET', 'FETCH', 'WINDOW', 'FOR'])
+
+_metadata_lock = threading.Lock()
+_metadata: Dict[tuple, tuple] = {}  # (datasource, table): (metadata, cached_at)
+
+
+class ApproximationError(ValueError):
+    """The query cannot run in approximate mode"""
+
+
+def resolve_sample_rate(value: Any) -> Optional[float]:
+    """
+    Sample rate for an "approximate" request option.
+
+    Args:
+        value: None / False (exact), True (APPROX_SAMPLE_RATE), a rate in (0, 1],
+               or {"sample_rate": rate}
+
+    Returns:
+        The sample rate, or None for an exact query
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        return _default_sample_rate
+    if isinstance(value, dict):
+        value = value.get('sample_rate', _default_sample_rate)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value <= 1:
+        raise ValueError("approximate sample_rate must be a number in (0, 1]")
+    return float(value)
+
+
+def _split_items(tokens: List[tuple]) -> List[List[tuple]]:
+    """Split select-list tokens at top-level commas"""
+    items, current, depth = [], [], 0
+    for token in tokens:
+        if token[1] == '(':
+            depth += 1
+        elif token[1] == ')':
+            depth -= 1
+        if token[1] == ',' and depth == 0:
+            items.append(current)
+            current = []
+        else:
+            current.append(token)
+    items.append(current)
+    return items
+
+
+def _closing_paren(tokens: List[tuple], open_index: int) -> int:
+    depth = 0
+    for i in range(open_index, len(tokens)):
+        if tokens[i][1] == '(':
+            depth += 1
+        elif tokens[i][1] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(tokens)
+
+
+def _classify(item: List[tuple], body: str) -> Dict:
+    """Select item kind: count / sum (scaled), avg, unscaled (other aggregates), group or star"""
+    words = [t[1].upper() for t in item if t[0] == 'word']
+    if item and item[-1][1] == '*' and (len(item) == 1 or item[-2][1] == '.'):
+        return {"kind": "star"}
+    if 'OVER' in words:
+        return {"kind": "unscaled"}
+    has_aggregate = any(
+        t[0] == 'word' and t[1].upper() in _AGGREGATES and i + 1 < len(item) and item[i + 1][1] == '('
+        for i, t in enumerate(item)
+    )
+    head = item[0][1].upper() if item and item[0][0] == 'word' else None
+    if head in ('COUNT', 'SUM', 'AVG') and len(item) > 1 and item[1][1] == '(':
+        close = _closing_paren(item, 1)
+        rest = item[close + 1:]
+        if rest and rest[0][1].upper() == 'AS':
+            rest = rest[1:]
+        plain = len(rest) <= 1 and all(t[0] in ('word', 'quoted') for t in rest)
+        distinct = len(item) > 2 and item[2][1].upper() == 'DISTINCT'
+        if plain and not distinct and close < len(item):
+            expr = body[item[2][2]:item[close][2]] if close > 2 else '*'
+            return {"kind": head.lower(), "expr": expr}
+    return {"kind": "unscaled" if has_aggregate else "group"}
+
+
+def analyze_sample_query(query: str) -> Dict:
+    """
+    Find the pieces of a single-table SELECT that sampling rewrites.
+
+    Returns:
+        {"body", "table", "table_parts", "alias", "from_start", "from_end",
+         "where_start", "where_end", "items", "item_spans", "clauses", "distinct", "aggregate"}
+        (item_spans: (start, end) of each select item in body; clauses: body offset
+        of each top-level clause keyword - also used by rollup_store.py)
+
+    Raises:
+        ApproximationError: the query shape is not supported
+    """
+    # Shares the tokenizer used for cache-key normalization
+    from query_executor import _SQL_TOKEN_RE
+
+    body = query.strip()
+    tokens = [
+        (m.lastgroup, m.group(), m.start(), m.end())
+        for m in _SQL_TOKEN_RE.finditer(body)
+        if m.lastgroup not in ('space', 'comment')
+    ]
+    # Drop trailing semicolons and comments: body is embedded in larger statements
+    while tokens and tokens[-1][1] == ';':
+        tokens.pop()
+    if tokens:
+        body = body[:tokens[-1][3]]
+    if not tokens or tokens[0][1].upper() != 'SELECT':
+        raise ApproximationError("approximate mode needs a plain SELECT (no WITH)")
+
+    depth = 0
+    clauses: Dict[str, int] = {}
+    for i, (kind, token, _, _) in enumerate(tokens):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif kind == 'word':
+            word = token.upper()
+            if depth > 0 and word == 'SELECT':
+                raise ApproximationError("approximate mode does not support subqueries")
+            if depth == 0 and word in ('UNION', 'INTERSECT', 'EXCEPT'):
+                raise ApproximationError("approximate mode does not support set operations")
+            if depth == 0 and word in _CLAUSE_KEYWORDS | {'FROM'} and word not in clauses:
+                clauses[word] = i
+    if 'FROM' not in clauses:
+        raise ApproximationError("approximate mode needs a FROM clause")
+    if 'HAVING' in clauses:
+        raise ApproximationError("approximate mode does not support HAVING")
+
+    from_index = clauses['FROM']
+    clause_end = min([i for word, i in clauses.items() if word != 'FROM' and i > from_index] or [len(tokens)])
+    from_tokens = tokens[from_index + 1:clause_end]
+
+    # table [AS] [alias] - a single table, optionally schema-qualified
+    parts, i = [], 0
+    while i < len(from_tokens) and from_tokens[i][0] in ('word', 'quoted'):
+        parts.append(from_tokens[i])
+        i += 1
+        if i < len(from_tokens) and from_tokens[i][1] == '.':
+            i += 1
+            continue
+        break
+    alias = None
+    if i < len(from_tokens) and from_tokens[i][1].upper() == 'AS':
+        i += 1
+    if i < len(from_tokens) and from_tokens[i][0] in ('word', 'quoted'):
+        alias = from_tokens[i][1]
+        i += 1
+    if not parts or i != len(from_tokens) or (alias and alias.upper() in ('JOIN', 'NATURAL', 'CROSS')):
+        raise ApproximationError("approximate mode supports a single table (no joins)")
+
+    select_tokens = tokens[1:from_index]
+    distinct = bool(select_tokens) and select_tokens[0][1].upper() == 'DISTINCT'
+    if select_tokens and select_tokens[0][1].upper() in ('DISTINCT', 'ALL'):
+        select_tokens = select_tokens[1:]
+    split = _split_items(select_tokens)
+    if not all(split):
+        raise ApproximationError("empty select item")
+    items = [_classify(item, body) for item in split]
+
+    where_index = clauses.get('WHERE')
+    where_end = min([i for word, i in clauses.items() if i > (where_index or 0) and word not in ('FROM', 'WHERE')]
+                    or [len(tokens)])
+    return {
+        "body": body,
+        "table": body[parts[0][2]:parts[-1][3]],
+        "table_parts": [p[1] for p in parts],
+        "alias": alias,
+        "from_start": tokens[from_index][2],
+        "from_end": from_tokens[-1][3],
+        "where_start": tokens[where_index][3] if where_index is not None else None,
+        "where_end": (tokens[where_end][2] if where_end < len(tokens) else len(body)) if where_index is not None else None,
+        "items": items,
+        "item_spans": [(item[0][2], item[-1][3]) for item in split],
+        "clauses": {word: tokens[i][2] for word, i in clauses.items()},
+        "distinct": distinct,
+        "aggregate": any(item["kind"] not in ('group', 'star') for item in items),
+    }
+
+
+def _strip_identifier(token: str) -> str:
+    if token[:1] in ('"', '`', '['):
+        return token[1:-1]
+    return token
+
+
+def _cached_metadata(conn, info: Dict, load):
+    key = (conn.engine.url.render_as_string(hide_password=True), info["table"])
+    with _metadata_lock:
+        entry = _metadata.get(key)
+        if entry is not None and time.time() - entry[1] < _metadata_ttl:
+            return entry[0]
+    metadata = load()
+    with _metadata_lock:
+        _metadata[key] = (metadata, time.time())
+    return metadata
+
+
+def _table_rows_postgresql(conn, info: Dict) -> float:
+    """Planner row estimate for the table (pg_class.reltuples)"""
+    return _cached_metadata(conn, info, lambda: float(conn.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table_name)"),
+        {"table_name": info["table"]}
+    ).scalar() or 0))
+
+
+def _key_bounds(conn, info: Dict) -> Optional[Tuple[str, int, int]]:
+    """(integer primary key column, min key, max key), or None if the table has no such key"""
+    def load():
+        if conn.dialect.name == 'sqlite':
+            column = 'rowid'
+        else:
+            name = _strip_identifier(info["table_parts"][-1])
+            schema = _strip_identifier(info["table_parts"][-2]) if len(info["table_parts"]) > 1 else None
+            inspector = inspect(conn)
+            pk = inspector.get_pk_constraint(name, schema=schema).get("constrained_columns") or []
+            if len(pk) != 1:
+                return None
+            column_types = {c["name"]: c["type"] for c in inspector.get_columns(name, schema=schema)}
+            if not isinstance(column_types.get(pk[0]), types.Integer):
+                return None
+            column = pk[0]
+        quoted = conn.dialect.identifier_preparer.quote(column)
+        low, high = conn.execute(text(f"SELECT MIN({quoted}), MAX({quoted}) FROM {info['table']}")).one()
+        if low is None:
+            return None
+        return column, int(low), int(high)
+    return _cached_metadata(conn, info, load)
+
+
+def _key_ranges_condition(column_ref: str, low: int, high: int, rate: float) -> Tuple[str, Dict, float]:
+    """OR of random key ranges, one per stratum of [low, high], covering about rate of the key space"""
+    span = high - low + 1
+    count = max(1, min(_key_ranges, int(span * rate)))
+    width = max(1, int(span * rate / count))
+    stratum = span / count
+    conditions, params = [], {}
+    for i in range(count):
+        first = low + int(i * stratum)
+        last = max(first, low + int((i + 1) * stratum) - width)
+        start = random.randint(first, last)
+        params[f"approx_lo_{i}"] = start
+        params[f"approx_hi_{i}"] = start + width - 1
+        conditions.append(f"{column_ref} BETWEEN :approx_lo_{i} AND :approx_hi_{i}")
+    return ' OR '.join(conditions), params, min(1.0, count * width / span)
+
+
+def build_sample_query(conn, info: Dict, rate: float) -> Tuple[str, Dict, float, str]:
+    """
+    Rewrite an analyze_sample_query() result to run on a sample.
+
+    Returns:
+        (sql, extra bind params, effective sample rate, method)
+    """
+    body = info["body"]
+    dialect = conn.dialect.name
+    edits: List[Tuple[int, str]] = []
+    params: Dict = {}
+    method = 'exact'
+    effective = 1.0
+
+    if rate < 1.0 and dialect == 'postgresql':
+        if _table_rows_postgresql(conn, info) > _min_table_rows:
+            edits.append((info["from_end"], f" TABLESAMPLE SYSTEM ({rate * 100:.6g})"))
+            method, effective = 'tablesample', rate
+    elif rate < 1.0 and dialect in ('mysql', 'sqlite'):
+        bounds = _key_bounds(conn, info)
+        if bounds is not None and bounds[2] - bounds[1] + 1 > _min_table_rows:
+            column, low, high = bounds
+            table_ref = info["alias"] or info["table_parts"][-1]
+            column_ref = f"{table_ref}.{conn.dialect.identifier_preparer.quote(column)}"
+            condition, params, effective = _key_ranges_condition(column_ref, low, high, rate)
+            if info["where_start"] is not None:
+                edits += [(info["where_start"], " ("), (info["where_end"], f") AND ({condition}) ")]
+            else:
+                edits.append((info["from_end"], f" WHERE ({condition})"))
+            method = 'key_ranges'
+
+    if method != 'exact':
+        # Sums of squares for the SUM error bounds, as hidden trailing columns
+        squares = [
+            f", SUM((({item['expr']}) * 1.0) * (({item['expr']}) * 1.0)) AS {_SQUARE_ALIAS}{i}"
+            for i, item in enumerate(info["items"]) if item["kind"] == 'sum'
+        ]
+        if squares:
+            edits.append((info["from_start"], ''.join(squares) + ' '))
+
+    sql = body
+    for position, insert in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        sql = sql[:position] + insert + sql[position:]
+    return sql, params, effective, method
+
+
+def scale_results(
+    info: Dict,
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    rate: float,
+    method: str
+) -> Tuple[List[str], List[List[Any]], Dict]:
+    """
+    Scale COUNT / SUM columns of sampled rows and compute their error bounds.
+
+    Returns:
+        (visible columns, scaled rows, approximation details for the response)
+    """
+    items = info["items"]
+    squares = [i for i, item in enumerate(items) if item["kind"] == 'sum'] if method != 'exact' else []
+    visible = list(columns[:len(columns) - len(squares)])
+    square_positions = {item_index: len(visible) + n for n, item_index in enumerate(squares)}
+    positional = all(item["kind"] != 'star' for item in items) and len(items) == len(visible)
+
+    details = {
+        "sample_rate": round(rate, 6),
+        "method": method,
+        "confidence": 0.95,
+        "scaled_columns": [],
+        "estimated_columns": [],
+        "unscaled_columns": [],
+        "error_bounds": {},
+    }
+    if not positional:
+        return visible, [list(row[:len(visible)]) for row in rows], details
+
+    scaled_rows = [list(row[:len(visible)]) for row in rows]
+    for index, item in enumerate(items):
+        name = visible[index]
+        if item["kind"] in ('count', 'sum'):
+            details["scaled_columns"].append(name)
+            bounds = []
+            for row, scaled in zip(rows, scaled_rows):
+                value = row[index]
+                if value is None or method == 'exact':
+                    bounds.append(None if value is None else 0.0)
+                    continue
+                if item["kind"] == 'count':
+                    scaled[index] = int(round(value / rate))
+                    bounds.append(round(_Z * math.sqrt(value * (1 - rate)) / rate, 2))
+                else:
+                    scaled[index] = float(value) / rate
+                    square_sum = row[square_positions[index]] if index in square_positions else None
+                    bounds.append(
+                        round(_Z * math.sqrt((1 - rate) * float(square_sum)) / rate, 6)
+                        if square_sum is not None else 0.0
+                    )
+            details["error_bounds"][name] = bounds
+        elif item["kind"] == 'avg':
+            details["estimated_columns"].append(name)
+        elif item["kind"] == 'unscaled':
+            details["unscaled_columns"].append(name)
+    return visible, scaled_rows, details
+
+
+def _reset_after_fork():
+    global _metadata_lock
+    _metadata_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
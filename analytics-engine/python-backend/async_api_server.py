@@ -0,0 +1,200 @@
+"""
+Async (ASGI) Python API Server
+Serves /execute and /system-catalog on async SQLAlchemy engines, so slow queries
+never starve /health or the catalog endpoints of worker threads.
+Every other route is delegated to the Flask app in api_server.py.
+
+Run with:
+    uvicorn async_api_server:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from contextlib import asynccontextmanager
+import sys
+
+from api_server import app as flask_app
+from api_common import (
+    parse_execute_request,
+    parse_batch_request,
+    execute_error,
+    execute_payload,
+    stream_body_async,
+    batch_body_async,
+    apply_pool_config,
+    ExecuteRequestError,
+    STREAM_MEDIA_TYPES,
+)
+from async_executor import (
+    execute_sql_query_async,
+    stream_sql_query_async,
+    execute_batch_async,
+    get_system_catalog_metadata_async,
+)
+from engine_registry import dispose_async_engines
+from warmup import start_warmup
+
+
+async def health(request: Request):
+    """Health check endpoint (never waits on the database)"""
+    return JSONResponse({"status": "ok", "service": "schema-introspection", "mode": "async"})
+
+
+async def execute(request: Request):
+    """
+    Execute SQL query on database (async)
+
+    POST: {
+        "connection_string": "mysql://...",
+        "query": "SELECT ...",
+        "params": {},  # Optional bind parameters; or "template_id" instead of "query"
+        "use_cache": true,
+        "format": "rows",  # Optional: "rows" | "columnar" | "arrow"
+        "max_rows": 1000,  # Optional, same row cap and paging options as api_server.py
+        "page_size": 500,
+        "page_token": "...",
+        "timeout": 30,  # Optional statement timeout; cancel through POST /execute/cancel
+        "query_id": "...",
+        "cost_gate": "reject",  # Optional EXPLAIN gate; "job" results are polled at GET /execute/jobs/<job_id>
+        "approximate": false,  # Optional sampled preview: true or a sample rate
+        "stream": false,  # Optional, same streaming formats as api_server.py
+        "stream_format": "json",  # "json" or "ndjson"
+        "replicas": ["mysql://...@replica1/db"]  # Optional read replicas (and replica_strategy / replica_max_lag)
+    }
+    """
+    query_id = None
+    try:
+        execute_request = parse_execute_request(await request.json())
+        query_id = execute_request["query_id"]
+        normalized_connection_string = execute_request["connection_string"]
+        query = execute_request["query"]
+
+        print(f"[PYTHON API] Executing query (async) on: {normalized_connection_string[:50]}...")
+        template_id = execute_request["execute_kwargs"]["template_id"]
+        print(f"[PYTHON API] Query: {(query or f'template {template_id}')[:100]}...")
+
+        stream_format = execute_request["stream_format"]
+        if stream_format:
+            chunks = stream_sql_query_async(normalized_connection_string, query, **execute_request["stream_kwargs"])
+            # Runs the query now, so execution errors still get a 500 response
+            columns = await chunks.__anext__()
+            return StreamingResponse(
+                stream_body_async(columns, chunks, stream_format),
+                media_type=STREAM_MEDIA_TYPES[stream_format],
+                headers={'X-Query-Id': query_id}
+            )
+
+        result_format = execute_request["result_format"]
+        page = await execute_sql_query_async(normalized_connection_string, query, **execute_request["execute_kwargs"])
+        body, headers = execute_payload(page, result_format, query_id)
+        if result_format == 'arrow':
+            return Response(body, media_type='application/vnd.apache.arrow.stream', headers=headers)
+        return JSONResponse(body)
+
+    except Exception as e:
+        body, status = execute_error(e, query_id)
+        return JSONResponse(body, status_code=status)
+
+
+async def execute_batch(request: Request):
+    """
+    Run several queries against one datasource concurrently (async)
+
+    POST: {
+        "connection_string": "mysql://...",
+        "queries": [{"id": "revenue", "query": "SELECT ...", ...}, ...],
+        "max_concurrency": 4
+    }
+
+    Same request options and NDJSON response lines as api_server.py.
+    """
+    try:
+        normalized_connection_string, prepared, concurrency = parse_batch_request(await request.json())
+
+        print(f"[PYTHON API] Executing batch (async) of {len(prepared)} queries on: {normalized_connection_string[:50]}... (concurrency {concurrency})")
+        entries = execute_batch_async(normalized_connection_string, prepared, concurrency)
+        return StreamingResponse(batch_body_async(len(prepared), entries), media_type='application/x-ndjson')
+
+    except ExecuteRequestError as e:
+        return JSONResponse({
+            "error": str(e)
+        }, status_code=400)
+    except Exception as e:
+        print(f"[PYTHON API] Batch error: {str(e)}", file=sys.stderr)
+        return JSONResponse({
+            "error": "Batch execution failed",
+            "details": str(e)
+        }, status_code=500)
+
+
+async def system_catalog(request: Request):
+    """
+    Get metadata from database system catalog (async)
+
+    POST: {
+        "connection_string": "mysql://...",
+        "database_name": "optional",
+        "schema_name": "optional",
+        "include_system_tables": false,
+        "force_refresh": false
+    }
+    """
+    try:
+        data = await request.json()
+        connection_string = data.get('connection_string')
+
+        if not connection_string:
+            return JSONResponse({
+                "error": "connection_string is required"
+            }, status_code=400)
+
+        apply_pool_config(connection_string, data)
+
+        print(f"[PYTHON API] Querying system catalog (async) for: {connection_string[:50]}...")
+
+        metadata = await get_system_catalog_metadata_async(
+            connection_string,
+            data.get('database_name'),
+            data.get('schema_name'),
+            data.get('include_system_tables', False),
+            force_refresh=data.get('force_refresh', False)
+        )
+
+        print(f"[PYTHON API] System catalog query successful: Found {len(metadata.get('tables', []))} tables")
+        return JSONResponse({
+            "success": True,
+            "metadata": metadata
+        })
+
+    except Exception as e:
+        print(f"[PYTHON API] System catalog error: {str(e)}", file=sys.stderr)
+        return JSONResponse({
+            "error": "System catalog query failed",
+            "details": str(e)
+        }, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_warmup()
+    yield
+    await dispose_async_engines()
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health, methods=['GET']),
+        Route('/execute', execute, methods=['POST']),
+        Route('/execute/batch', execute_batch, methods=['POST']),
+        Route('/system-catalog', system_catalog, methods=['POST']),
+        # Everything else (introspection, agent, catalog tables/statistics, /ready, /execute/cancel, /execute/templates, /execute/jobs) runs on the Flask app
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],  # Next.js frontend
+    lifespan=lifespan,
+)
@@ -0,0 +1,382 @@
+"""
+Async Query Execution Service
+asyncio counterparts of execute_sql_query and get_system_catalog_metadata,
+backed by async SQLAlchemy engines (aiomysql for MySQL, asyncpg for PostgreSQL)
+leased from engine_registry, under the same connection budget as the sync engines.
+
+- A query waiting on the database holds a pooled connection, not a thread,
+  so one process can keep hundreds of queries in flight
+- Validation, serialization, error messages, the result cache and the schema cache are shared
+  with the sync services, so both APIs return identical results
+- Databases without an async driver fall back to the sync service in a thread
+- Identical in-flight calls are coalesced under the same rules as the sync service
+  (same resolved timeout, no client-chosen query_id)
+"""
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import time
+
+from engine_registry import lease_async_engine, has_async_driver
+from pagination import build_page_query
+from query_control import running_query_async, resolve_timeout, max_timeout
+from cost_gate import resolve_cost_gate, plan_cache_key, get_cached_estimate, estimate_cost_async, apply_gate, NOT_CACHED
+from query_templates import compiled_text, check_params
+from batch_executor import batch_entry, batch_error_entry
+from replica_routing import run_read_async, read_target
+from table_mirror import has_mirror
+from query_executor import (
+    execute_sql_query,
+    stream_sql_query,
+    serialize_row_lists,
+    _stream_chunk_size,
+    validate_sql_query,
+    _format_rows,
+    _plan_page,
+    _page_payload,
+    _fetch_limited_sql,
+    _prepare_execution,
+    _statement,
+    _translate_query_error,
+    _get_cached_result,
+    _cache_result,
+    _note_rollup_query,
+    _serve_rollup,
+    _run_mirrored,
+    _may_coalesce,
+    invalidate_result_cache,
+    SECURITY_VALIDATION_ERROR,
+)
+from system_catalog import (
+    get_system_catalog_metadata,
+    detect_database_type,
+    query_system_catalog_mysql,
+    query_system_catalog_postgresql,
+    _catalog_flight_key,
+    _get_cached_schema_metadata,
+    _previous_schema_metadata,
+    _store_catalog_metadata,
+)
+import singleflight
+
+async def execute_sql_query_async(
+    connection_string: str,
+    query: str,
+    use_cache: bool = True,
+    result_format: str = 'rows',
+    max_rows: Optional[int] = None,
+    page_size: Optional[int] = None,
+    page_token: Optional[str] = None,
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None,
+    template_id: Optional[str] = None,
+    cost_gate: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    fetch_limit: Optional[int] = None,
+    query_id_generated: bool = False
+):
+    """
+    Executes a SQL query on a database without blocking the event loop.
+
+    Args:
+        connection_string: Database connection string
+        query: SQL query to execute (ignored when template_id is given)
+        use_cache: Serve/store the result from the shared result cache (default: True)
+        result_format: 'rows' (default), 'columnar' or 'arrow'
+        max_rows: Optional cap on the total rows returned across all pages
+        page_size: Optional cap on the rows returned by this call
+        page_token: next_page_token from the previous page of the same query
+        timeout: Statement timeout in seconds (default STATEMENT_TIMEOUT)
+        query_id: Optional id the running statement can be cancelled by
+        params: Values for :name bind placeholders in the query
+        template_id: Id of a registered template to run instead of query
+        cost_gate: 'off', 'reject', 'limit' or 'job' (default COST_GATE)
+        sample_rate: Run approximately on this fraction of the table
+        fetch_limit: Row cap for a query without paging options (a first page, continued with page_token)
+        query_id_generated: query_id was generated, not chosen by the client (see execute_sql_query)
+
+    Returns:
+        Same as execute_sql_query for the chosen result format and paging options
+    """
+    if not has_async_driver(connection_string) or sample_rate is not None:
+        # Sampling reads table metadata through the sync inspector
+        return await asyncio.to_thread(
+            execute_sql_query, connection_string, query, use_cache, result_format,
+            max_rows, page_size, page_token, timeout, query_id, params, template_id, cost_gate, sample_rate,
+            fetch_limit, query_id_generated
+        )
+
+    query, params, timeout, paged, cache_key, datasource_key = _prepare_execution(
+        connection_string, query, result_format, max_rows, page_size, page_token, timeout, params, template_id,
+        fetch_limit=fetch_limit
+    )
+    row_limit = max_rows if paged else fetch_limit
+    capped = paged or fetch_limit is not None
+    gate = resolve_cost_gate(cost_gate)
+    rollup = _note_rollup_query(
+        connection_string, datasource_key, query, params, use_cache, page_size, page_token, sample_rate
+    )
+    if use_cache:
+        cached_results = _get_cached_result(cache_key)
+        if cached_results is not None:
+            return cached_results
+    # A result cut at fetch_limit continues like a first page of the query
+    continue_query = None if paged else query
+    if rollup is not None:
+        # A local DuckDB read: fast enough to run on the event loop
+        rolled_up = _serve_rollup(rollup, result_format, row_limit, capped, continue_query)
+        if rolled_up is not None:
+            return rolled_up
+
+    def run_as_job(job_id: str):
+        # Background jobs run on the sync executor's threads
+        return execute_sql_query(
+            connection_string, query, use_cache, result_format, max_rows, page_size, page_token,
+            max_timeout(), job_id, params, cost_gate='off', fetch_limit=fetch_limit
+        )
+
+    async def run(target: str):
+        async with lease_async_engine(target) as target_engine:
+            row_cap = row_limit
+            if gate != 'off':
+                estimate = await _estimate_cost_async(target_engine, target, datasource_key, query, params)
+                row_cap = apply_gate(gate, estimate, row_limit, query_id, run_as_job, {"result_format": result_format})
+            if paged or row_cap != row_limit:
+                return await _run_sql_page_async(
+                    target_engine, target, query, result_format, row_cap, page_size, page_token,
+                    timeout, query_id, params
+                )
+            return await _run_sql_query_async(
+                target_engine, target, query, result_format, timeout, query_id, params, fetch_limit
+            )
+
+    async def run_and_cache():
+        results = None
+        if page_size is None and page_token is None and has_mirror(connection_string):
+            # DuckDB on local snapshots blocks: off the event loop
+            results = await asyncio.to_thread(
+                _run_mirrored, connection_string, query, params, result_format, row_limit, capped, timeout, query_id,
+                continue_query
+            )
+        if results is None:
+            # Validated SELECT: a read replica takes it when the datasource has one
+            results = await run_read_async(connection_string, run)
+        if use_cache:
+            _cache_result(cache_key, datasource_key, results)
+        return results
+
+    if not _may_coalesce(query_id, query_id_generated):
+        return await run_and_cache()
+    # Identical queries already in flight share one database round-trip
+    return await singleflight.do_async(f"execute:{gate}:{timeout:g}:{cache_key}", run_and_cache)
+
+
+async def _estimate_cost_async(engine: AsyncEngine, connection_string: str, datasource_key: str, query: str, params: Dict):
+    """Async query_executor._estimate_cost"""
+    plan_key = plan_cache_key(datasource_key, query, params)
+    estimate = get_cached_estimate(plan_key)
+    if estimate is not NOT_CACHED:
+        return estimate
+    try:
+        async with engine.connect() as conn:
+            return await estimate_cost_async(conn, connection_string, plan_key, query, params)
+    except Exception as e:
+        raise _translate_query_error(e)
+
+
+async def _run_sql_query_async(
+    engine: AsyncEngine,
+    connection_string: str,
+    query: str,
+    result_format: str = 'rows',
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None,
+    fetch_limit: Optional[int] = None
+):
+    """Run a validated query on an async engine and format the rows (a page if fetch_limit is given)"""
+    try:
+        async with engine.connect() as conn, running_query_async(conn, connection_string, query_id, timeout):
+            if fetch_limit is None:
+                result = await conn.execute(_statement(query, query_id, conn.dialect.name), params or {})
+                rows = result.fetchall()
+            else:
+                info, sql = _fetch_limited_sql(query, conn.dialect, fetch_limit)
+                # Server-side cursor: rows past the cap are never buffered
+                result = await conn.stream(_statement(sql, query_id, conn.dialect.name), params or {})
+                rows = await result.fetchmany(fetch_limit + 1)
+            columns = list(result.keys())
+    except Exception as e:
+        raise _translate_query_error(e)
+
+    if fetch_limit is None:
+        return _format_rows(columns, rows, result_format)
+    return _page_payload(query, info, columns, rows, fetch_limit, None, None, result_format)
+
+
+async def _run_sql_page_async(
+    engine: AsyncEngine,
+    connection_string: str,
+    query: str,
+    result_format: str,
+    max_rows: Optional[int],
+    page_size: Optional[int],
+    page_token: Optional[str],
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None
+):
+    """Run one LIMITed page of a validated query on an async engine"""
+    info, state, limit = _plan_page(query, max_rows, page_size, page_token)
+    try:
+        async with engine.connect() as conn, running_query_async(conn, connection_string, query_id, timeout):
+            sql, page_params, skip = build_page_query(info, engine.dialect, limit, state)
+            result = await conn.execute(
+                _statement(sql, query_id, conn.dialect.name), {**(params or {}), **page_params}
+            )
+            rows = result.fetchall()[skip:] if limit else []
+            columns = list(result.keys())
+    except Exception as e:
+        raise _translate_query_error(e)
+
+    return _page_payload(query, info, columns, rows, limit, state, max_rows, result_format)
+
+
+async def stream_sql_query_async(
+    connection_string: str,
+    query: str,
+    chunk_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None
+) -> AsyncIterator:
+    """
+    Async stream_sql_query: yields the column names, then chunks of rows
+    (lists of serialized values) read through a server-side cursor.
+    """
+    # Validate query (basic security check)
+    if not validate_sql_query(query):
+        raise ValueError(SECURITY_VALIDATION_ERROR)
+    params = check_params(compiled_text(query), params)
+
+    chunk_size = chunk_size or _stream_chunk_size
+    timeout = resolve_timeout(timeout) if timeout is not None else None
+    if not has_async_driver(connection_string):
+        # No async driver: drive the sync generator from a worker thread
+        chunks = stream_sql_query(connection_string, query, chunk_size, timeout, query_id, params)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+    try:
+        with read_target(connection_string) as target:
+            async with lease_async_engine(target) as engine, engine.connect() as conn, \
+                    running_query_async(conn, target, query_id, timeout):
+                result = await conn.stream(_statement(query, query_id, conn.dialect.name), params)
+                yield list(result.keys())
+                async for partition in result.partitions(chunk_size):
+                    yield serialize_row_lists(partition)
+    except (GeneratorExit, asyncio.CancelledError):
+        raise
+    except Exception as e:
+        raise _translate_query_error(e)
+
+
+async def execute_batch_async(connection_string: str, prepared: List[Dict], max_concurrency: int) -> AsyncIterator:
+    """
+    Async execute_batch: yields each query's entry as soon as it finishes,
+    with at most max_concurrency queries of the batch in flight.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(index: int, item: Dict) -> Dict:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                page = await execute_sql_query_async(connection_string, **item["kwargs"])
+                return batch_entry(index, item, page, time.perf_counter() - start)
+            except Exception as e:
+                return batch_error_entry(index, item, e, time.perf_counter() - start)
+
+    tasks = [asyncio.ensure_future(run_one(index, item)) for index, item in enumerate(prepared)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away: stop whatever has not finished
+        for task in tasks:
+            task.cancel()
+
+
+async def get_system_catalog_metadata_async(
+    connection_string: str,
+    database_name: Optional[str] = None,
+    schema_name: Optional[str] = None,
+    include_system_tables: bool = False,
+    force_refresh: bool = False
+) -> Dict:
+    """
+    Async get_system_catalog_metadata: same queries and schema cache, async connection.
+
+    Args:
+        connection_string: Database connection string
+        database_name: Optional database name
+        schema_name: Optional schema name
+        include_system_tables: Whether to include system tables
+        force_refresh: Force refresh even if cached (default: False)
+    """
+    # Check cache first (unless force_refresh is True)
+    if not force_refresh:
+        cached_metadata = _get_cached_schema_metadata(connection_string, database_name, schema_name, include_system_tables)
+        if cached_metadata:
+            return cached_metadata
+    else:
+        invalidate_result_cache(connection_string)
+
+    db_type = detect_database_type(connection_string)
+    if db_type not in ('mysql', 'postgresql') or not has_async_driver(connection_string):
+        return await asyncio.to_thread(
+            get_system_catalog_metadata,
+            connection_string,
+            database_name,
+            schema_name,
+            include_system_tables,
+            force_refresh
+        )
+
+    return await singleflight.do_async(
+        _catalog_flight_key(connection_string, database_name, schema_name, include_system_tables),
+        _fetch_catalog_metadata_async,
+        db_type,
+        connection_string,
+        database_name,
+        schema_name,
+        include_system_tables
+    )
+
+
+async def _fetch_catalog_metadata_async(
+    db_type: str,
+    connection_string: str,
+    database_name: Optional[str],
+    schema_name: Optional[str],
+    include_system_tables: bool
+) -> Dict:
+    """Walk the system catalog over an async connection and cache the result"""
+    # The catalog queries are sync code; run_sync drives them over the async connection
+    previous = _previous_schema_metadata(connection_string, database_name, schema_name)
+    async with lease_async_engine(connection_string) as engine, engine.connect() as conn:
+        if db_type == 'mysql':
+            metadata = await conn.run_sync(query_system_catalog_mysql, database_name, include_system_tables, previous)
+        else:
+            metadata = await conn.run_sync(query_system_catalog_postgresql, schema_name, include_system_tables, previous)
+
+    _store_catalog_metadata(connection_string, metadata, database_name, schema_name)
+    return metadata
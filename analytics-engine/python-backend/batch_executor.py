@@ -0,0 +1,243 @@
+"""
+Batch Query Execution
+Runs the queries of one dashboard render against one datasource concurrently (/execute/batch).
+
+- One HTTP request carries N queries; each runs through execute_sql_query, so validation,
+  the result cache, single-flight, row caps, timeouts and cancellation all still apply
+- Queries run on one bounded thread pool shared by every batch (BATCH_WORKERS per process)
+- At most max_concurrency queries of a batch are in flight at once (default BATCH_CONCURRENCY,
+  never more than the datasource's max pool size), so one dashboard can't take every
+  pooled connection
+- Results are yielded as each query finishes, tagged with the query's index in the batch;
+  a failing query yields an error entry and never fails the rest of the batch
+"""
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import threading
+import time
+
+from engine_registry import get_pool_config
+from query_executor import execute_sql_query, DEFAULT_MAX_ROWS, PageTokenError
+from query_control import check_query_id, new_query_id, resolve_timeout, QueryTimeoutError, QueryCancelledError
+from query_templates import TemplateNotFoundError, BindParameterError
+from cost_gate import resolve_cost_gate, QueryCostError, QueryQueuedError
+from approximate import resolve_sample_rate, ApproximationError
+
+_batch_workers = int(os.getenv('BATCH_WORKERS', 32))  # Threads shared by all batches in this process
+_default_concurrency = int(os.getenv('BATCH_CONCURRENCY', 4))  # In-flight queries per batch
+_max_batch_size = int(os.getenv('BATCH_MAX_QUERIES', 100))  # Queries per request
+
+BATCH_FORMATS = ('rows', 'columnar')
+
+_executor_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, _batch_workers), thread_name_prefix="batch")
+        return _executor
+
+
+def prepare_batch(queries: List[Dict]) -> List[Dict]:
+    """
+    Validate the queries of a batch and turn each into execute_sql_query keyword arguments.
+
+    Args:
+        queries: [{"id": "revenue", "query": "SELECT ...", "params": {}, "format": "rows",
+                   "max_rows": 1000, "page_size": 500, "page_token": "...", "timeout": 30,
+                   "query_id": "...", "template_id": "...", "use_cache": true, "cost_gate": "reject",
+                   "approximate": false}, ...]
+
+    Returns:
+        [{"id": ..., "kwargs": {...}}, ...] in batch order
+
+    Raises:
+        ValueError: if the batch or any of its queries is malformed
+    """
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("queries must be a non-empty list")
+    if len(queries) > _max_batch_size:
+        raise ValueError(f"A batch may contain at most {_max_batch_size} queries")
+
+    prepared = []
+    for index, item in enumerate(queries):
+        if not isinstance(item, dict):
+            raise ValueError(f"queries[{index}] must be an object")
+        if not item.get('query') and not item.get('template_id'):
+            raise ValueError(f"queries[{index}]: query or template_id is required")
+        result_format = item.get('format', 'rows')
+        if result_format not in BATCH_FORMATS:
+            raise ValueError(f"queries[{index}]: format must be one of: {', '.join(BATCH_FORMATS)}")
+        for option in ('max_rows', 'page_size'):
+            value = item.get(option)
+            if value is not None and (type(value) is not int or value < 1):
+                raise ValueError(f"queries[{index}]: {option} must be a positive integer")
+        try:
+            query_id = check_query_id(item['query_id']) if item.get('query_id') else new_query_id()
+            timeout = resolve_timeout(item.get('timeout'))
+            cost_gate = resolve_cost_gate(item.get('cost_gate'))
+            sample_rate = resolve_sample_rate(item.get('approximate'))
+        except ValueError as e:
+            raise ValueError(f"queries[{index}]: {e}")
+
+        max_rows = item.get('max_rows')
+        page_size = item.get('page_size')
+        fetch_limit = None
+        if DEFAULT_MAX_ROWS > 0:
+            if max_rows is None and page_size is None and item.get('page_token') is None:
+                # No paging options: a first page of DEFAULT_MAX_ROWS rows
+                fetch_limit = DEFAULT_MAX_ROWS
+            elif max_rows is None and page_size is None:
+                # page_token alone: the next page of such a response
+                page_size = DEFAULT_MAX_ROWS
+            else:
+                max_rows = DEFAULT_MAX_ROWS if max_rows is None else min(max_rows, DEFAULT_MAX_ROWS)
+        prepared.append({
+            "id": item.get('id', index),
+            "kwargs": {
+                "query": item.get('query'),
+                "use_cache": item.get('use_cache', True),
+                "result_format": result_format,
+                "max_rows": max_rows,
+                "page_size": page_size,
+                "page_token": item.get('page_token'),
+                "timeout": timeout,
+                "query_id": query_id,
+                "params": item.get('params'),
+                "template_id": item.get('template_id'),
+                "cost_gate": cost_gate,
+                "sample_rate": sample_rate,
+                "fetch_limit": fetch_limit,
+                "query_id_generated": not item.get('query_id'),
+            },
+        })
+    return prepared
+
+
+def batch_concurrency(connection_string: str, requested: Optional[int] = None) -> int:
+    """In-flight queries allowed for one batch: requested (or BATCH_CONCURRENCY), capped at the pool's max_size"""
+    concurrency = _default_concurrency if requested is None else requested
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise ValueError("max_concurrency must be a positive integer")
+    return max(1, min(concurrency, get_pool_config(connection_string)["max_size"]))
+
+
+def batch_entry(index: int, prepared: Dict, page, elapsed: float) -> Dict:
+    """Result line for one query of the batch (same fields as an /execute response)"""
+    kwargs = prepared["kwargs"]
+    if not isinstance(page, dict) or "next_page_token" not in page:
+        page = {"results": page, "truncated": False, "next_page_token": None}
+    results = page["results"]
+    entry = {"index": index, "id": prepared["id"], "success": True, "query_id": kwargs["query_id"]}
+    if kwargs["result_format"] == 'columnar':
+        entry.update({"format": "columnar", **results, "row_count": len(results["data"][0]) if results["data"] else 0})
+    else:
+        entry.update({"results": results, "row_count": len(results)})
+    entry.update({
+        "truncated": page["truncated"],
+        "next_page_token": page["next_page_token"],
+        "elapsed_ms": round(elapsed * 1000, 1),
+    })
+    for extra in ("approximate", "rollup", "mirror"):
+        if extra in page:
+            entry[extra] = page[extra]
+    return entry
+
+
+def execute_error_status(e: Exception) -> Tuple[int, str]:
+    """(HTTP status, error message) /execute returns for an exception raised by execute_sql_query"""
+    if isinstance(e, PageTokenError):
+        status, error = 400, "Invalid page_token"
+    elif isinstance(e, ApproximationError):
+        status, error = 400, "Query cannot run in approximate mode"
+    elif isinstance(e, TemplateNotFoundError):
+        status, error = 404, "Unknown template_id"
+    elif isinstance(e, BindParameterError):
+        status, error = 400, "Invalid params"
+    elif isinstance(e, QueryTimeoutError):
+        status, error = 408, "Query timed out"
+    elif isinstance(e, QueryCancelledError):
+        status, error = 409, "Query cancelled"
+    elif isinstance(e, QueryCostError):
+        status, error = 422, "Query rejected by cost gate"
+    elif isinstance(e, QueryQueuedError):
+        status, error = 202, "Query running as a background job"
+    else:
+        status, error = 500, "Query execution failed"
+    return status, error
+
+
+def batch_error_entry(index: int, prepared: Dict, e: Exception, elapsed: float) -> Dict:
+    """Error line for one query of the batch, with the status /execute would have returned"""
+    status, error = execute_error_status(e)
+    entry = {
+        "index": index,
+        "id": prepared["id"],
+        "success": False,
+        "query_id": prepared["kwargs"]["query_id"],
+        "status": status,
+        "error": error,
+        "details": str(e),
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+    if isinstance(e, QueryQueuedError):
+        entry["job_id"] = e.job_id
+    return entry
+
+
+def _run_one(connection_string: str, index: int, prepared: Dict) -> Dict:
+    start = time.perf_counter()
+    try:
+        page = execute_sql_query(connection_string, **prepared["kwargs"])
+        return batch_entry(index, prepared, page, time.perf_counter() - start)
+    except Exception as e:
+        return batch_error_entry(index, prepared, e, time.perf_counter() - start)
+
+
+def execute_batch(connection_string: str, prepared: List[Dict], max_concurrency: int) -> Iterator[Dict]:
+    """
+    Run a prepared batch and yield each query's entry as soon as it finishes.
+
+    Args:
+        connection_string: Normalized connection string shared by every query
+        prepared: prepare_batch() result
+        max_concurrency: batch_concurrency() result
+
+    Yields:
+        batch_entry() / batch_error_entry() dicts in completion order
+    """
+    executor = _get_executor()
+    pending = iter(enumerate(prepared))
+    in_flight = set()
+    try:
+        for index, item in pending:
+            in_flight.add(executor.submit(_run_one, connection_string, index, item))
+            if len(in_flight) >= max_concurrency:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                # Refill the window before handing the result to the (possibly slow) client
+                for index, item in pending:
+                    in_flight.add(executor.submit(_run_one, connection_string, index, item))
+                    break
+                yield future.result()
+    finally:
+        # Client went away: queries not yet started never run; running ones end at their timeout
+        for future in in_flight:
+            future.cancel()
+
+
+def _reset_after_fork():
+    global _executor, _executor_lock
+    _executor_lock = threading.Lock()
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
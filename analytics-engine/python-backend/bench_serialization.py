@@ -0,0 +1,115 @@
+"""
+Serialization Benchmark
+Compares the per-cell serialize_value loop with column-wise serialization
+(serialization.py) on a synthetic result set.
+
+Run:
+    python bench_serialization.py                      # 1,000,000 rows x 20 columns
+    python bench_serialization.py --rows 100000 --repeat 3
+"""
+
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+import argparse
+import gc
+import random
+import time
+
+import pandas as pd
+
+from serialization import serialize_value, serialize_rows, serialize_columns, serialize_dataframe
+import csv_processor
+
+
+def make_rows(row_count: int, column_count: int):
+    """Rows with int, float, str, datetime, date, Decimal and bytes columns (some NULLs)"""
+    rnd = random.Random(42)
+    base = datetime(2024, 1, 1)
+    generators = [
+        lambda i: i,
+        lambda i: rnd.random() * 1000,
+        lambda i: f"name-{i % 5000}",
+        lambda i: base + timedelta(seconds=i),
+        lambda i: (base + timedelta(days=i % 3650)).date(),
+        lambda i: Decimal(i % 100000) / 100,
+        lambda i: (i % 65536).to_bytes(2, 'big') * 8,
+        lambda i: None if i % 10 == 0 else Decimal(i % 997) / 10,
+    ]
+    column_generators = [generators[c % len(generators)] for c in range(column_count)]
+    columns = [f"col_{c}" for c in range(column_count)]
+    rows = [tuple(gen(i) for gen in column_generators) for i in range(row_count)]
+    return columns, rows
+
+
+def per_cell_rows(columns, rows):
+    """The previous implementation: dict per row, isinstance chain per cell"""
+    serialized_rows = []
+    for row in rows:
+        row_dict = dict(zip(columns, row))
+        serialized_rows.append({k: serialize_value(v) for k, v in row_dict.items()})
+    return serialized_rows
+
+
+def per_cell_columns(columns, rows):
+    """The previous columnar implementation: serialize_value per cell of each column"""
+    return [[serialize_value(v) for v in values] for values in zip(*rows)]
+
+
+def per_cell_dataframe(df):
+    """The previous CSV implementation: to_dict('records') then pd.isna per cell"""
+    return [{k: csv_processor.serialize_value(v) for k, v in record.items()} for record in df.to_dict('records')]
+
+
+def timed(label, fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()  # Like timeit: keep collector pauses on millions of new objects out of the timing
+        try:
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<28} {best:8.2f}s")
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} rows x {args.columns} columns...")
+    columns, rows = make_rows(args.rows, args.columns)
+
+    print("SQL results (rows format):")
+    old_time, old_result = timed("per-cell serialize_value", lambda: per_cell_rows(columns, rows), args.repeat)
+    new_time, new_result = timed("column-wise", lambda: serialize_rows(columns, rows), args.repeat)
+    assert old_result == new_result, "column-wise output differs from per-cell output"
+    print(f"  speedup: {old_time / new_time:.1f}x")
+    del old_result, new_result
+
+    print("SQL results (columnar format):")
+    old_time, old_result = timed("per-cell serialize_value", lambda: per_cell_columns(columns, rows), args.repeat)
+    new_time, new_result = timed("column-wise", lambda: serialize_columns(columns, rows), args.repeat)
+    assert old_result == new_result, "column-wise output differs from per-cell output"
+    print(f"  speedup: {old_time / new_time:.1f}x")
+    del old_result, new_result
+
+    print("CSV results (DataFrame):")
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    df[columns[3]] = pd.to_datetime(df[columns[3]])
+    old_time, old_result = timed("per-cell pd.isna + serialize", lambda: per_cell_dataframe(df), args.repeat)
+    new_time, new_result = timed("column-wise", lambda: serialize_dataframe(df), args.repeat)
+    assert old_result == new_result, "column-wise output differs from per-cell output"
+    print(f"  speedup: {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+SQL Validator Benchmark
+Compares the previous regex-per-keyword validate_sql_query with the single-pass
+tokenizer validator, cold (every query new) and warm (memoized verdict). Exits with
+status 1 if the new validator accepts a query it must reject or rejects a safe one.
+
+Run:
+    python bench_validation.py
+    python bench_validation.py --iterations 50000
+"""
+
+import argparse
+import sys
+import time
+
+import query_executor
+from query_executor import validate_sql_query
+
+
+def legacy_validate_sql_query(query: str) -> bool:
+    """The previous implementation (ten re.search calls over the upper-cased query)"""
+    import re
+
+    if not query or not isinstance(query, str):
+        return False
+    cleaned_query = query.strip()
+    upper_query = cleaned_query.upper()
+    if not upper_query.startswith('SELECT'):
+        return False
+    dangerous_keywords = [
+        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE',
+        'ALTER', 'TRUNCATE', 'EXEC', 'EXECUTE', 'CALL'
+    ]
+    for keyword in dangerous_keywords:
+        pattern = r'\b' + re.escape(keyword) + r'\b'
+        if re.search(pattern, upper_query, re.IGNORECASE):
+            return False
+    return True
+
+
+ACCEPTED = [
+    "SELECT * FROM students LIMIT 10",
+    "SELECT s.name, AVG(g.score) AS avg_score FROM students s JOIN grades g ON g.student_id = s.id "
+    "WHERE s.enrolled_at >= '2024-01-01' GROUP BY s.name HAVING AVG(g.score) > 70 ORDER BY avg_score DESC LIMIT 50",
+    "SELECT department, COUNT(*) AS n, SUM(salary) AS total FROM employees e "
+    "LEFT JOIN departments d ON d.id = e.department_id WHERE e.status IN ('active', 'on_leave') "
+    "AND e.hired_at BETWEEN '2020-01-01' AND '2024-12-31' GROUP BY department ORDER BY total DESC",
+    # Dangerous words inside literals / comments / quoted identifiers (false positives before)
+    "SELECT id FROM audit_log WHERE action = 'delete' AND note NOT LIKE '%update%'",
+    "SELECT \"update\", `create` FROM t -- TODO drop this column later\nWHERE x = 1",
+    "SELECT $$it's$$ AS a, data #>> '{a,b}' AS b FROM t; -- trailing comment",
+]
+
+REJECTED = [
+    "SELECT 1; DROP TABLE students",
+    "SELECT * FROM t FOR UPDATE",
+    "DELETE FROM students",
+    "SELECT 1; SELECT 2",
+    # Hidden by quoting or comments that only some dialects understand
+    "SELECT $$ ' $$; DELETE FROM users; -- '",
+    "SELECT $a$ ' $a$; UPDATE users SET x=1; -- '",
+    "SELECT 1 # '\nINTO OUTFILE '/tmp/x' -- '",
+    "SELECT 1 /*! ; DROP TABLE users */",
+    "SELECT 1 /* /* */ ' */; DELETE FROM users; -- '",
+]
+
+QUERIES = ACCEPTED + REJECTED
+
+
+def timed(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {elapsed / iterations * 1e6:8.2f} us/call")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    print("Verdicts (legacy -> new):")
+    wrong = 0
+    for query in QUERIES:
+        verdict = validate_sql_query(query)
+        marker = "" if verdict == (query in ACCEPTED) else "  WRONG"
+        wrong += bool(marker)
+        print(f"  {str(legacy_validate_sql_query(query)):<5} -> {str(verdict):<5} {query[:70]!r}{marker}")
+
+    for query in ACCEPTED[:3]:
+        print(f"Query ({len(query)} chars): {query[:60]!r}...")
+        iterations = args.iterations
+        legacy = timed("legacy (10 regex searches)", lambda: legacy_validate_sql_query(query), iterations)
+
+        def cold():
+            query_executor._validation_cache.clear()
+            return validate_sql_query(query)
+        new_cold = timed("single pass, cold", cold, iterations)
+        validate_sql_query(query)
+        new_warm = timed("single pass, memoized", lambda: validate_sql_query(query), iterations)
+        print(f"  speedup: {legacy / new_cold:.1f}x cold, {legacy / new_warm:.1f}x memoized")
+
+    if wrong:
+        sys.exit(f"{wrong} wrong verdict(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Query Cost Gate
+Pre-flight EXPLAIN for execute_sql_query: statements the planner expects to be huge
+(typically an accidental cross join in generated SQL) never reach full execution.
+
+- MySQL: EXPLAIN FORMAT=JSON (query_cost, rows_produced_per_join)
+- PostgreSQL: EXPLAIN (FORMAT JSON) (Total Cost, Plan Rows)
+- Other databases have no usable estimates and are never gated
+- The estimated rows are the largest row count of any plan step, so an aggregate
+  over a cross join is caught even though it returns one row
+- Estimates are cached per datasource + query fingerprint (normalized SQL) + bound
+  params (a filter value can change the plan), so repeats of a query cost a
+  dictionary lookup, not a round trip
+- EXPLAIN runs under a short native statement timeout (COST_GATE_EXPLAIN_TIMEOUT,
+  default 2s); a statement that cannot be planned in time is not gated
+
+ACTIONS (COST_GATE, or "cost_gate" per request):
+- off (default): no EXPLAIN
+- reject: raise QueryCostError
+- limit: run with max_rows capped at COST_GATE_LIMIT_ROWS (the LIMIT is applied in the database)
+- job: run in the background (query_jobs.py) with the longest allowed timeout;
+  raise QueryQueuedError carrying the job id
+
+THRESHOLDS (a query is over the gate when it exceeds either one; 0 disables it):
+- COST_GATE_MAX_ROWS: estimated rows (default 10,000,000)
+- COST_GATE_MAX_COST: planner cost units (default 0 - MySQL and PostgreSQL costs are not comparable)
+"""
+
+from collections import OrderedDict
+from sqlalchemy import text
+from typing import Any, Callable, Dict, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+COST_GATE_ACTIONS = ('off', 'reject', 'limit', 'job')
+
+_default_action = os.getenv('COST_GATE', 'off')
+_max_rows = float(os.getenv('COST_GATE_MAX_ROWS', 10_000_000))
+_max_cost = float(os.getenv('COST_GATE_MAX_COST', 0))
+_limit_rows = int(os.getenv('COST_GATE_LIMIT_ROWS', 1000))
+_plan_cache_ttl = int(os.getenv('COST_GATE_CACHE_TTL', 600))  # Seconds
+_plan_cache_size = int(os.getenv('COST_GATE_CACHE_SIZE', 2048))
+_explain_timeout = float(os.getenv('COST_GATE_EXPLAIN_TIMEOUT', 2))  # Seconds
+
+_plan_cache_lock = threading.Lock()
+_plan_cache: "OrderedDict[str, tuple]" = OrderedDict()  # key: (estimate or None, cached_at)
+
+NOT_CACHED = object()
+
+
+class QueryCostError(ValueError):
+    """The planner's estimate for a statement exceeds the cost gate"""
+
+    def __init__(self, message: str, estimate: Dict):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+class QueryQueuedError(ValueError):
+    """The statement was too expensive to run inline and now runs as a background job"""
+
+    def __init__(self, message: str, job_id: str, estimate: Dict):
+        super().__init__(message)
+        self.job_id = job_id
+        self.estimate = estimate
+
+
+def resolve_cost_gate(action: Optional[str]) -> str:
+    """Gate action for a request: the requested one, or COST_GATE"""
+    action = _default_action if action is None else action
+    if action not in COST_GATE_ACTIONS:
+        raise ValueError(f"cost_gate must be one of: {', '.join(COST_GATE_ACTIONS)}")
+    return action
+
+
+def explain_sql(dialect: str, sql: str) -> Optional[str]:
+    """EXPLAIN statement returning a JSON plan for the dialect, None if it has none with estimates"""
+    if dialect == 'mysql':
+        return f"EXPLAIN FORMAT=JSON {sql}"
+    if dialect == 'postgresql':
+        return f"EXPLAIN (FORMAT JSON) {sql}"
+    return None
+
+
+def _values(node: Any, key: str):
+    """Every value stored under key anywhere in a JSON plan"""
+    if isinstance(node, dict):
+        for name, value in node.items():
+            if name == key:
+                yield value
+            else:
+                yield from _values(value, key)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _values(item, key)
+
+
+def parse_plan(dialect: str, raw: Any) -> Optional[Dict]:
+    """{"rows": largest estimated rows of any plan step, "cost": total cost} from a JSON plan"""
+    plan = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    if dialect == 'postgresql':
+        root = plan[0]["Plan"]
+        rows = [float(v) for v in _values(plan, "Plan Rows")]
+        return {"rows": max(rows, default=0.0), "cost": float(root.get("Total Cost", 0))}
+    if dialect == 'mysql':
+        block = plan.get("query_block", {})
+        rows = [float(v) for key in ("rows_produced_per_join", "rows_examined_per_scan") for v in _values(block, key)]
+        return {"rows": max(rows, default=0.0), "cost": float(block.get("cost_info", {}).get("query_cost", 0))}
+    return None
+
+
+def plan_cache_key(datasource_key: str, query: str, params: Optional[Dict] = None) -> str:
+    from query_executor import normalize_query
+    bound = json.dumps(params, sort_keys=True, default=str) if params else ''
+    return hashlib.md5(f"{datasource_key}|{normalize_query(query)}|{bound}".encode()).hexdigest()
+
+
+def get_cached_estimate(key: str):
+    """Cached estimate (may be None for ungated dialects), or NOT_CACHED"""
+    with _plan_cache_lock:
+        entry = _plan_cache.get(key)
+        if entry is None:
+            return NOT_CACHED
+        if time.time() - entry[1] > _plan_cache_ttl:
+            del _plan_cache[key]
+            return NOT_CACHED
+        _plan_cache.move_to_end(key)
+        return entry[0]
+
+
+def cache_estimate(key: str, estimate: Optional[Dict]):
+    with _plan_cache_lock:
+        _plan_cache[key] = (estimate, time.time())
+        _plan_cache.move_to_end(key)
+        if len(_plan_cache) > _plan_cache_size:
+            _plan_cache.popitem(last=False)
+
+
+def _explain_timed_out(e: Exception) -> None:
+    print(f"[COST-GATE] ⚠️ EXPLAIN did not finish in {_explain_timeout:g}s, query not gated: {e}")
+
+
+def estimate_cost(conn, connection_string: str, key: str, query: str, params: Optional[Dict]) -> Optional[Dict]:
+    """Planner estimate for a query, from the plan cache or one EXPLAIN on conn (None if it timed out)"""
+    from query_control import running_query, QueryTimeoutError
+
+    estimate = get_cached_estimate(key)
+    if estimate is not NOT_CACHED:
+        return estimate
+    dialect = conn.dialect.name
+    sql = explain_sql(dialect, query)
+    if sql:
+        try:
+            with running_query(conn, connection_string, None, _explain_timeout):
+                raw = conn.execute(text(sql), params or {}).scalar()
+        except QueryTimeoutError as e:
+            _explain_timed_out(e)
+            return None
+    estimate = parse_plan(dialect, raw) if sql else None
+    cache_estimate(key, estimate)
+    return estimate
+
+
+async def estimate_cost_async(conn, connection_string: str, key: str, query: str, params: Optional[Dict]) -> Optional[Dict]:
+    """estimate_cost() on an AsyncConnection"""
+    from query_control import running_query_async, QueryTimeoutError
+
+    estimate = get_cached_estimate(key)
+    if estimate is not NOT_CACHED:
+        return estimate
+    dialect = conn.dialect.name
+    sql = explain_sql(dialect, query)
+    if sql:
+        try:
+            async with running_query_async(conn, connection_string, None, _explain_timeout):
+                raw = (await conn.execute(text(sql), params or {})).scalar()
+        except QueryTimeoutError as e:
+            _explain_timed_out(e)
+            return None
+    estimate = parse_plan(dialect, raw) if sql else None
+    cache_estimate(key, estimate)
+    return estimate
+
+
+def over_gate(estimate: Optional[Dict]) -> bool:
+    if estimate is None:
+        return False
+    return bool((_max_rows and estimate["rows"] > _max_rows) or (_max_cost and estimate["cost"] > _max_cost))
+
+
+def apply_gate(
+    action: str,
+    estimate: Optional[Dict],
+    max_rows: Optional[int],
+    query_id: Optional[str],
+    run_as_job: Callable[[str], Any],
+    job_info: Optional[Dict] = None
+) -> Optional[int]:
+    """
+    Apply the gate action to a statement.
+
+    Args:
+        action: resolve_cost_gate() result
+        estimate: estimate_cost() result
+        max_rows: Row cap the statement was requested with
+        query_id: Id of the statement (becomes the job id)
+        run_as_job: Called with the job id in the background for "job"
+        job_info: Stored with the job for whoever polls it
+
+    Returns:
+        max_rows to run the statement with (lowered for "limit" when over the gate)
+
+    Raises:
+        QueryCostError ("reject") / QueryQueuedError ("job") when over the gate
+    """
+    if action == 'off' or not over_gate(estimate):
+        return max_rows
+    description = f"estimated {estimate['rows']:,.0f} rows, cost {estimate['cost']:,.0f}"
+    if action == 'limit':
+        print(f"[COST-GATE] ✂️ Limiting query to {_limit_rows} rows ({description})")
+        return _limit_rows if max_rows is None else min(max_rows, _limit_rows)
+    if action == 'job':
+        from query_control import new_query_id
+        from query_jobs import submit_job
+
+        job_id = query_id or new_query_id()
+        submit_job(job_id, lambda: run_as_job(job_id), job_info)
+        print(f"[COST-GATE] 🕒 Query moved to background job {job_id} ({description})")
+        raise QueryQueuedError(f"Query is expensive ({description}) and runs as job {job_id}", job_id, estimate)
+    limits = [f"{_max_rows:,.0f} rows" if _max_rows else None, f"cost {_max_cost:,.0f}" if _max_cost else None]
+    print(f"[COST-GATE] 🚫 Rejected query ({description})")
+    raise QueryCostError(
+        f"Query rejected by the cost gate: {description} (limits: {', '.join(l for l in limits if l)}). "
+        "Check for missing join conditions or add filters.",
+        estimate
+    )
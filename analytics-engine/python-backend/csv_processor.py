@@ -6,49 +6,22 @@ Uses Pandas and DuckDB for CSV processing and query execution
 import pandas as pd
 import duckdb
 from typing import Dict, List, Any, Optional
-from datetime import datetime, date, time, timedelta
-from decimal import Decimal
+from serialization import serialize_value as _serialize_value, serialize_dataframe
 import json
 import os
 
 
 def serialize_value(value: Any) -> Any:
     """
-    Convert Python objects to JSON-serializable types.
+    Convert Python objects to JSON-serializable types (NaN/NaT -> None).
     
-    Handles:
-    - datetime, date, time -> ISO format strings
-    - timedelta -> total seconds (float)
-    - Decimal -> float
-    - bytes -> base64 encoded string
-    - pandas Timestamp -> ISO format string
-    - Other types -> as-is
+    Per-value helper; whole query results go through serialize_dataframe().
     """
     if value is None:
         return None
-    elif pd.isna(value):
+    elif not isinstance(value, (dict, list)) and pd.isna(value):
         return None
-    elif isinstance(value, (pd.Timestamp, datetime)):
-        return value.isoformat()
-    elif isinstance(value, date):
-        return value.isoformat()
-    elif isinstance(value, time):
-        return value.isoformat()
-    elif isinstance(value, timedelta):
-        return value.total_seconds()
-    elif isinstance(value, Decimal):
-        return float(value)
-    elif isinstance(value, bytes):
-        import base64
-        return base64.b64encode(value).decode('utf-8')
-    elif isinstance(value, (dict, list)):
-        # Recursively serialize nested structures
-        if isinstance(value, dict):
-            return {k: serialize_value(v) for k, v in value.items()}
-        else:
-            return [serialize_value(item) for item in value]
-    else:
-        return value
+    return _serialize_value(value)
 
 
 def process_csv_file(file_path: str, table_name: Optional[str] = None) -> Dict:
@@ -153,14 +126,8 @@ def execute_csv_query(file_path: str, query_logic: str) -> List[Dict]:
         result = conn.execute(query_logic).fetchdf()
         conn.close()
         
-        # Convert DataFrame to list of dictionaries and serialize values
-        records = result.to_dict('records')
-        # Serialize all values to ensure JSON compatibility
-        serialized_records = []
-        for record in records:
-            serialized_dict = {k: serialize_value(v) for k, v in record.items()}
-            serialized_records.append(serialized_dict)
-        return serialized_records
+        # Convert DataFrame to list of dictionaries, serializing column by column
+        return serialize_dataframe(result)
     except Exception as e:
         conn.close()
         raise Exception(f"Query execution failed: {str(e)}")
@@ -0,0 +1,683 @@
+"""
+Engine Registry
+Process-wide, thread-safe cache of SQLAlchemy engines shared by the
+query executor, system catalog and schema introspection services.
+
+- One engine (and therefore one connection pool) per normalized connection string
+- Engines are leased with reference counting via lease_engine()
+- Total connections (pool_size + max_overflow of every engine) are bounded by a
+  budget; least-recently-used idle engines are retired to make room
+- Retired engines (expired or evicted) are drained: they are disposed only once
+  the last in-flight lease has been released
+- Async engines (aiomysql / asyncpg, leased with lease_async_engine()) live in the same
+  registry under the same budget, TTL, LRU and drain rules; each is bound to the event
+  loop that created it and sized to the datasource's max_size (waiting costs no thread)
+
+ADAPTIVE POOL SIZING:
+- Each datasource has pool bounds (min_size / max_size), set via configure_pool()
+  or the POOL_MIN_SIZE / POOL_MAX_SIZE / POOL_SIZE defaults
+- Pool events (checkout / checkin) track utilization, and the pool measures how
+  long checkouts wait when it is saturated
+- A background autoscaler re-evaluates every POOL_AUTOSCALE_INTERVAL seconds:
+  busy pools (waits, timeouts, or peak usage at capacity) double, pools that stay
+  mostly idle shrink down to min_size
+- Resizing swaps in a new engine and retires the old one (drain then dispose)
+
+MULTI-PROCESS:
+- Budgets and pools are per process; with N workers the database may see N x budget
+- After fork the child drops every inherited engine (without closing the parent's
+  sockets) and starts with an empty registry, so pools are never shared across processes
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+from query_control import max_timeout
+
+_engine_ttl = int(os.getenv('ENGINE_REGISTRY_TTL', 3600))  # Keep engines for 1 hour
+_max_total_connections = int(os.getenv('ENGINE_REGISTRY_MAX_CONNECTIONS', 60))  # Budget across all pools
+
+# Default pool sizing (overridable per datasource via configure_pool)
+_default_pool_config = {
+    "min_size": int(os.getenv('POOL_MIN_SIZE', 1)),  # Idle pools shrink down to this
+    "max_size": int(os.getenv('POOL_MAX_SIZE', 20)),  # Busy pools grow up to this
+    "pool_size": int(os.getenv('POOL_SIZE', 5)),  # Initial number of connections to maintain
+    "max_overflow": int(os.getenv('POOL_MAX_OVERFLOW', 5)),  # Additional connections beyond pool_size
+    "pool_timeout": int(os.getenv('POOL_TIMEOUT', 30)),  # Seconds to wait for connection from pool
+}
+_autoscale_interval = int(os.getenv('POOL_AUTOSCALE_INTERVAL', 30))  # Seconds between sizing decisions
+_grow_wait_threshold = float(os.getenv('POOL_GROW_WAIT_MS', 50)) / 1000  # Avg checkout wait that triggers growth
+_shrink_after_windows = int(os.getenv('POOL_SHRINK_AFTER_WINDOWS', 4))  # Consecutive quiet windows before shrinking
+
+_lock = threading.RLock()
+_engines: "OrderedDict[str, _EngineEntry]" = OrderedDict()  # LRU order, most recent last
+_retired: List["_EngineEntry"] = []  # Retired engines still draining leases
+_pool_configs: Dict[str, Dict] = {}  # key: per-datasource pool config overrides
+_autoscaler_thread: Optional[threading.Thread] = None
+
+# Sync driver -> async driver for the same database
+_ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'mysql+pymysql': 'mysql+aiomysql',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+}
+
+
+class _PoolUsage:
+    """Utilization and checkout-wait measurements for one pool, reset every autoscale window"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak = 0
+        self.checkouts = 0
+        self.saturated_waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.last_avg_wait = 0.0
+
+    def on_checkout(self, *args):
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.peak = max(self.peak, self.in_use)
+
+    def on_checkin(self, *args):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.saturated_waits += 1
+            self.wait_seconds += seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def take_window(self) -> Dict:
+        """Return this window's measurements and start a new window"""
+        with self._lock:
+            avg_wait = self.wait_seconds / self.checkouts if self.checkouts else 0.0
+            window = {
+                "peak": self.peak,
+                "checkouts": self.checkouts,
+                "saturated_waits": self.saturated_waits,
+                "avg_wait": avg_wait,
+                "timeouts": self.timeouts,
+            }
+            self.last_avg_wait = avg_wait
+            self.peak = self.in_use
+            self.checkouts = 0
+            self.saturated_waits = 0
+            self.wait_seconds = 0.0
+            self.timeouts = 0
+            return window
+
+
+class _MeteredQueuePool(QueuePool):
+    """QueuePool that reports how long checkouts wait when every connection is busy"""
+
+    usage: Optional[_PoolUsage] = None
+    overflow_limit: Optional[int] = None  # max_overflow the pool was created with
+
+    def _do_get(self):
+        # Public accessors only: every connection the pool may open is already checked out
+        saturated = self.overflow_limit is not None and self.checkedout() >= self.size() + self.overflow_limit
+        if not saturated or self.usage is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.usage.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.usage.record_wait(time.perf_counter() - start)
+        return record
+
+    def recreate(self):
+        # engine.dispose() recreates the pool; keep reporting to the same usage
+        pool = super().recreate()
+        pool.usage = self.usage
+        pool.overflow_limit = self.overflow_limit
+        return pool
+
+
+class _EngineEntry:
+    """Bookkeeping for one registered engine"""
+
+    __slots__ = (
+        'key', 'engine', 'loop', 'pool_settings', 'capacity', 'usage', 'created_at',
+        'last_used', 'refcount', 'retired', 'quiet_windows'
+    )
+
+    def __init__(self, key: str, engine, pool_settings: Dict, usage: _PoolUsage, loop=None):
+        self.key = key
+        self.engine = engine
+        self.loop = loop  # Event loop an async engine is bound to (None: sync engine)
+        self.pool_settings = pool_settings
+        self.capacity = pool_settings["pool_size"] + pool_settings["max_overflow"]
+        self.usage = usage
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.refcount = 0
+        self.retired = False
+        self.quiet_windows = 0
+
+
+def _normalize(connection_string: str) -> str:
+    # Imported lazily: schema_introspection itself depends on this module
+    from schema_introspection import _normalize_connection_string
+    return _normalize_connection_string(connection_string)
+
+
+def get_engine_key(connection_string: str) -> str:
+    """Generate consistent registry key from connection string"""
+    normalized = _normalize(connection_string)
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+
+def _async_key(key: str) -> str:
+    return f"async:{key}"
+
+
+def _to_async_url(connection_string: str) -> Optional[str]:
+    """Rewrite a normalized connection string for its async driver, or None if there is none"""
+    url = make_url(connection_string)
+    async_driver = _ASYNC_DRIVERS.get(url.drivername)
+    if not async_driver:
+        return None
+    return url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+def has_async_driver(connection_string: str) -> bool:
+    """Whether lease_async_engine() can serve this datasource"""
+    return _to_async_url(_normalize(connection_string)) is not None
+
+
+def _pool_config(key: str) -> Dict:
+    """Effective pool config for a datasource: defaults merged with its overrides"""
+    config = dict(_default_pool_config)
+    config.update(_pool_configs.get(key, {}))
+    config["min_size"] = max(1, config["min_size"])
+    config["max_size"] = max(config["min_size"], config["max_size"])
+    return config
+
+
+def _pool_settings(config: Dict, pool_size: Optional[int] = None) -> Dict:
+    """SQLAlchemy pool arguments for a pool of `pool_size`, clamped to the datasource bounds"""
+    if pool_size is None:
+        pool_size = config["pool_size"]
+    return {
+        "pool_size": min(max(pool_size, config["min_size"]), config["max_size"]),
+        "max_overflow": config["max_overflow"],
+        "pool_timeout": config["pool_timeout"],
+    }
+
+
+def _create_engine_with_pooling(connection_string: str, pool_settings: Dict, usage: _PoolUsage):
+    """
+    Creates a SQLAlchemy engine with connection pooling and timeout settings.
+    This prevents connection exhaustion and handles transient failures.
+
+    Args:
+        connection_string: Normalized database connection string
+        pool_settings: pool_size / max_overflow / pool_timeout for this engine
+        usage: Collector that the pool reports utilization and checkout waits to
+
+    Returns:
+        SQLAlchemy Engine instance with pooling configured
+    """
+    engine = create_engine(
+        connection_string,
+        poolclass=_MeteredQueuePool,
+        **pool_settings,
+        pool_recycle=3600,  # Recycle connections after 1 hour
+        pool_pre_ping=True,  # Verify connections before using (detects stale connections)
+        connect_args={
+            'connect_timeout': 10,  # Connection timeout in seconds
+            # Socket read timeout: a backstop behind the server-side statement timeout (query_control.py)
+            'read_timeout': int(max_timeout()) + 10,
+            'write_timeout': 30,  # Write timeout in seconds
+        } if 'mysql' in connection_string else {}
+    )
+    engine.pool.usage = usage
+    engine.pool.overflow_limit = pool_settings["max_overflow"]
+    event.listen(engine, 'checkout', usage.on_checkout)
+    event.listen(engine, 'checkin', usage.on_checkin)
+    return engine
+
+
+def _async_pool_settings(config: Dict) -> Dict:
+    """Async pools are sized to the datasource's upper bound: waiting queries cost no threads"""
+    return {
+        "pool_size": config["max_size"],
+        "max_overflow": config["max_overflow"],
+        "pool_timeout": config["pool_timeout"],
+    }
+
+
+def _create_async_engine_with_pooling(async_url: str, pool_settings: Dict, usage: _PoolUsage):
+    """Async counterpart of _create_engine_with_pooling (same pool settings and usage events)"""
+    # Imported lazily: only the ASGI server needs the async extension (and greenlet)
+    from sqlalchemy.ext.asyncio import create_async_engine
+    engine = create_async_engine(
+        async_url,
+        **pool_settings,
+        pool_recycle=3600,  # Recycle connections after 1 hour
+        pool_pre_ping=True,  # Verify connections before using (detects stale connections)
+        connect_args={'connect_timeout': 10} if async_url.startswith('mysql') else {'timeout': 10},
+    )
+    event.listen(engine.sync_engine, 'checkout', usage.on_checkout)
+    event.listen(engine.sync_engine, 'checkin', usage.on_checkin)
+    return engine
+
+
+def _new_entry(key: str, normalized_connection_string: str, pool_settings: Dict, to_dispose: List, loop=None) -> "_EngineEntry":
+    """Create an engine entry after making room for it in the budget (caller holds _lock)"""
+    _make_room(pool_settings["pool_size"] + pool_settings["max_overflow"], to_dispose)
+    usage = _PoolUsage()
+    if loop is None:
+        engine = _create_engine_with_pooling(normalized_connection_string, pool_settings, usage)
+    else:
+        engine = _create_async_engine_with_pooling(normalized_connection_string, pool_settings, usage)
+    entry = _EngineEntry(key, engine, pool_settings, usage, loop)
+    _engines[key] = entry
+    return entry
+
+
+def _total_capacity() -> int:
+    """Connections that live and draining engines may hold (caller holds _lock)"""
+    return sum(e.capacity for e in _engines.values()) + sum(e.capacity for e in _retired)
+
+
+def _retire(entry: _EngineEntry, to_dispose: List[_EngineEntry]):
+    """Remove entry from the registry; dispose now if idle, else once drained (caller holds _lock)"""
+    if _engines.get(entry.key) is entry:
+        del _engines[entry.key]
+    entry.retired = True
+    if entry.refcount == 0:
+        to_dispose.append(entry)
+    else:
+        _retired.append(entry)
+
+
+def _make_room(needed: int, to_dispose: List[_EngineEntry], keep: Optional[_EngineEntry] = None):
+    """Retire least-recently-used idle engines until `needed` connections fit the budget (caller holds _lock)"""
+    for entry in list(_engines.values()):
+        if _total_capacity() + needed <= _max_total_connections:
+            return
+        if entry.refcount == 0 and entry is not keep:
+            print(f"[ENGINE-REGISTRY] ♻️ Evicting idle engine to stay within {_max_total_connections} connections")
+            _retire(entry, to_dispose)
+    if _total_capacity() + needed > _max_total_connections:
+        print(f"[ENGINE-REGISTRY] ⚠️ Connection budget exceeded ({_total_capacity() + needed}/{_max_total_connections}), all engines busy")
+
+
+def _dispose_async(entry: _EngineEntry):
+    """Close an async engine's connections on the event loop they belong to"""
+    loop = entry.loop
+    if loop.is_closed():
+        # Nothing can close them any more: only drop our references
+        entry.engine.sync_engine.dispose(close=False)
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        loop.create_task(entry.engine.dispose())
+    else:
+        asyncio.run_coroutine_threadsafe(entry.engine.dispose(), loop)
+
+
+def _dispose(entries: List[_EngineEntry]):
+    """Dispose engines outside the lock (closing connections may block)"""
+    for entry in entries:
+        try:
+            if entry.loop is not None:
+                _dispose_async(entry)
+            else:
+                entry.engine.dispose()
+        except Exception:
+            pass
+
+
+def _acquire(connection_string: str, use_async: bool = False) -> Optional[_EngineEntry]:
+    """
+    Get (or create) the engine entry for a connection string and take a lease on it.
+
+    use_async: lease the async engine bound to the running event loop instead
+    (None when the database has no async driver)
+    """
+    normalized_connection_string = _normalize(connection_string)
+    key = hashlib.md5(normalized_connection_string.encode()).hexdigest()  # get_engine_key()
+    loop = None
+    if use_async:
+        normalized_connection_string = _to_async_url(normalized_connection_string)
+        if normalized_connection_string is None:
+            return None
+        loop = asyncio.get_running_loop()
+    entry_key = _async_key(key) if use_async else key
+    kind = "async engine" if use_async else "engine"
+    current_time = time.time()
+    to_dispose: List[_EngineEntry] = []
+
+    with _lock:
+        entry = _engines.get(entry_key)
+        if entry is not None and current_time - entry.created_at >= _engine_ttl:
+            print(f"[ENGINE-REGISTRY] ⏰ Engine expired, retiring (in use by {entry.refcount} request(s))")
+            _retire(entry, to_dispose)
+            entry = None
+        elif entry is not None and entry.loop is not loop:
+            # Async connections cannot cross event loops (e.g. a restarted server loop)
+            print(f"[ENGINE-REGISTRY] 🔁 Async engine belongs to another event loop, retiring")
+            _retire(entry, to_dispose)
+            entry = None
+
+        if entry is None:
+            print(f"[ENGINE-REGISTRY] 🔄 Creating new {kind} (not cached)")
+            config = _pool_config(key)
+            pool_settings = _async_pool_settings(config) if use_async else _pool_settings(config)
+            entry = _new_entry(entry_key, normalized_connection_string, pool_settings, to_dispose, loop)
+            if not use_async:
+                _ensure_autoscaler()
+        else:
+            _engines.move_to_end(entry_key)
+            print(f"[ENGINE-REGISTRY] ✅ Using cached {kind} (age: {int(current_time - entry.created_at)}s)")
+
+        entry.refcount += 1
+        entry.last_used = current_time
+
+    _dispose(to_dispose)
+    return entry
+
+
+def _release(entry: _EngineEntry):
+    """Drop a lease; dispose the engine if it was retired and this was the last lease"""
+    to_dispose: List[_EngineEntry] = []
+    with _lock:
+        entry.refcount -= 1
+        entry.last_used = time.time()
+        if entry.retired and entry.refcount == 0:
+            if entry in _retired:
+                _retired.remove(entry)
+            to_dispose.append(entry)
+    _dispose(to_dispose)
+
+
+@contextmanager
+def lease_engine(connection_string: str):
+    """
+    Lease the shared engine for a connection string.
+
+    The engine is guaranteed not to be disposed while the lease is held,
+    even if it expires or is evicted in the meantime.
+
+    Usage:
+        with lease_engine(connection_string) as engine:
+            with engine.connect() as conn:
+                ...
+    """
+    entry = _acquire(connection_string)
+    try:
+        yield entry.engine
+    finally:
+        _release(entry)
+
+
+@asynccontextmanager
+async def lease_async_engine(connection_string: str):
+    """
+    Lease the shared async engine for a connection string on the running event loop.
+
+    Same guarantees and budget as lease_engine(); yields None when the database has
+    no async driver (callers fall back to the sync path).
+
+    Usage:
+        async with lease_async_engine(connection_string) as engine:
+            async with engine.connect() as conn:
+                ...
+    """
+    entry = _acquire(connection_string, use_async=True)
+    if entry is None:
+        yield None
+        return
+    try:
+        yield entry.engine
+    finally:
+        _release(entry)
+
+
+async def dispose_async_engines():
+    """Retire and close every async engine of the running event loop (call on loop shutdown)"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        owned = [e for e in list(_engines.values()) + _retired if e.loop is loop]
+        for entry in owned:
+            if _engines.get(entry.key) is entry:
+                del _engines[entry.key]
+            entry.retired = True
+            if entry in _retired:
+                _retired.remove(entry)
+    for entry in owned:
+        try:
+            await entry.engine.dispose()
+        except Exception:
+            pass
+    print(f"[ENGINE-REGISTRY] 🗑️ Disposed {len(owned)} async engine(s)")
+
+
+def warm_engine(connection_string: str) -> int:
+    """
+    Create the engine for a connection string (if needed) and open its minimum
+    number of connections, so the first real request skips connect + pre-ping.
+
+    Returns:
+        Number of connections opened
+    """
+    entry = _acquire(connection_string)
+    connections = []
+    try:
+        target = min(_pool_config(entry.key)["min_size"], entry.pool_settings["pool_size"])
+        for _ in range(target):
+            connections.append(entry.engine.connect())
+        return len(connections)
+    finally:
+        # Returned connections stay open in the pool
+        for conn in connections:
+            conn.close()
+        _release(entry)
+
+
+def get_pool_config(connection_string: str) -> Dict:
+    """Effective pool config for a datasource (defaults merged with its configure_pool overrides)"""
+    key = get_engine_key(connection_string)
+    with _lock:
+        return _pool_config(key)
+
+
+def configure_pool(
+    connection_string: str,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
+    pool_timeout: Optional[int] = None
+):
+    """
+    Set pool sizing for one datasource. Unset values fall back to the defaults.
+
+    Args:
+        connection_string: Database connection string
+        min_size: Smallest pool the autoscaler may shrink to
+        max_size: Largest pool the autoscaler may grow to
+        pool_size: Initial pool size
+        max_overflow: Additional connections beyond pool_size
+        pool_timeout: Seconds to wait for a connection from the pool
+    """
+    key = get_engine_key(connection_string)
+    overrides = {
+        name: int(value)
+        for name, value in (
+            ("min_size", min_size),
+            ("max_size", max_size),
+            ("pool_size", pool_size),
+            ("max_overflow", max_overflow),
+            ("pool_timeout", pool_timeout),
+        )
+        if value is not None
+    }
+    to_dispose: List[_EngineEntry] = []
+    with _lock:
+        if _pool_configs.get(key, {}) == overrides:
+            return
+        _pool_configs[key] = overrides
+        config = _pool_config(key)
+        entry = _engines.get(key)
+        if entry is not None:
+            current = entry.pool_settings
+            if (current["max_overflow"] != config["max_overflow"]
+                    or current["pool_timeout"] != config["pool_timeout"]
+                    or not config["min_size"] <= current["pool_size"] <= config["max_size"]):
+                # Next lease picks up a correctly sized engine; this one drains
+                print(f"[ENGINE-REGISTRY] ⚙️ Pool config changed, retiring current engine")
+                _retire(entry, to_dispose)
+        async_entry = _engines.get(_async_key(key))
+        if async_entry is not None and async_entry.pool_settings != _async_pool_settings(config):
+            print(f"[ENGINE-REGISTRY] ⚙️ Pool config changed, retiring current async engine")
+            _retire(async_entry, to_dispose)
+    _dispose(to_dispose)
+
+
+def _next_pool_size(entry: _EngineEntry, window: Dict, config: Dict) -> int:
+    """Decide the pool size for the next window from this window's measurements"""
+    pool_size = entry.pool_settings["pool_size"]
+    busy = (
+        window["avg_wait"] >= _grow_wait_threshold
+        or window["timeouts"] > 0
+        or window["peak"] >= entry.capacity
+    )
+    if busy:
+        entry.quiet_windows = 0
+        return min(config["max_size"], max(pool_size * 2, pool_size + 1))
+
+    if window["peak"] <= pool_size // 2:
+        entry.quiet_windows += 1
+        if entry.quiet_windows >= _shrink_after_windows:
+            entry.quiet_windows = 0
+            return max(config["min_size"], window["peak"])
+    else:
+        entry.quiet_windows = 0
+    return pool_size
+
+
+def _autoscale():
+    """Resize every live pool whose measured load no longer fits its size"""
+    to_dispose: List[_EngineEntry] = []
+    with _lock:
+        for entry in list(_engines.values()):
+            if entry.loop is not None:
+                # Async pools already run at max_size
+                continue
+            config = _pool_config(entry.key)
+            window = entry.usage.take_window()
+            current_size = entry.pool_settings["pool_size"]
+            new_size = _next_pool_size(entry, window, config)
+            if new_size == current_size:
+                continue
+            if new_size > current_size:
+                # Only grow as far as the connection budget allows
+                _make_room(new_size - current_size, to_dispose, keep=entry)
+                headroom = _max_total_connections - _total_capacity()
+                new_size = min(new_size, current_size + max(0, headroom))
+                if new_size <= current_size:
+                    continue
+            print(f"[ENGINE-REGISTRY] 📐 Resizing pool {current_size} -> {new_size} "
+                  f"(peak {window['peak']}, avg wait {window['avg_wait'] * 1000:.1f}ms, timeouts {window['timeouts']})")
+            normalized_connection_string = entry.engine.url.render_as_string(hide_password=False)
+            _retire(entry, to_dispose)
+            _new_entry(entry.key, normalized_connection_string, _pool_settings(config, new_size), to_dispose)
+    _dispose(to_dispose)
+
+
+def _autoscale_loop():
+    while True:
+        time.sleep(_autoscale_interval)
+        try:
+            _autoscale()
+        except Exception as e:
+            print(f"[ENGINE-REGISTRY] Autoscaler error: {e}")
+
+
+def _ensure_autoscaler():
+    """Start the background autoscaler once per process (caller holds _lock)"""
+    global _autoscaler_thread
+    if _autoscaler_thread is None or not _autoscaler_thread.is_alive():
+        _autoscaler_thread = threading.Thread(target=_autoscale_loop, name="pool-autoscaler", daemon=True)
+        _autoscaler_thread.start()
+
+
+def clear_engines():
+    """Retire all engines (idle ones are disposed now, busy ones once drained)"""
+    to_dispose: List[_EngineEntry] = []
+    with _lock:
+        for entry in list(_engines.values()):
+            _retire(entry, to_dispose)
+    _dispose(to_dispose)
+    print("[ENGINE-REGISTRY] 🗑️ Engine registry cleared")
+
+
+def get_registry_stats() -> Dict:
+    """Snapshot of registry state for monitoring"""
+    current_time = time.time()
+    with _lock:
+        return {
+            "max_total_connections": _max_total_connections,
+            "total_capacity": _total_capacity(),
+            "engines": [
+                {
+                    "key": entry.key,
+                    "async": entry.loop is not None,
+                    "pool_size": entry.pool_settings["pool_size"],
+                    "max_overflow": entry.pool_settings["max_overflow"],
+                    "capacity": entry.capacity,
+                    "checked_out": entry.usage.in_use,
+                    "avg_wait_ms": round(entry.usage.last_avg_wait * 1000, 2),
+                    "in_use": entry.refcount,
+                    "age_seconds": int(current_time - entry.created_at),
+                    "idle_seconds": int(current_time - entry.last_used),
+                }
+                for entry in _engines.values()
+            ],
+            "draining": len(_retired),
+        }
+
+
+def _reset_after_fork():
+    """Forget engines inherited from the parent process (runs in the child right after fork)"""
+    global _lock, _autoscaler_thread
+    _lock = threading.RLock()
+    for entry in list(_engines.values()) + _retired:
+        try:
+            # close=False: the sockets belong to the parent, only drop our references
+            engine = entry.engine.sync_engine if entry.loop is not None else entry.engine
+            engine.dispose(close=False)
+        except Exception:
+            pass
+    _engines.clear()
+    _retired.clear()
+    _autoscaler_thread = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,50 @@
+"""
+Gunicorn configuration for the Python API (production serving mode)
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment:
+- PORT: Port to bind (default 8000)
+- GUNICORN_WORKERS: Worker processes (default 4)
+- GUNICORN_THREADS: Request threads per worker (default 8)
+- GUNICORN_TIMEOUT: Seconds a silent worker may run before it is killed (default 120)
+- GUNICORN_GRACEFUL_TIMEOUT: Seconds in-flight queries get to finish on shutdown/reload (default 60)
+
+Each worker owns its engines and pools (ENGINE_REGISTRY_MAX_CONNECTIONS applies per worker),
+so the database may see up to GUNICORN_WORKERS x ENGINE_REGISTRY_MAX_CONNECTIONS connections.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_class = "gthread"  # Threads per worker: long DB round-trips don't block other requests
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+# Import the app in each worker, never in the master - no engine can exist before fork
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # engine_registry drops inherited engines via os.register_at_fork; pools start empty here
+    server.log.info(f"[PYTHON API] Worker {worker.pid} forked, engine registry is per-process")
+
+
+def post_worker_init(worker):
+    # Warm this worker's own pools and schema cache in the background
+    from warmup import start_warmup
+    start_warmup()
+
+
+def worker_exit(server, worker):
+    # Runs after in-flight requests have drained (or graceful_timeout expired)
+    from engine_registry import clear_engines
+    clear_engines()
+    server.log.info(f"[PYTHON API] Worker {worker.pid} exited, engines disposed")
@@ -0,0 +1,288 @@
+"""
+Row Limits and Pagination
+Builds LIMITed page queries and opaque continuation tokens for execute_sql_query.
+
+- max_rows caps the total rows a query can return (across all pages);
+  page_size caps one response. The database applies the LIMIT, so rows past
+  the cap are never fetched.
+- A page fetches one extra row to know whether more exist ("truncated").
+- A query capped by the API's default (fetch_limit) is a first page too: it gets
+  LIMIT cap + 1 appended when it has no LIMIT of its own, and a token to continue.
+- KEYSET pagination is used when the query ends in ORDER BY on plain columns
+  that appear in the result, all ASC or all DESC. The next page is
+  SELECT * FROM (<query>) WHERE (keys) >= (last keys) ORDER BY keys LIMIT n,
+  so deep pages cost the same as the first. Rows that tie on the last key
+  are skipped by count, so keys need not be unique (but should be).
+- Otherwise pages fall back to LIMIT/OFFSET (only stable if the query is ordered).
+
+Tokens are base64url JSON bound to the normalized query text; key values are
+sent as bind parameters, never spliced into SQL.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+import base64
+import hashlib
+import json
+
+PAGE_ALIAS = '_page'
+
+_TOKEN_VERSION = 1
+
+
+class PageTokenError(ValueError):
+    """Continuation token is malformed or belongs to a different query"""
+
+
+def _strip_identifier(token: str) -> str:
+    """Remove identifier quoting: "name", `name` or [name]"""
+    if token[:1] in ('"', '`', '['):
+        return token[1:-1]
+    return token
+
+
+def analyze_query(query: str) -> Dict:
+    """
+    Find the top-level ORDER BY / LIMIT structure of a SELECT.
+
+    Returns:
+        {
+            "body": query without trailing semicolons or comments,
+            "has_limit": True if the top level already has LIMIT / OFFSET / FETCH,
+            "order_keys": [(column name, descending), ...] or None if not keyset-capable,
+            "unordered_body": body without its top-level ORDER BY (None if it has a LIMIT)
+        }
+    """
+    # Shares the tokenizer used for cache-key normalization
+    from query_executor import _SQL_TOKEN_RE
+
+    body = query.strip()
+    tokens = [
+        (m.lastgroup, m.group(), m.start())
+        for m in _SQL_TOKEN_RE.finditer(body)
+        if m.lastgroup not in ('space', 'comment')
+    ]
+    # Drop trailing semicolons and comments: a "-- note" at the end would comment out an appended LIMIT
+    while tokens and tokens[-1][1] == ';':
+        tokens.pop()
+    if tokens:
+        body = body[:tokens[-1][2] + len(tokens[-1][1])]
+
+    depth = 0
+    order_by_index = None
+    has_limit = False
+    for i, (kind, token, _) in enumerate(tokens):
+        if kind == 'other':
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            continue
+        if depth != 0 or kind != 'word':
+            continue
+        word = token.upper()
+        if word == 'ORDER' and i + 1 < len(tokens) and tokens[i + 1][1].upper() == 'BY':
+            order_by_index = i
+        elif word in ('LIMIT', 'OFFSET', 'FETCH'):
+            has_limit = True
+        elif word in ('UNION', 'INTERSECT', 'EXCEPT'):
+            # ORDER BY before a set operator belongs to a branch
+            order_by_index = None
+
+    info = {"body": body, "has_limit": has_limit, "order_keys": None, "unordered_body": None}
+    if order_by_index is None:
+        return info
+
+    # ORDER BY col [ASC|DESC] [, col [ASC|DESC]]... with nothing else after it
+    keys: List[Tuple[str, bool]] = []
+    i = order_by_index + 2
+    while i < len(tokens):
+        name = None
+        # Optional qualifier: table.column -> the result column is "column"
+        while i < len(tokens) and tokens[i][0] in ('word', 'quoted'):
+            name = _strip_identifier(tokens[i][1])
+            i += 1
+            if i < len(tokens) and tokens[i][1] == '.':
+                i += 1
+                continue
+            break
+        if name is None:
+            return info
+        descending = False
+        if i < len(tokens) and tokens[i][1].upper() in ('ASC', 'DESC'):
+            descending = tokens[i][1].upper() == 'DESC'
+            i += 1
+        keys.append((name, descending))
+        if i < len(tokens) and tokens[i][1] == ',':
+            i += 1
+            continue
+        if i < len(tokens) and tokens[i][1].upper() in ('LIMIT', 'OFFSET', 'FETCH'):
+            break
+        if i < len(tokens):
+            # NULLS FIRST, COLLATE, expressions ... - not a plain column list
+            return info
+        break
+
+    if keys and len({descending for _, descending in keys}) == 1:
+        info["order_keys"] = keys
+    if not has_limit:
+        info["unordered_body"] = body[:tokens[order_by_index][2]].rstrip()
+    return info
+
+
+def query_fingerprint(query: str) -> str:
+    """Short hash binding a token to the query it was issued for"""
+    from query_executor import normalize_query
+    return hashlib.md5(normalize_query(query).encode()).hexdigest()[:16]
+
+
+def _token_value(value: Any) -> Any:
+    """Key value as JSON (Decimal kept exact as a string; dates as ISO strings)"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return None  # not representable - forces OFFSET for the next page
+    return value
+
+
+def encode_page_token(state: Dict) -> str:
+    payload = json.dumps({"v": _TOKEN_VERSION, **state}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_page_token(token: str, query: str) -> Dict:
+    """
+    Decode a continuation token and check that it was issued for this query.
+
+    Raises:
+        PageTokenError: if the token is malformed or was issued for another query
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise PageTokenError("Invalid page_token")
+    if not isinstance(state, dict) or state.get("v") != _TOKEN_VERSION:
+        raise PageTokenError("Invalid page_token")
+    if state.get("q") != query_fingerprint(query):
+        raise PageTokenError("page_token was issued for a different query")
+    offset = state.get("o")
+    ties = state.get("t", 0)
+    keys = state.get("k")
+    if not isinstance(offset, int) or offset < 0 or not isinstance(ties, int) or ties < 0:
+        raise PageTokenError("Invalid page_token")
+    if keys is not None and not isinstance(keys, list):
+        raise PageTokenError("Invalid page_token")
+    return state
+
+
+def build_page_query(info: Dict, dialect, limit: int, state: Optional[Dict]) -> Tuple[str, Dict, int]:
+    """
+    SQL for the next page.
+
+    Args:
+        info: analyze_query() result
+        dialect: SQLAlchemy dialect (for identifier quoting)
+        limit: rows to return on this page (one more is fetched to detect truncation)
+        state: decoded continuation token, or None for the first page
+
+    Returns:
+        (sql, bind params, leading rows to skip)
+    """
+    body = info["body"]
+    offset = state["o"] if state else 0
+    keys = state.get("k") if state else None
+
+    if keys is not None and info["order_keys"] and len(keys) == len(info["order_keys"]):
+        quote = dialect.identifier_preparer.quote
+        names = [quote(name) for name, _ in info["order_keys"]]
+        descending = info["order_keys"][0][1]
+        inner = info["unordered_body"] or body
+        params = {f"page_key_{i}": value for i, value in enumerate(keys)}
+        placeholders = [f":page_key_{i}" for i in range(len(keys))]
+        op = '<=' if descending else '>='
+        if len(names) == 1:
+            condition = f"{names[0]} {op} {placeholders[0]}"
+        else:
+            condition = f"({', '.join(names)}) {op} ({', '.join(placeholders)})"
+        direction = ' DESC' if descending else ''
+        ties = state.get("t", 0)
+        sql = (
+            f"SELECT * FROM ({inner}) AS {PAGE_ALIAS} WHERE {condition} "
+            f"ORDER BY {', '.join(name + direction for name in names)} LIMIT {limit + 1 + ties}"
+        )
+        return sql, params, ties
+
+    limit_clause = f"LIMIT {limit + 1}" + (f" OFFSET {offset}" if offset else '')
+    if info["has_limit"]:
+        # The query's own LIMIT must apply first
+        return f"SELECT * FROM ({body}) AS {PAGE_ALIAS} {limit_clause}", {}, 0
+    return f"{body} {limit_clause}", {}, 0
+
+
+def finish_page(
+    query: str,
+    info: Dict,
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    limit: int,
+    state: Optional[Dict],
+    max_rows: Optional[int]
+) -> Tuple[List, bool, Optional[str]]:
+    """
+    Trim the fetched rows to the page and build the continuation token.
+
+    Returns:
+        (page rows, truncated, next page token or None)
+    """
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    offset = (state["o"] if state else 0) + len(rows)
+    truncated = has_more
+
+    if not has_more or (max_rows is not None and offset >= max_rows):
+        return rows, truncated, None
+    return rows, truncated, next_page_token(query, info, columns, rows, state)
+
+
+def next_page_token(
+    query: str,
+    info: Dict,
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    state: Optional[Dict]
+) -> str:
+    """
+    Token for the page after rows (keyset if the last row has the order keys, else offset).
+
+    Args:
+        query: the query as sent (the token is bound to it)
+        info: analyze_query() result
+        columns: result column names
+        rows: the rows of this page, already trimmed to it
+        state: decoded token this page was fetched with, or None for the first page
+    """
+    offset = (state["o"] if state else 0) + len(rows)
+    next_state = {"q": query_fingerprint(query), "o": offset}
+    key_names = [name for name, _ in info["order_keys"] or []]
+    if key_names and rows and all(name in columns for name in key_names):
+        positions = [list(columns).index(name) for name in key_names]
+        last_key = [rows[-1][p] for p in positions]
+        token_keys = [_token_value(v) for v in last_key]
+        if None not in token_keys:
+            ties = 0
+            for row in reversed(rows):
+                if [row[p] for p in positions] != last_key:
+                    break
+                ties += 1
+            if ties == len(rows) and state and state.get("k") == token_keys:
+                # Whole page was one key value: earlier pages' ties still count
+                ties += state.get("t", 0)
+            next_state.update({"k": token_keys, "t": ties})
+
+    return encode_page_token(next_state)
@@ -0,0 +1,324 @@
+"""
+Query Timeouts and Cancellation
+Native per-statement timeouts and server-side cancellation for /execute.
+
+TIMEOUTS (set on the connection right before the statement runs):
+- MySQL: SET SESSION max_execution_time (ms), reset after the statement
+- PostgreSQL: set_config('statement_timeout', ..., is_local), scoped to the statement's transaction
+- Mirrored tables (local DuckDB, see table_mirror.py): a timer interrupts the statement
+- Default STATEMENT_TIMEOUT seconds (30), per-request override capped at STATEMENT_TIMEOUT_MAX (300)
+
+CANCELLATION:
+- Every tracked statement carries its query id: a /* query_id=<id> */ prefix on MySQL,
+  a transaction-local application_name on PostgreSQL (same round trip as the timeout,
+  and the SQL text stays identical so prepared-statement caches keep hitting)
+- cancel_query() finds the statement by that marker in the server's process list
+  and stops it (KILL QUERY / pg_cancel_backend), so it works from any worker
+  process as long as the caller knows the datasource (its read replicas are searched
+  too); SQLite and DuckDB statements are interrupted in-process
+- The pooled connection and the database CPU are released immediately
+"""
+
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Optional
+from sqlalchemy import text
+import os
+import re
+import threading
+import time
+import uuid
+
+_default_timeout = float(os.getenv('STATEMENT_TIMEOUT', 30))  # Seconds
+_max_timeout = float(os.getenv('STATEMENT_TIMEOUT_MAX', 300))  # Ceiling for per-request timeouts
+
+_QUERY_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+_lock = threading.Lock()
+_running: Dict[str, Dict] = {}  # query_id: {connection_string, dialect, dbapi_connection, started_at, cancelled}
+
+
+class QueryTimeoutError(ValueError):
+    """Statement exceeded its timeout and was stopped by the database"""
+
+
+class QueryCancelledError(ValueError):
+    """Statement was cancelled through cancel_query()"""
+
+
+def new_query_id() -> str:
+    return uuid.uuid4().hex
+
+
+def check_query_id(query_id: str) -> str:
+    """Client-supplied query ids end up in SQL comments, so only [A-Za-z0-9_-] is allowed"""
+    if not isinstance(query_id, str) or not _QUERY_ID_RE.match(query_id):
+        raise ValueError("query_id must be 1-64 characters of letters, digits, '-' or '_'")
+    return query_id
+
+
+def resolve_timeout(timeout: Optional[float]) -> float:
+    """Seconds to allow: the default, or the requested value capped at STATEMENT_TIMEOUT_MAX"""
+    if timeout is None:
+        return _default_timeout
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+        raise ValueError("timeout must be a positive number of seconds")
+    return min(float(timeout), _max_timeout)
+
+
+def max_timeout() -> float:
+    return max(_default_timeout, _max_timeout)
+
+
+def tag_sql(sql: str, query_id: Optional[str], dialect: str) -> str:
+    """Prefix a MySQL statement with its query id so it can be found in the process list"""
+    if query_id and dialect == 'mysql':
+        return f"/* query_id={query_id} */ {sql}"
+    return sql
+
+
+def _application_name(query_id: str) -> str:
+    return f"query_id={query_id}"
+
+
+def _session_setup(dialect: str, timeout: Optional[float], query_id: Optional[str]) -> tuple:
+    """(statement applying timeout / marker or None, its params, statement undoing it or None)"""
+    milliseconds = max(1, int(timeout * 1000)) if timeout else None
+    if dialect == 'mysql' and milliseconds:
+        return (
+            f"SET SESSION max_execution_time = {milliseconds}", {},
+            "SET SESSION max_execution_time = DEFAULT"
+        )
+    if dialect == 'postgresql' and (milliseconds or query_id):
+        # is_local = true: both settings end with the transaction the connection rolls back on release
+        settings, params = [], {}
+        if milliseconds:
+            settings.append("set_config('statement_timeout', :statement_timeout, true)")
+            params["statement_timeout"] = str(milliseconds)
+        if query_id:
+            settings.append("set_config('application_name', :application_name, true)")
+            params["application_name"] = _application_name(query_id)
+        return f"SELECT {', '.join(settings)}", params, None
+    return None, {}, None
+
+
+def _register(query_id: Optional[str], connection_string: str, dialect: str, dbapi_connection=None) -> Optional[Dict]:
+    if not query_id:
+        return None
+    entry = {
+        "connection_string": connection_string,
+        "dialect": dialect,
+        "dbapi_connection": dbapi_connection,
+        "started_at": time.time(),
+        "cancelled": False,
+    }
+    with _lock:
+        _running[query_id] = entry
+    return entry
+
+
+def _unregister(query_id: Optional[str]):
+    if query_id:
+        with _lock:
+            _running.pop(query_id, None)
+
+
+def _translate(e: Exception, query_id: Optional[str], entry: Optional[Dict], timeout: Optional[float]) -> Exception:
+    """Turn the driver's timeout / interrupt errors into QueryTimeoutError / QueryCancelledError"""
+    message = str(e).lower()
+    if entry is not None and entry["cancelled"]:
+        return QueryCancelledError(f"Query {query_id} was cancelled")
+    if 'maximum statement execution time exceeded' in message or 'statement timeout' in message:
+        return QueryTimeoutError(f"Query exceeded the statement timeout of {timeout:g}s")
+    if 'interrupted' in message or 'due to user request' in message:
+        # Cancelled from another worker process
+        return QueryCancelledError(f"Query {query_id} was cancelled" if query_id else "Query was cancelled")
+    return e
+
+
+@contextmanager
+def running_query(conn, connection_string: str, query_id: Optional[str], timeout: Optional[float]):
+    """
+    Apply the statement timeout and track the statement for cancellation while it runs.
+
+    Args:
+        conn: SQLAlchemy Connection the statement will run on
+        connection_string: Datasource (used by cancel_query)
+        query_id: Id to register and tag the SQL with (None: not cancellable)
+        timeout: Seconds (None: no timeout)
+
+    Raises:
+        QueryTimeoutError / QueryCancelledError in place of the driver's error
+    """
+    dialect = conn.dialect.name
+    setup_sql, setup_params, reset_sql = _session_setup(dialect, timeout, query_id)
+    if setup_sql:
+        conn.execute(text(setup_sql), setup_params)
+    dbapi_connection = conn.connection.dbapi_connection if dialect == 'sqlite' else None
+    entry = _register(query_id, connection_string, dialect, dbapi_connection)
+    try:
+        yield
+    except Exception as e:
+        translated = _translate(e, query_id, entry, timeout)
+        if translated is e:
+            raise
+        raise translated from e
+    finally:
+        _unregister(query_id)
+        if reset_sql:
+            try:
+                conn.execute(text(reset_sql))
+            except Exception:
+                # Never hand a connection with a stale timeout back to the pool
+                conn.invalidate()
+
+
+@asynccontextmanager
+async def running_query_async(conn, connection_string: str, query_id: Optional[str], timeout: Optional[float]):
+    """Async running_query() for an AsyncConnection"""
+    dialect = conn.dialect.name
+    setup_sql, setup_params, reset_sql = _session_setup(dialect, timeout, query_id)
+    if setup_sql:
+        await conn.execute(text(setup_sql), setup_params)
+    entry = _register(query_id, connection_string, dialect)
+    try:
+        yield
+    except Exception as e:
+        translated = _translate(e, query_id, entry, timeout)
+        if translated is e:
+            raise
+        raise translated from e
+    finally:
+        _unregister(query_id)
+        if reset_sql:
+            try:
+                await conn.execute(text(reset_sql))
+            except Exception:
+                await conn.invalidate()
+
+
+@contextmanager
+def running_local_query(connection, connection_string: str, query_id: Optional[str], timeout: Optional[float]):
+    """
+    running_query() for an in-process DuckDB connection (table_mirror.py): it has no
+    statement timeout, so a timer interrupts it; cancel_query() interrupts it like SQLite.
+    """
+    entry = _register(query_id, connection_string, 'duckdb', connection)
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        connection.interrupt()
+
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    try:
+        yield
+    except Exception as e:
+        if timed_out.is_set():
+            raise QueryTimeoutError(f"Query exceeded the statement timeout of {timeout:g}s") from e
+        translated = _translate(e, query_id, entry, timeout)
+        if translated is e:
+            raise
+        raise translated from e
+    finally:
+        if timer is not None:
+            timer.cancel()
+        _unregister(query_id)
+
+
+def _cancel_on_server(connection_string: str, query_id: str) -> int:
+    """Stop statements tagged with query_id on the database server; returns how many were signalled"""
+    from engine_registry import lease_engine
+
+    with lease_engine(connection_string) as engine, engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == 'mysql':
+            marker = f"/* query_id={query_id.replace('_', chr(92) + '_')} */%"  # '_' is a LIKE wildcard
+            ids = conn.execute(
+                text("SELECT id FROM information_schema.processlist WHERE info LIKE :marker AND id <> CONNECTION_ID()"),
+                {"marker": marker}
+            ).scalars().all()
+            for connection_id in ids:
+                conn.exec_driver_sql(f"KILL QUERY {int(connection_id)}")
+            return len(ids)
+        if dialect == 'postgresql':
+            cancelled = conn.execute(
+                text(
+                    "SELECT pg_cancel_backend(pid) FROM pg_stat_activity "
+                    "WHERE application_name = :application_name AND pid <> pg_backend_pid()"
+                ),
+                {"application_name": _application_name(query_id)}
+            ).scalars().all()
+            return sum(1 for ok in cancelled if ok)
+    return 0
+
+
+def cancel_query(query_id: str, connection_string: Optional[str] = None) -> bool:
+    """
+    Cancel a running statement.
+
+    Args:
+        query_id: Id the statement was started with
+        connection_string: Datasource; required when the statement may be running
+            in another worker process, optional for statements in this one
+
+    Returns:
+        True if a running statement was signalled, False if none was found
+    """
+    check_query_id(query_id)
+    with _lock:
+        entry = _running.get(query_id)
+        if entry is not None:
+            entry["cancelled"] = True
+
+    if entry is not None and entry["dbapi_connection"] is not None:
+        # SQLite runs in-process: interrupt() is safe to call from another thread
+        entry["dbapi_connection"].interrupt()
+        print(f"[QUERY-CONTROL] 🛑 Interrupted query {query_id}")
+        return True
+
+    connection_string = connection_string or (entry["connection_string"] if entry else None)
+    if not connection_string:
+        return False
+
+    # Lazy import: replica_routing depends on engine_registry, which imports this module
+    from replica_routing import read_targets
+
+    # Another process's statement may be running on the primary or on any of its read replicas
+    targets = [entry["connection_string"]] if entry is not None else read_targets(connection_string)
+    signalled = 0
+    for target in targets:
+        try:
+            signalled += _cancel_on_server(target, query_id)
+        except Exception as e:
+            print(f"[QUERY-CONTROL] Could not look for query {query_id} on a server: {e}")
+        if signalled:
+            break
+    if signalled:
+        print(f"[QUERY-CONTROL] 🛑 Cancelled query {query_id} on the server")
+    elif entry is not None:
+        # Registered but not yet (or no longer) visible on the server
+        entry["cancelled"] = False
+    return signalled > 0
+
+
+def get_running_queries() -> Dict[str, Dict]:
+    """Query ids running in this process with their dialect and age in seconds"""
+    now = time.time()
+    with _lock:
+        return {
+            query_id: {"dialect": entry["dialect"], "running_for": round(now - entry["started_at"], 3)}
+            for query_id, entry in _running.items()
+        }
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+    _running.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
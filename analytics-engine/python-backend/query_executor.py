@@ -1,166 +1,837 @@
 """
 Query Execution Service
 Executes SQL queries on databases and CSV files
+
+RESULT CACHE:
+- SQL results are cached in-process, keyed by datasource + normalized query text
+  (whitespace, comments and keyword case ignored; literals and identifiers kept)
+- Entries expire after RESULT_CACHE_TTL seconds (default 60, 0 disables the cache)
+- LRU eviction keeps the total serialized size under RESULT_CACHE_MAX_BYTES
+- Pass use_cache=False to bypass; a force_refresh of the system catalog
+  invalidates every cached result for that datasource
+- Identical queries that are already running are coalesced (singleflight),
+  whether or not the cache is used. Only calls with the same resolved timeout
+  share a statement, and only calls without a client-chosen query_id join one:
+  cancel_query(query_id) must stop the caller's own statement, so a call whose
+  query_id the client picked always runs its own. A coalesced call's generated
+  query_id runs nothing (the leader's id is the one in get_running_queries)
+
+RESULT FORMATS:
+- rows (default): list of {column: value} dictionaries
+- columnar: column names, value types and one value array per column
+  (no repeated keys - several times smaller for wide/long results)
+- arrow: Apache Arrow IPC stream bytes (requires pyarrow)
+
+ROW LIMITS AND PAGINATION (see pagination.py):
+- max_rows caps the rows a query returns, page_size the rows per response;
+  both are applied as a LIMIT in the database
+- page_token continues from a previous page: keyset pagination when the query
+  is ORDER BY plain result columns, LIMIT/OFFSET otherwise
+- fetch_limit caps a query sent without paging options: LIMIT fetch_limit + 1 is
+  appended unless it has a LIMIT of its own (then rows are read from a server-side
+  cursor and the rest is never buffered), and a truncated result carries a
+  next_page_token like an explicit page; EXECUTE_MAX_ROWS (default 100000, 0 = no
+  cap) is the API's fetch_limit, the page size of its continuations and the
+  ceiling for max_rows
+
+BIND PARAMETERS AND TEMPLATES (see query_templates.py):
+- params binds values to :name placeholders (never spliced into the SQL text)
+- template_id runs a registered template: validated and compiled once
+
+TIMEOUTS AND CANCELLATION (see query_control.py):
+- Every statement runs with a native statement timeout (STATEMENT_TIMEOUT, default 30s)
+- Statements started with a query_id can be stopped on the server with cancel_query()
+
+COST GATE (see cost_gate.py):
+- Optional pre-flight EXPLAIN (COST_GATE / cost_gate): statements estimated over
+  COST_GATE_MAX_ROWS rows are rejected, LIMITed, or moved to a background job
+- Estimates are cached per query fingerprint, so repeats skip the EXPLAIN
+
+APPROXIMATE MODE (see approximate.py):
+- sample_rate runs a single-table SELECT on a sample (TABLESAMPLE on PostgreSQL,
+  primary-key ranges on MySQL / SQLite); COUNT and SUM are scaled up and come
+  with 95% error bounds
+
+ROLLUP STORE (see rollup_store.py, ROLLUP_STORE=on):
+- Aggregate queries repeated often enough are materialized into a local DuckDB store
+  in the background and answered from it; rollups are refreshed on a schedule, by
+  watermark (rows appended since the last refresh) where the table allows it
+
+TABLE MIRROR (see table_mirror.py):
+- Queries that only read tables mirrored into local Parquet snapshots run in DuckDB
+  against the snapshots (no page_size / page_token, no approximate mode)
+
+READ REPLICAS (see replica_routing.py):
+- Validated SELECTs run on a healthy read replica of the datasource when one is
+  configured (round-robin or least-busy), on the primary otherwise
+- Replicas that fail health checks or lag past REPLICA_MAX_LAG are skipped
+
+STREAMING:
+- stream_sql_query() reads through a server-side cursor in chunks, so memory
+  stays flat regardless of result size (no result cache, no coalescing)
 """
 
-from sqlalchemy import create_engine, text
-from typing import List, Dict, Any
+from sqlalchemy import text
+from typing import List, Dict, Any, Optional, Iterator
+from collections import OrderedDict
 import pandas as pd
 from datetime import datetime, date, time as dt_time, timedelta
 from decimal import Decimal
 from csv_processor import execute_csv_query
-from schema_introspection import _normalize_connection_string
+from serialization import serialize_value, serialize_column, serialize_rows, serialize_row_lists
+from engine_registry import lease_engine, get_engine_key
+from query_control import running_query, resolve_timeout, max_timeout, tag_sql, QueryTimeoutError, QueryCancelledError
+from query_templates import compiled_text, check_params, get_template
+from pagination import analyze_query, build_page_query, finish_page, next_page_token, decode_page_token, PageTokenError
+from replica_routing import run_read, read_target
+from approximate import analyze_sample_query, build_sample_query, scale_results
+from rollup_store import ROLLUP_ENABLED, rollup_key, note_query, read_rollup, drop_rollups
+from table_mirror import run_mirrored
+from cost_gate import (
+    resolve_cost_gate, plan_cache_key, get_cached_estimate, estimate_cost, apply_gate,
+    NOT_CACHED, QueryCostError, QueryQueuedError
+)
+import singleflight
 import hashlib
+import json
+import os
+import re
+import threading
 import time
 
-# Global engine cache - reuse engines across requests
-_engine_cache: Dict[str, tuple] = {}  # key: (engine, created_at)
-_engine_cache_ttl = 3600  # Keep engines for 1 hour
+# Optional: Apache Arrow IPC result format
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+RESULT_FORMATS = ('rows', 'columnar', 'arrow')
+
+DEFAULT_MAX_ROWS = int(os.getenv('EXECUTE_MAX_ROWS', 100000))  # Row cap for /execute (0 = none)
+
+# Global result cache - avoid re-running identical dashboard queries
+_result_cache: "OrderedDict[str, tuple]" = OrderedDict()  # key: (results, size_bytes, created_at, datasource_key)
+_result_cache_lock = threading.Lock()
+_result_cache_bytes = 0
+_result_cache_ttl = int(os.getenv('RESULT_CACHE_TTL', 60))  # Cache results for 1 minute
+_result_cache_max_bytes = int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64 MB total
+
+# SQL tokens: quoted strings / identifiers, comments, words, whitespace, anything else
+_SQL_TOKEN_RE = re.compile(
+    r"""(?P<string>'(?:[^'\\]|\\.|'')*')"""
+    r"""|(?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])"""
+    r"""|(?P<comment>--(?=\s|$)[^\n]*|/\*.*?\*/)"""
+    r"""|(?P<word>[A-Za-z_][A-Za-z0-9_$]*)"""
+    r"""|(?P<space>\s+)"""
+    r"""|(?P<other>.)""",
+    re.DOTALL
+)
+
+_SQL_KEYWORDS = frozenset("""
+    SELECT FROM WHERE AND OR NOT IN IS NULL AS ON JOIN INNER LEFT RIGHT FULL OUTER CROSS
+    GROUP BY ORDER HAVING LIMIT OFFSET DISTINCT UNION ALL CASE WHEN THEN ELSE END ASC DESC
+    BETWEEN LIKE ILIKE EXISTS WITH OVER PARTITION COUNT SUM AVG MIN MAX CAST TRUE FALSE
+    INTERVAL USING NATURAL FETCH FIRST NEXT ROWS ROW ONLY
+""".split())
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize SQL text for cache keys: comments removed, whitespace collapsed,
+    keywords upper-cased. String literals and identifiers are kept as written.
+    """
+    parts = []
+    pending_space = False
+    for match in _SQL_TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        token = match.group()
+        if kind in ('space', 'comment'):
+            pending_space = True
+            continue
+        if pending_space and parts:
+            parts.append(' ')
+        pending_space = False
+        if kind == 'word' and token.upper() in _SQL_KEYWORDS:
+            token = token.upper()
+        parts.append(token)
+    return ''.join(parts).rstrip(';').strip()
+
+
+def _result_cache_key(connection_string: str, query: str, result_format: str = 'rows', variant: str = '') -> tuple:
+    """(cache key, datasource key) for a query on a datasource (variant: e.g. the page requested)"""
+    datasource_key = get_engine_key(connection_string)
+    normalized = normalize_query(query)
+    return hashlib.md5(f"{datasource_key}|{result_format}|{variant}|{normalized}".encode()).hexdigest(), datasource_key
+
+
+def _get_cached_result(cache_key: str) -> Optional[Any]:
+    """Get cached results or return None"""
+    global _result_cache_bytes
+    with _result_cache_lock:
+        entry = _result_cache.get(cache_key)
+        if entry is None:
+            return None
+        results, size_bytes, created_at, _ = entry
+        if time.time() - created_at >= _result_cache_ttl:
+            del _result_cache[cache_key]
+            _result_cache_bytes -= size_bytes
+            return None
+        _result_cache.move_to_end(cache_key)
+    print(f"[QUERY-EXECUTOR] ✅ Using cached result ({size_bytes} bytes, age: {int(time.time() - created_at)}s)")
+    return results
+
+
+def _cache_result(cache_key: str, datasource_key: str, results: Any):
+    """Cache results, evicting least-recently-used entries to stay under the byte budget"""
+    global _result_cache_bytes
+    if _result_cache_ttl <= 0:
+        return
+    payload = results.get("results") if isinstance(results, dict) and "next_page_token" in results else results
+    size_bytes = len(payload) if isinstance(payload, bytes) else len(json.dumps(results, default=str))
+    # Don't let one huge result flush the whole cache
+    if size_bytes > _result_cache_max_bytes // 4:
+        return
+    with _result_cache_lock:
+        previous = _result_cache.pop(cache_key, None)
+        if previous is not None:
+            _result_cache_bytes -= previous[1]
+        while _result_cache and _result_cache_bytes + size_bytes > _result_cache_max_bytes:
+            _, evicted = _result_cache.popitem(last=False)
+            _result_cache_bytes -= evicted[1]
+        _result_cache[cache_key] = (results, size_bytes, time.time(), datasource_key)
+        _result_cache_bytes += size_bytes
+
+
+def invalidate_result_cache(connection_string: Optional[str] = None):
+    """Drop cached results (and rollups) for one datasource, or all of them if no connection string is given"""
+    global _result_cache_bytes
+    datasource_key = get_engine_key(connection_string) if connection_string else None
+    with _result_cache_lock:
+        for cache_key, entry in list(_result_cache.items()):
+            if datasource_key is None or entry[3] == datasource_key:
+                del _result_cache[cache_key]
+                _result_cache_bytes -= entry[1]
+    drop_rollups(datasource_key)
+    print(f"[QUERY-EXECUTOR] 🗑️ Result cache invalidated ({'all datasources' if datasource_key is None else 'one datasource'})")
+
+
+SECURITY_VALIDATION_ERROR = "Query failed security validation. Only SELECT queries are allowed, and dangerous operations (INSERT, UPDATE, DELETE, DROP, etc.) are blocked."
+
 
+def _serialize_rows(columns, rows) -> List[Dict]:
+    """Convert result rows to a list of dictionaries with JSON-serializable values"""
+    # One converter per column (see serialization.py), not an isinstance chain per cell
+    return serialize_rows(columns, rows)
 
-def _get_cache_key(connection_string: str) -> str:
-    """Generate consistent cache key from connection string"""
-    normalized = _normalize_connection_string(connection_string)
-    return hashlib.md5(normalized.encode()).hexdigest()
 
+_COLUMN_TYPES = (
+    # Checked in order: bool before int (bool is an int), datetime before date
+    (bool, "boolean"),
+    (int, "integer"),
+    ((float, Decimal), "number"),
+    (datetime, "datetime"),
+    (date, "date"),
+    (dt_time, "time"),
+    (timedelta, "number"),
+    (bytes, "binary"),
+    (str, "string"),
+)
 
-def _get_cached_engine(connection_string: str):
-    """Get cached engine or create new one"""
-    cache_key = _get_cache_key(connection_string)
-    current_time = time.time()
+
+def _column_type(values: List[Any]) -> str:
+    """Type name for a column, from its first non-null value"""
+    for value in values:
+        if value is None:
+            continue
+        for python_type, type_name in _COLUMN_TYPES:
+            if isinstance(value, python_type):
+                return type_name
+        return "json"
+    return "null"
+
+
+def _to_columnar(columns, rows) -> Dict:
+    """Transpose rows into {"columns": [...], "types": [...], "data": [[col values], ...]}"""
+    column_values = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    return {
+        "columns": list(columns),
+        "types": [_column_type(values) for values in column_values],
+        "data": [serialize_column(values) for values in column_values],
+    }
+
+
+def _to_arrow_ipc(columns, rows) -> bytes:
+    """Encode rows as an Apache Arrow IPC stream"""
+    column_values = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    arrays = []
+    for values in column_values:
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Mixed or unsupported types: fall back to the JSON-serialized form as text
+            arrays.append(pa.array([None if v is None else str(v) for v in serialize_column(values)], type=pa.string()))
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in columns])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _format_rows(columns, rows, result_format: str) -> Any:
+    """Build the response payload for a result format from raw rows"""
+    if result_format == 'columnar':
+        return _to_columnar(columns, rows)
+    if result_format == 'arrow':
+        return _to_arrow_ipc(columns, rows)
+    return _serialize_rows(columns, rows)
+
+
+def _check_result_format(result_format: str):
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unsupported result format: {result_format}. Use one of: {', '.join(RESULT_FORMATS)}")
+    if result_format == 'arrow' and not ARROW_AVAILABLE:
+        raise ValueError("Arrow result format requires pyarrow. Run: pip install pyarrow")
+
+
+def _translate_query_error(e: Exception) -> ValueError:
+    """Map a driver/SQLAlchemy error to a ValueError with a more helpful message"""
+    if isinstance(e, (QueryTimeoutError, QueryCancelledError, QueryCostError, QueryQueuedError)):
+        return e
     
-    # Check if we have a cached engine that's still valid
-    if cache_key in _engine_cache:
-        engine, created_at = _engine_cache[cache_key]
-        if current_time - created_at < _engine_cache_ttl:
-            print(f"[QUERY-EXECUTOR] ✅ Using cached engine (age: {int(current_time - created_at)}s)")
-            return engine
-        else:
-            # Engine expired, dispose it
-            print(f"[QUERY-EXECUTOR] ⏰ Engine cache expired, disposing old engine")
-            try:
-                engine.dispose()
-            except:
-                pass
-            del _engine_cache[cache_key]
+    # Capture detailed error information
+    error_message = str(e)
+    error_type = type(e).__name__
     
-    # Create new engine
-    print(f"[QUERY-EXECUTOR] 🔄 Creating new engine (not cached)")
-    normalized_connection_string = _normalize_connection_string(connection_string)
-    engine = _create_engine_with_pooling(normalized_connection_string)
-    _engine_cache[cache_key] = (engine, current_time)
-    return engine
+    # Provide more helpful error messages for common SQL errors
+    if 'Unknown column' in error_message or 'doesn\'t exist' in error_message or 'Unknown column' in error_message:
+        return ValueError(f"Column error: {error_message}. Please check column names in the query.")
+    elif 'Table' in error_message and 'doesn\'t exist' in error_message:
+        return ValueError(f"Table error: {error_message}. Please check table name in the query.")
+    elif 'syntax' in error_message.lower():
+        return ValueError(f"SQL syntax error: {error_message}")
+    else:
+        return ValueError(f"Query execution failed ({error_type}): {error_message}")
 
 
-def _create_engine_with_pooling(connection_string: str):
+def execute_sql_query(
+    connection_string: str,
+    query: str,
+    use_cache: bool = True,
+    result_format: str = 'rows',
+    max_rows: Optional[int] = None,
+    page_size: Optional[int] = None,
+    page_token: Optional[str] = None,
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None,
+    template_id: Optional[str] = None,
+    cost_gate: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    fetch_limit: Optional[int] = None,
+    query_id_generated: bool = False
+) -> Any:
     """
-    Creates a SQLAlchemy engine with connection pooling and timeout settings.
-    This prevents connection exhaustion and handles transient failures.
+    Executes a SQL query on a database.
     
     Args:
-        connection_string: Normalized database connection string
+        connection_string: Database connection string
+        query: SQL query to execute (ignored when template_id is given)
+        use_cache: Serve/store the result from the result cache (default: True)
+        result_format: 'rows' (default), 'columnar' or 'arrow'
+        max_rows: Optional cap on the total rows returned across all pages
+        page_size: Optional cap on the rows returned by this call
+        page_token: next_page_token from the previous page of the same query
+        timeout: Statement timeout in seconds (default STATEMENT_TIMEOUT, capped at STATEMENT_TIMEOUT_MAX)
+        query_id: Optional id the running statement can be cancelled by (query_control.cancel_query)
+        params: Values for :name bind placeholders in the query
+        template_id: Id of a registered template to run instead of query
+        cost_gate: 'off', 'reject', 'limit' or 'job' for statements over the EXPLAIN
+                   cost thresholds (default COST_GATE, see cost_gate.py)
+        sample_rate: Run approximately on this fraction of the table (see approximate.py);
+                     the page then carries "approximate" (sample rate, error bounds)
+        fetch_limit: Row cap for a query without max_rows / page_size / page_token
+                     (a first page of fetch_limit rows, continued with page_token)
+        query_id_generated: query_id was generated for the call, not chosen by the client;
+                            such a call may share an identical in-flight call's statement
         
     Returns:
-        SQLAlchemy Engine instance with pooling configured
-    """
-    return create_engine(
-        connection_string,
-        pool_size=5,  # Number of connections to maintain
-        max_overflow=10,  # Additional connections beyond pool_size
-        pool_timeout=30,  # Seconds to wait for connection from pool
-        pool_recycle=3600,  # Recycle connections after 1 hour
-        pool_pre_ping=True,  # Verify connections before using (detects stale connections)
-        connect_args={
-            'connect_timeout': 10,  # Connection timeout in seconds
-            'read_timeout': 30,  # Read timeout in seconds
-            'write_timeout': 30,  # Write timeout in seconds
-        } if 'mysql' in connection_string else {}
+        List of result dictionaries ('rows'), a columnar dictionary ('columnar'),
+        or Arrow IPC stream bytes ('arrow').
+        If max_rows, page_size, page_token or fetch_limit is given, a page instead:
+        {"results": <payload as above>, "row_count": N, "truncated": bool, "next_page_token": str or None}
+    
+    Raises:
+        PageTokenError: page_token is malformed or was issued for another query
+        QueryTimeoutError: the statement ran longer than the timeout
+        QueryCancelledError: the statement was cancelled
+        TemplateNotFoundError: template_id is not registered
+        BindParameterError: a placeholder has no value in params
+        QueryCostError: the cost gate rejected the statement
+        QueryQueuedError: the cost gate moved the statement to a background job
+        ApproximationError: sample_rate was given for a query that cannot be sampled
+    """
+    query, params, timeout, paged, cache_key, datasource_key = _prepare_execution(
+        connection_string, query, result_format, max_rows, page_size, page_token, timeout, params, template_id,
+        sample_rate, fetch_limit
     )
+    # Paging options are applied as a LIMIT in the database; fetch_limit only when fetching
+    row_limit = max_rows if paged else fetch_limit
+    capped = paged or fetch_limit is not None
+    sample_info = analyze_sample_query(query) if sample_rate is not None else None
+    gate = resolve_cost_gate(cost_gate)
+    rollup = _note_rollup_query(
+        connection_string, datasource_key, query, params, use_cache, page_size, page_token, sample_rate
+    )
+    if use_cache:
+        cached_results = _get_cached_result(cache_key)
+        if cached_results is not None:
+            return cached_results
+    # A result cut at fetch_limit continues like a first page of the query
+    continue_query = None if paged else query
+    if rollup is not None:
+        rolled_up = _serve_rollup(rollup, result_format, row_limit, capped, continue_query)
+        if rolled_up is not None:
+            return rolled_up
+    
+    def run_as_job(job_id: str):
+        return execute_sql_query(
+            connection_string, query, use_cache, result_format, max_rows, page_size, page_token,
+            max_timeout(), job_id, params, cost_gate='off', fetch_limit=fetch_limit
+        )
+    
+    def run(target: str):
+        if sample_info is not None:
+            # A sample is cheap by construction: no cost gate
+            return _run_sql_approximate(
+                target, query, sample_info, sample_rate, result_format, row_limit, timeout, query_id, params
+            )
+        row_cap = row_limit
+        if gate != 'off':
+            estimate = _estimate_cost(target, datasource_key, query, params)
+            row_cap = apply_gate(gate, estimate, row_limit, query_id, run_as_job, {"result_format": result_format})
+        if paged or row_cap != row_limit:
+            return _run_sql_page(
+                target, query, result_format, row_cap, page_size, page_token, timeout, query_id, params
+            )
+        return _run_sql_query(target, query, result_format, timeout, query_id, params, fetch_limit)
+    
+    def run_and_cache():
+        results = None
+        if sample_info is None and page_size is None and page_token is None:
+            results = _run_mirrored(
+                connection_string, query, params, result_format, row_limit, capped, timeout, query_id, continue_query
+            )
+        if results is None:
+            # Validated SELECT: a read replica takes it when the datasource has one
+            results = run_read(connection_string, run)
+        if use_cache:
+            _cache_result(cache_key, datasource_key, results)
+        return results
+    
+    if not _may_coalesce(query_id, query_id_generated):
+        return run_and_cache()
+    # Identical queries already in flight share one database round-trip (the gate action is
+    # part of the key: a job started by the gate must not join the call that started it)
+    return singleflight.do(f"execute:{gate}:{timeout:g}:{cache_key}", run_and_cache)
+
 
+def _may_coalesce(query_id: Optional[str], query_id_generated: bool) -> bool:
+    """A call whose query_id the client chose runs its own statement, so cancelling that id stops it"""
+    return query_id is None or query_id_generated
 
-def serialize_value(value: Any) -> Any:
+
+def _prepare_execution(
+    connection_string: str,
+    query: str,
+    result_format: str,
+    max_rows: Optional[int],
+    page_size: Optional[int],
+    page_token: Optional[str],
+    timeout: Optional[float],
+    params: Optional[Dict],
+    template_id: Optional[str],
+    sample_rate: Optional[float] = None,
+    fetch_limit: Optional[int] = None
+) -> tuple:
     """
-    Convert Python objects to JSON-serializable types.
+    Validate an execute request (shared with the async executor).
     
-    Handles:
-    - datetime, date, time -> ISO format strings
-    - timedelta -> total seconds (float)
-    - Decimal -> float
-    - bytes -> base64 encoded string
-    - Other types -> as-is
+    Returns:
+        (query, params, timeout, paged, cache key, datasource key)
     """
-    if value is None:
-        return None
-    elif isinstance(value, datetime):
-        return value.isoformat()
-    elif isinstance(value, date):
-        return value.isoformat()
-    elif isinstance(value, dt_time):
-        return value.isoformat()
-    elif isinstance(value, timedelta):
-        return value.total_seconds()
-    elif isinstance(value, Decimal):
-        return float(value)
-    elif isinstance(value, bytes):
-        import base64
-        return base64.b64encode(value).decode('utf-8')
-    elif isinstance(value, (dict, list)):
-        # Recursively serialize nested structures
-        if isinstance(value, dict):
-            return {k: serialize_value(v) for k, v in value.items()}
-        else:
-            return [serialize_value(item) for item in value]
+    if template_id is not None:
+        # Validated and compiled when it was registered
+        template = get_template(template_id)
+        query, statement = template.sql, template.statement
     else:
-        return value
+        # Validate query (basic security check)
+        if not validate_sql_query(query):
+            raise ValueError(SECURITY_VALIDATION_ERROR)
+        statement = compiled_text(query)
+    params = check_params(statement, params)
+    _check_result_format(result_format)
+    timeout = resolve_timeout(timeout)
+    
+    paged = max_rows is not None or page_size is not None or page_token is not None
+    variant = f"page|{max_rows}|{page_size}|{page_token or ''}" if paged else ''
+    if not paged and fetch_limit is not None:
+        variant = f"fetch|{fetch_limit}"
+    if params:
+        variant += '|params|' + json.dumps(params, sort_keys=True, default=str)
+    if sample_rate is not None:
+        if page_size is not None or page_token is not None:
+            raise ValueError("approximate mode does not support page_size / page_token")
+        if result_format == 'arrow':
+            raise ValueError("approximate mode supports the rows and columnar formats")
+        variant += f'|approximate|{sample_rate}'
+    cache_key, datasource_key = _result_cache_key(connection_string, query, result_format, variant)
+    return query, params, timeout, paged, cache_key, datasource_key
 
 
-def execute_sql_query(connection_string: str, query: str) -> List[Dict]:
+def _note_rollup_query(
+    connection_string: str,
+    datasource_key: str,
+    query: str,
+    params: Dict,
+    use_cache: bool,
+    page_size: Optional[int],
+    page_token: Optional[str],
+    sample_rate: Optional[float]
+) -> Optional[str]:
+    """Count the query towards a rollup; its rollup key if it may be answered from one"""
+    if not ROLLUP_ENABLED or not use_cache or page_size is not None or page_token is not None or sample_rate is not None:
+        return None
+    key = rollup_key(datasource_key, query, params)
+    note_query(key, datasource_key, connection_string, query, params)
+    return key
+
+
+def _serve_rollup(
+    key: str,
+    result_format: str,
+    max_rows: Optional[int],
+    paged: bool,
+    continue_query: Optional[str] = None
+) -> Any:
+    """Result from the query's rollup (see rollup_store.py), None if it has none yet"""
+    rolled_up = read_rollup(key, max_rows)
+    if rolled_up is None:
+        return None
+    columns, rows, truncated, details = rolled_up
+    print(f"[QUERY-EXECUTOR] 📦 Served from rollup ({len(rows)} rows, age: {int(details['age_seconds'])}s)")
+    return _local_result(columns, rows, truncated, result_format, paged, "rollup", details, continue_query)
+
+
+def _run_mirrored(
+    connection_string: str,
+    query: str,
+    params: Dict,
+    result_format: str,
+    max_rows: Optional[int],
+    paged: bool,
+    timeout: Optional[float],
+    query_id: Optional[str],
+    continue_query: Optional[str] = None
+) -> Any:
+    """Result from the datasource's table snapshots (see table_mirror.py), None if the query needs the source"""
+    mirrored = run_mirrored(connection_string, query, params, max_rows, timeout, query_id)
+    if mirrored is None:
+        return None
+    columns, rows, truncated, details = mirrored
+    print(f"[QUERY-EXECUTOR] 🪞 Ran on mirrored tables ({len(rows)} rows, snapshot age: {int(details['age_seconds'])}s)")
+    return _local_result(columns, rows, truncated, result_format, paged, "mirror", details, continue_query)
+
+
+def _local_result(
+    columns,
+    rows,
+    truncated: bool,
+    result_format: str,
+    paged: bool,
+    source: str,
+    details: Dict,
+    continue_query: Optional[str] = None
+) -> Any:
     """
-    Executes a SQL query on a database.
+    Payload (or page with the source's details) for rows read from a local DuckDB store.
+    A truncated page of continue_query carries a token for its next page (read from the source).
+    """
+    results = _format_rows(columns, rows, result_format)
+    if not paged:
+        return results
+    token = None
+    if truncated and continue_query is not None:
+        token = next_page_token(continue_query, analyze_query(continue_query), columns, rows, None)
+    return {
+        "results": results,
+        "row_count": len(rows),
+        "truncated": truncated,
+        "next_page_token": token,
+        source: details,
+    }
+
+
+def _estimate_cost(connection_string: str, datasource_key: str, query: str, params: Dict) -> Optional[Dict]:
+    """Planner estimate for the cost gate (a plan cache hit needs no connection)"""
+    plan_key = plan_cache_key(datasource_key, query, params)
+    estimate = get_cached_estimate(plan_key)
+    if estimate is not NOT_CACHED:
+        return estimate
+    try:
+        with lease_engine(connection_string) as engine, engine.connect() as conn:
+            return estimate_cost(conn, connection_string, plan_key, query, params)
+    except Exception as e:
+        raise _translate_query_error(e)
+
+
+def _statement(sql: str, query_id: Optional[str], dialect: str):
+    """Cached text() construct for the SQL, unless it carries a per-request query id tag"""
+    tagged = tag_sql(sql, query_id, dialect)
+    return compiled_text(sql) if tagged is sql else text(tagged)
+
+
+def _plan_page(query: str, max_rows: Optional[int], page_size: Optional[int], page_token: Optional[str]) -> tuple:
+    """(query info, token state, rows for this page) - limit 0 means max_rows is already reached"""
+    for name, value in (('max_rows', max_rows), ('page_size', page_size)):
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            raise ValueError(f"{name} must be a positive integer")
+    state = decode_page_token(page_token, query) if page_token else None
+    offset = state["o"] if state else 0
+    limits = [page_size] if page_size is not None else []
+    if max_rows is not None:
+        limits.append(max(0, max_rows - offset))
+    if not limits:
+        raise ValueError("page_token requires page_size or max_rows")
+    return analyze_query(query), state, min(limits)
+
+
+def _page_payload(query, info, columns, rows, limit, state, max_rows, result_format) -> Dict:
+    rows, truncated, next_page_token = finish_page(query, info, columns, rows, limit, state, max_rows)
+    return {
+        "results": _format_rows(columns, rows, result_format),
+        "row_count": len(rows),
+        "truncated": truncated,
+        "next_page_token": next_page_token,
+    }
+
+
+def _fetch_limited_sql(query: str, dialect, fetch_limit: int) -> tuple:
+    """
+    (query info, SQL) for the first fetch_limit rows of an unpaged query: LIMIT fetch_limit + 1
+    appended, or the query unchanged if it has a LIMIT of its own (a subquery around it
+    would break duplicate column names)
+    """
+    info = analyze_query(query)
+    if info["has_limit"]:
+        return info, query
+    sql, _, _ = build_page_query(info, dialect, fetch_limit, None)
+    return info, sql
+
+
+def _run_sql_page(
+    connection_string: str,
+    query: str,
+    result_format: str,
+    max_rows: Optional[int],
+    page_size: Optional[int],
+    page_token: Optional[str],
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None
+) -> Dict:
+    """Run one LIMITed page of a validated query (see pagination.py)"""
+    info, state, limit = _plan_page(query, max_rows, page_size, page_token)
+    try:
+        with lease_engine(connection_string) as engine, engine.connect() as conn, \
+                running_query(conn, connection_string, query_id, timeout):
+            sql, page_params, skip = build_page_query(info, engine.dialect, limit, state)
+            result = conn.execute(_statement(sql, query_id, conn.dialect.name), {**(params or {}), **page_params})
+            columns = list(result.keys())
+            rows = result.fetchall()[skip:] if limit else []
+    except Exception as e:
+        raise _translate_query_error(e)
+    
+    return _page_payload(query, info, columns, rows, limit, state, max_rows, result_format)
+
+
+def _run_sql_approximate(
+    connection_string: str,
+    query: str,
+    sample_info: Dict,
+    sample_rate: float,
+    result_format: str,
+    max_rows: Optional[int],
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None
+) -> Dict:
+    """Run a query on a sample of its table and scale its aggregates (see approximate.py)"""
+    try:
+        with lease_engine(connection_string) as engine, engine.connect() as conn, \
+                running_query(conn, connection_string, query_id, timeout):
+            sql, sample_params, rate, method = build_sample_query(conn, sample_info, sample_rate)
+            # Sampled key ranges change every run: keep them out of the statement cache
+            result = conn.execute(text(tag_sql(sql, query_id, conn.dialect.name)), {**(params or {}), **sample_params})
+            columns = list(result.keys())
+            rows = result.fetchmany(max_rows + 1) if max_rows else result.fetchall()
+    except Exception as e:
+        raise _translate_query_error(e)
+    
+    truncated = max_rows is not None and len(rows) > max_rows
+    columns, rows, details = scale_results(sample_info, columns, rows[:max_rows] if truncated else rows, rate, method)
+    print(f"[QUERY-EXECUTOR] 🎲 Approximate result from a {rate:.2%} sample ({method})")
+    return {
+        "results": _format_rows(columns, rows, result_format),
+        "row_count": len(rows),
+        "truncated": truncated,
+        "next_page_token": None,
+        "approximate": details,
+    }
+
+
+def _run_sql_query(
+    connection_string: str,
+    query: str,
+    result_format: str = 'rows',
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None,
+    fetch_limit: Optional[int] = None
+) -> Any:
+    """Run a validated query on the shared engine and format the rows (a page if fetch_limit is given)"""
+    try:
+        # Lease the shared engine (reuses connections, never disposed mid-query)
+        with lease_engine(connection_string) as engine, engine.connect() as conn, \
+                running_query(conn, connection_string, query_id, timeout):
+            if fetch_limit is None:
+                result = conn.execute(_statement(query, query_id, conn.dialect.name), params or {})
+                rows = result.fetchall()
+            else:
+                info, sql = _fetch_limited_sql(query, conn.dialect, fetch_limit)
+                # Server-side cursor: rows past the cap are never buffered
+                result = conn.execution_options(stream_results=True).execute(
+                    _statement(sql, query_id, conn.dialect.name), params or {}
+                )
+                rows = result.fetchmany(fetch_limit + 1)
+            columns = list(result.keys())
+    except Exception as e:
+        raise _translate_query_error(e)
+    # NOTE: Don't dispose engine here - it's shared via the engine registry!
+    
+    if fetch_limit is None:
+        return _format_rows(columns, rows, result_format)
+    return _page_payload(query, info, columns, rows, fetch_limit, None, None, result_format)
+
+
+_stream_chunk_size = int(os.getenv('STREAM_CHUNK_SIZE', 1000))  # Rows fetched per server-side cursor round-trip
+
+
+def stream_sql_query(
+    connection_string: str,
+    query: str,
+    chunk_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query_id: Optional[str] = None,
+    params: Optional[Dict] = None
+) -> Iterator:
+    """
+    Executes a SQL query with a server-side cursor and yields results incrementally.
+    
+    The first item yielded is the list of column names (the query has run by then,
+    so execution errors surface before any rows are sent); every following item is
+    a chunk of rows, each row a list of serialized values in column order.
+    Closing the generator early releases the cursor and the pooled connection.
     
     Args:
         connection_string: Database connection string
         query: SQL query to execute
-        
-    Returns:
-        List of result dictionaries
+        chunk_size: Rows per chunk (default: STREAM_CHUNK_SIZE)
+        timeout: Optional statement timeout in seconds (streams have none by default,
+                 since reading a large result legitimately takes long)
+        query_id: Optional id the running statement can be cancelled by
+        params: Values for :name bind placeholders in the query
     """
     # Validate query (basic security check)
     if not validate_sql_query(query):
-        raise ValueError("Query failed security validation. Only SELECT queries are allowed, and dangerous operations (INSERT, UPDATE, DELETE, DROP, etc.) are blocked.")
-    
-    # Use cached engine or create new one (reuses connections)
-    engine = _get_cached_engine(connection_string)
+        raise ValueError(SECURITY_VALIDATION_ERROR)
+    params = check_params(compiled_text(query), params)
     
+    chunk_size = chunk_size or _stream_chunk_size
+    timeout = resolve_timeout(timeout) if timeout is not None else None
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text(query))
-            rows = result.fetchall()
-            
-            # Convert to list of dictionaries and serialize values
-            columns = result.keys()
-            serialized_rows = []
-            for row in rows:
-                row_dict = dict(zip(columns, row))
-                # Serialize all values to ensure JSON compatibility
-                serialized_dict = {k: serialize_value(v) for k, v in row_dict.items()}
-                serialized_rows.append(serialized_dict)
-            return serialized_rows
+        with read_target(connection_string) as target, lease_engine(target) as engine, engine.connect() as conn, \
+                running_query(conn, target, query_id, timeout):
+            # stream_results: server-side cursor (pymysql SSCursor, psycopg2 named cursor)
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                _statement(query, query_id, conn.dialect.name), params
+            )
+            yield list(result.keys())
+            for partition in result.partitions():
+                yield serialize_row_lists(partition)
+    except GeneratorExit:
+        raise
     except Exception as e:
-        # Capture detailed error information
-        error_message = str(e)
-        error_type = type(e).__name__
-        
-        # Provide more helpful error messages for common SQL errors
-        if 'Unknown column' in error_message or 'doesn\'t exist' in error_message or 'Unknown column' in error_message:
-            raise ValueError(f"Column error: {error_message}. Please check column names in the query.")
-        elif 'Table' in error_message and 'doesn\'t exist' in error_message:
-            raise ValueError(f"Table error: {error_message}. Please check table name in the query.")
-        elif 'syntax' in error_message.lower():
-            raise ValueError(f"SQL syntax error: {error_message}")
-        else:
-            raise ValueError(f"Query execution failed ({error_type}): {error_message}")
-    # NOTE: Don't dispose engine here - it's cached and reused!
+        raise _translate_query_error(e)
+
+
+# Validator tokens, one reading per SQL dialect; a query must be safe in every reading.
+# Anything the database could treat as code must surface as a word:
+# - PostgreSQL: '' and E'\'' strings, $tag$ ... $tag$ dollar quotes, -- and /* */ comments
+#   (/*! ... */ included); a stray $ or a nested /* fails closed
+# - MySQL: backslash escapes in strings, # and "-- " comments; /*! ... */ and /*M! ... */
+#   executable comments fail closed
+# - SQLite: [bracketed] identifiers (array subscripts in the other two)
+# Groups: comment, word, fail (reject the query); anything else is a literal or punctuation.
+_VALIDATOR_READINGS = [re.compile(pattern, re.DOTALL) for pattern in (
+    r"""(?P<comment>--[^\n]*|/\*.*?\*/)|"(?:[^"]|"")*"|`(?:[^`]|``)*`|[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'"""
+    r"""|\$(?P<tag>(?:[A-Za-z_][A-Za-z0-9_]*)?)\$.*?\$(?P=tag)\$"""
+    r"""|(?P<word>[A-Za-z_][A-Za-z0-9_$]*)|(?P<fail>\$)|\S""",
+    r"""(?P<fail>/\*M?!)|(?P<comment>#[^\n]*|--(?=\s|$)[^\n]*|/\*.*?\*/)"""
+    r"""|'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`(?:[^`]|``)*`"""
+    r"""|(?P<word>[A-Za-z_$][A-Za-z0-9_$]*)|\S""",
+    r"""(?P<comment>--[^\n]*|/\*.*?\*/)|'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]"""
+    r"""|(?P<word>[A-Za-z_$][A-Za-z0-9_$]*)|\S""",
+)]
+
+# Blocked anywhere outside literals and comments (INTO: SELECT ... INTO creates tables / files)
+_DANGEROUS_KEYWORDS = frozenset([
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE',
+    'ALTER', 'TRUNCATE', 'EXEC', 'EXECUTE', 'CALL', 'INTO'
+])
+
+# Memoized verdicts - dashboards re-validate the same few queries constantly
+_validation_cache: "OrderedDict[str, bool]" = OrderedDict()  # key: md5(query) -> safe?
+_validation_cache_lock = threading.Lock()
+_validation_cache_size = int(os.getenv('VALIDATION_CACHE_SIZE', 4096))
+
+
+def _is_safe_select(query: str, token_re) -> bool:
+    """
+    One pass over the tokens: the first word must be SELECT, no word may be dangerous
+    and nothing but comments may follow a ;
+    """
+    first = True
+    ended = False
+    for match in token_re.finditer(query):
+        kind, token = match.lastgroup, match.group()
+        if kind == 'comment':
+            if token.startswith('/*') and '/*' in token[2:]:
+                return False  # Nested comment (PostgreSQL ends it later than we would)
+            continue
+        if ended or kind == 'fail':
+            return False
+        if kind != 'word':
+            ended = token == ';'
+            continue
+        word = token.upper()
+        if first:
+            if word != 'SELECT':
+                return False
+            first = False
+        elif word in _DANGEROUS_KEYWORDS:
+            return False
+    return not first
 
 
 def validate_sql_query(query: str) -> bool:
@@ -168,40 +839,40 @@ def validate_sql_query(query: str) -> bool:
     Validates SQL query for security.
     Only allows SELECT queries, blocks dangerous operations.
     
+    Keywords inside string literals, quoted identifiers and comments are ignored,
+    so SELECT ... WHERE status = 'deleted' or a column named "update" is allowed.
+    The query is tokenized as PostgreSQL, MySQL and SQLite would and must be safe in
+    all three, so quoting one dialect reads differently cannot hide a statement:
+    SELECT $$ ' $$; DELETE FROM users; -- ' and SELECT 1 # '<newline>INTO OUTFILE ...
+    are rejected. Nothing but comments may follow a ;.
+    
     Args:
         query: SQL query string
         
     Returns:
         True if query is safe, False otherwise
     """
-    import re
-    
     if not query or not isinstance(query, str):
         return False
     
-    # Remove leading/trailing whitespace
-    cleaned_query = query.strip()
-    upper_query = cleaned_query.upper()
-    
-    # Must start with SELECT
-    if not upper_query.startswith('SELECT'):
+    # Must start with SELECT (before any comment)
+    if not query.lstrip()[:6].upper() == 'SELECT':
         return False
     
-    # Check for dangerous operations using word boundaries
-    # This prevents false positives like DATE() matching DELETE
-    dangerous_keywords = [
-        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE',
-        'ALTER', 'TRUNCATE', 'EXEC', 'EXECUTE', 'CALL'
-    ]
-    
-    for keyword in dangerous_keywords:
-        # Use word boundary regex to match whole words only
-        # \b matches word boundaries, ensuring we don't match partial words
-        pattern = r'\b' + re.escape(keyword) + r'\b'
-        if re.search(pattern, upper_query, re.IGNORECASE):
-            return False
+    cache_key = hashlib.md5(query.encode('utf-8', 'surrogatepass')).hexdigest()
+    with _validation_cache_lock:
+        verdict = _validation_cache.get(cache_key)
+        if verdict is not None:
+            _validation_cache.move_to_end(cache_key)
+            return verdict
+    
+    verdict = all(_is_safe_select(query, token_re) for token_re in _VALIDATOR_READINGS)
     
-    return True
+    with _validation_cache_lock:
+        _validation_cache[cache_key] = verdict
+        if len(_validation_cache) > _validation_cache_size:
+            _validation_cache.popitem(last=False)
+    return verdict
 
 
 def execute_query_logic(
@@ -0,0 +1,116 @@
+"""
+Background Query Jobs
+Runs queries too expensive for a request/response cycle in the background (see cost_gate.py).
+
+- A job runs on a small thread pool (QUERY_JOB_WORKERS per process) under its query id,
+  so it can be cancelled with /execute/cancel like any other statement
+- Its result is kept for QUERY_JOB_RESULT_TTL seconds after it finishes (default 600),
+  at most QUERY_JOB_MAX_JOBS jobs per process (oldest finished jobs are dropped first)
+- Jobs live in the worker process that started them; poll GET /execute/jobs/<job_id>
+  on the same server (sticky sessions when running several workers)
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import os
+import threading
+import time
+
+_job_workers = int(os.getenv('QUERY_JOB_WORKERS', 4))
+_job_result_ttl = int(os.getenv('QUERY_JOB_RESULT_TTL', 600))  # Seconds
+_max_jobs = int(os.getenv('QUERY_JOB_MAX_JOBS', 256))
+
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()  # job_id: {status, result, error, info, created_at, finished_at}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class JobNotFoundError(ValueError):
+    """No job with that id exists in this process (unknown or expired)"""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, _job_workers), thread_name_prefix="query-job")
+    return _executor
+
+
+def _expire(now: float):
+    """Drop expired results, then the oldest finished jobs beyond the limit (caller holds _lock)"""
+    for job_id, job in list(_jobs.items()):
+        if job["finished_at"] is not None and now - job["finished_at"] > _job_result_ttl:
+            del _jobs[job_id]
+    for job_id, job in list(_jobs.items()):
+        if len(_jobs) <= _max_jobs:
+            break
+        if job["finished_at"] is not None:
+            del _jobs[job_id]
+
+
+def submit_job(job_id: str, fn: Callable[[], Any], info: Optional[Dict] = None) -> str:
+    """
+    Run fn() in the background under job_id (submitting a job that is still running is a no-op).
+
+    Args:
+        job_id: Id to poll the job by
+        fn: The work; its return value becomes the job's result
+        info: Extra details returned with the job (e.g. the result format)
+
+    Returns:
+        job_id
+    """
+    now = time.time()
+    with _lock:
+        _expire(now)
+        job = _jobs.get(job_id)
+        if job is not None and job["status"] == "running":
+            return job_id
+        _jobs[job_id] = {
+            "status": "running", "result": None, "error": None, "info": info or {},
+            "created_at": now, "finished_at": None,
+        }
+        _jobs.move_to_end(job_id)
+        executor = _get_executor()
+
+    def run():
+        try:
+            result, error, status = fn(), None, "succeeded"
+        except Exception as e:
+            result, error, status = None, e, "failed"
+        with _lock:
+            job = _jobs.get(job_id)
+            if job is not None:
+                job.update({"status": status, "result": result, "error": error, "finished_at": time.time()})
+        print(f"[QUERY-JOBS] {'✅' if error is None else '❌'} Job {job_id} {status}")
+
+    executor.submit(run)
+    print(f"[QUERY-JOBS] 🕒 Job {job_id} started")
+    return job_id
+
+
+def get_job(job_id: str) -> Dict:
+    """
+    Current state of a job: {"status": "running" | "succeeded" | "failed", "result", "error", ...}
+
+    Raises:
+        JobNotFoundError: if the job is unknown here or its result has expired
+    """
+    with _lock:
+        _expire(time.time())
+        job = _jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Unknown job_id: {job_id}")
+        return dict(job)
+
+
+def _reset_after_fork():
+    global _lock, _executor
+    _lock = threading.Lock()
+    _executor = None
+    _jobs.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
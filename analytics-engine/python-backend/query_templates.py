@@ -0,0 +1,180 @@
+"""
+Query Templates and Statement Cache
+Parameterized SQL for /execute: the query text stays fixed and values travel as bind params.
+
+- A template is validated once, when it is registered, and its text() construct is
+  compiled once; executions only bind new values (no re-validation, no re-parsing)
+- Template ids are explicit ("sales_by_day") or derived from the normalized SQL
+- Ad-hoc parameterized queries reuse text() constructs from a bounded LRU keyed by SQL text
+- The SQL text sent to the database is byte-identical across executions, so drivers
+  that prepare statements server-side (asyncpg) reuse them and plan caches hit
+
+CONFIGURATION (templates every worker process starts with, first one set wins):
+- QUERY_TEMPLATES_FILE: path to a JSON file
+- QUERY_TEMPLATES: JSON string
+Either holds {"template_id": "SELECT ... WHERE day >= :start_day", ...}.
+Templates registered at runtime (POST /execute/templates) live in the registering process.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+_template_cache_size = int(os.getenv('TEMPLATE_CACHE_SIZE', 1024))
+_statement_cache_size = int(os.getenv('STATEMENT_CACHE_SIZE', 512))
+
+_TEMPLATE_ID_RE = re.compile(r'^[A-Za-z0-9_.:-]{1,128}$')
+
+_lock = threading.Lock()
+_templates: "OrderedDict[str, QueryTemplate]" = OrderedDict()  # template_id: template (LRU)
+_statements: "OrderedDict[str, TextClause]" = OrderedDict()  # SQL text: text() construct (LRU)
+_configured_loaded = False
+
+
+class TemplateNotFoundError(ValueError):
+    """No template is registered under the requested id (in this process)"""
+
+
+class BindParameterError(ValueError):
+    """Bind parameters are missing or not a JSON object"""
+
+
+class QueryTemplate:
+    """A validated SQL template and its compiled text() construct"""
+
+    __slots__ = ('template_id', 'sql', 'statement', 'param_names', 'created_at', 'uses')
+
+    def __init__(self, template_id: str, sql: str, statement: TextClause):
+        self.template_id = template_id
+        self.sql = sql
+        self.statement = statement
+        self.param_names = sorted(statement._bindparams)
+        self.created_at = time.time()
+        self.uses = 0
+
+    def describe(self) -> Dict:
+        return {
+            "template_id": self.template_id,
+            "query": self.sql,
+            "params": self.param_names,
+            "uses": self.uses,
+        }
+
+
+def compiled_text(sql: str) -> TextClause:
+    """text() construct for SQL text, reused from the statement cache"""
+    with _lock:
+        statement = _statements.get(sql)
+        if statement is not None:
+            _statements.move_to_end(sql)
+            return statement
+    statement = text(sql)
+    with _lock:
+        _statements[sql] = statement
+        if len(_statements) > _statement_cache_size:
+            _statements.popitem(last=False)
+    return statement
+
+
+def check_params(statement: TextClause, params: Optional[Dict]) -> Dict[str, Any]:
+    """
+    Check that every :name placeholder in the statement has a value.
+
+    Raises:
+        BindParameterError: params is not an object or placeholders have no value
+    """
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        raise BindParameterError("params must be an object of bind parameter values")
+    missing = [name for name in statement._bindparams if name not in params]
+    if missing:
+        raise BindParameterError(f"Missing bind parameter(s): {', '.join(sorted(missing))}")
+    return params
+
+
+def register_template(query: str, template_id: Optional[str] = None) -> QueryTemplate:
+    """
+    Validate and compile a query template.
+
+    Args:
+        query: SELECT with :name bind placeholders
+        template_id: Optional id; defaults to a hash of the normalized query
+
+    Returns:
+        The registered QueryTemplate (re-registering the same id replaces it)
+    """
+    # Lazy import: query_executor imports this module
+    from query_executor import validate_sql_query, normalize_query, SECURITY_VALIDATION_ERROR
+
+    if not validate_sql_query(query):
+        raise ValueError(SECURITY_VALIDATION_ERROR)
+    if template_id is None:
+        template_id = hashlib.md5(normalize_query(query).encode()).hexdigest()[:16]
+    elif not isinstance(template_id, str) or not _TEMPLATE_ID_RE.match(template_id):
+        raise ValueError("template_id must be 1-128 characters of letters, digits, '_', '.', ':' or '-'")
+
+    template = QueryTemplate(template_id, query, compiled_text(query))
+    with _lock:
+        _templates[template_id] = template
+        _templates.move_to_end(template_id)
+        if len(_templates) > _template_cache_size:
+            _templates.popitem(last=False)
+    print(f"[QUERY-TEMPLATES] ✅ Registered template {template_id} ({len(template.param_names)} params)")
+    return template
+
+
+def get_template(template_id: str) -> QueryTemplate:
+    """
+    Look up a registered template.
+
+    Raises:
+        TemplateNotFoundError: if no template has that id in this process
+    """
+    _load_configured_templates()
+    with _lock:
+        template = _templates.get(template_id)
+        if template is None:
+            raise TemplateNotFoundError(f"Unknown template_id: {template_id}. Register it first.")
+        _templates.move_to_end(template_id)
+        template.uses += 1
+        return template
+
+
+def list_templates() -> List[Dict]:
+    _load_configured_templates()
+    with _lock:
+        return [template.describe() for template in _templates.values()]
+
+
+def _load_configured_templates():
+    """Register QUERY_TEMPLATES_FILE / QUERY_TEMPLATES once per process"""
+    global _configured_loaded
+    if _configured_loaded:
+        return
+    _configured_loaded = True
+
+    file_path = os.getenv('QUERY_TEMPLATES_FILE')
+    try:
+        if file_path:
+            with open(file_path, 'r') as f:
+                raw = f.read()
+        else:
+            raw = os.getenv('QUERY_TEMPLATES')
+        configured = json.loads(raw) if raw and raw.strip() else {}
+    except Exception as e:
+        print(f"[QUERY-TEMPLATES] Could not read configured templates: {e}")
+        return
+
+    for template_id, query in configured.items():
+        try:
+            register_template(query, template_id)
+        except Exception as e:
+            print(f"[QUERY-TEMPLATES] ❌ Skipping template {template_id}: {e}")
@@ -0,0 +1,578 @@
+"""
+Rollup Store
+Materializes the results of frequently repeated aggregate queries into a local DuckDB
+database and answers repeats from it, keeping dashboard tiles off the source database.
+
+- Off unless ROLLUP_STORE=on
+- An aggregate SELECT over one table (see approximate.analyze_sample_query) that runs
+  ROLLUP_MIN_HITS times within ROLLUP_HIT_WINDOW seconds gets a rollup, built in the
+  background; identical queries (same datasource, normalized SQL and params) are then
+  answered from DuckDB
+- use_cache=False, paging (page_size / page_token) and approximate mode always query the source
+- Each worker process keeps its own in-memory store (ROLLUP_MEMORY_LIMIT); at most
+  ROLLUP_MAX_ROLLUPS rollups, and rollups not read for ROLLUP_IDLE_TTL seconds are dropped
+
+REFRESH (every ROLLUP_REFRESH_INTERVAL seconds, default 300):
+- Full: the query runs again and replaces the rollup
+- Incremental: tables listed in ROLLUP_WATERMARKS ({"orders": "id"}) are append-only with a
+  column that grows with every insert. Rollups over them keep partial aggregates per group
+  (COUNT, SUM, MIN, MAX; AVG as SUM and COUNT), and a refresh only aggregates the rows past
+  the last watermark and merges them in. Rows updated or deleted afterwards (or committed
+  late with a lower watermark) are picked up by a full rebuild every ROLLUP_FULL_REFRESH_INTERVAL
+- Incremental refresh needs the query to have no DISTINCT / LIMIT, only those aggregates,
+  and GROUP BY / ORDER BY items that are select items (by expression, alias or position);
+  other queries fall back to full refresh
+- A rollup whose refreshes keep failing stops being served after 3 refresh intervals;
+  a query whose rollup fails to build ROLLUP_MAX_BUILD_FAILURES times (default 3) is
+  not tried again
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from typing import Any, Dict, List, Optional, Tuple
+import duckdb
+import hashlib
+import json
+import os
+import threading
+import time
+
+from engine_registry import lease_engine
+from query_control import running_query, max_timeout
+from replica_routing import run_read
+from approximate import analyze_sample_query, ApproximationError, _AGGREGATES, _split_items, _strip_identifier
+from serialization import rows_to_dataframe
+
+ROLLUP_ENABLED = os.getenv('ROLLUP_STORE', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+_min_hits = int(os.getenv('ROLLUP_MIN_HITS', 5))
+_hit_window = int(os.getenv('ROLLUP_HIT_WINDOW', 600))  # Seconds
+_refresh_interval = int(os.getenv('ROLLUP_REFRESH_INTERVAL', 300))  # Seconds
+_full_refresh_interval = int(os.getenv('ROLLUP_FULL_REFRESH_INTERVAL', 3600))  # Seconds (incremental rollups)
+_idle_ttl = int(os.getenv('ROLLUP_IDLE_TTL', 3600))  # Seconds
+_max_rollups = int(os.getenv('ROLLUP_MAX_ROLLUPS', 64))
+_max_rollup_rows = int(os.getenv('ROLLUP_MAX_ROWS', 100000))
+_max_tracked = int(os.getenv('ROLLUP_TRACKED_QUERIES', 4096))
+_memory_limit = os.getenv('ROLLUP_MEMORY_LIMIT', '256MB')
+_build_workers = int(os.getenv('ROLLUP_WORKERS', 2))
+_max_build_failures = int(os.getenv('ROLLUP_MAX_BUILD_FAILURES', 3))
+
+_MERGE = {'count': 'SUM', 'sum': 'SUM', 'min': 'MIN', 'max': 'MAX'}
+
+_lock = threading.Lock()
+_db = None  # DuckDB connection (one in-memory database per process)
+_executor: Optional[ThreadPoolExecutor] = None
+_refresher_thread: Optional[threading.Thread] = None
+_hits: "OrderedDict[str, list]" = OrderedDict()  # key: [hits, window_start, failed builds] (hits -1: not eligible / scheduled)
+_rollups: "OrderedDict[str, _Rollup]" = OrderedDict()  # key: rollup, least recently read first
+_watermarks: Optional[Dict[str, str]] = None  # lower-cased table name: watermark column
+
+
+class _NotEligible(ValueError):
+    """The query cannot be served from a rollup"""
+
+
+class _Rollup:
+    """One materialized query: its DuckDB table and refresh state"""
+
+    __slots__ = (
+        'key', 'datasource_key', 'connection_string', 'query', 'params', 'table', 'columns', 'plan',
+        'watermark', 'refreshed_at', 'rebuilt_at', 'last_read', 'building', 'row_count'
+    )
+
+    def __init__(self, key: str, datasource_key: str, connection_string: str, query: str, params: Dict):
+        self.key = key
+        self.datasource_key = datasource_key
+        self.connection_string = connection_string
+        self.query = query
+        self.params = params
+        self.table = f"rollup_{key[:16]}"
+        self.columns: List[str] = []
+        self.plan: Optional[Dict] = None  # Incremental plan, None for full refresh
+        self.watermark: Any = None
+        self.refreshed_at: Optional[float] = None
+        self.rebuilt_at: Optional[float] = None
+        self.last_read = time.time()
+        self.building = False
+        self.row_count = 0
+
+
+def rollup_key(datasource_key: str, query: str, params: Optional[Dict]) -> str:
+    """Rollup identity: datasource + normalized SQL + bind params"""
+    from query_executor import normalize_query
+
+    fingerprint = f"{datasource_key}|{normalize_query(query)}|{json.dumps(params or {}, sort_keys=True, default=str)}"
+    return hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def _get_db():
+    global _db
+    if _db is None:
+        _db = duckdb.connect()
+        _db.execute(f"SET memory_limit = '{_memory_limit}'")
+    return _db
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, _build_workers), thread_name_prefix="rollup")
+    return _executor
+
+
+def note_query(key: str, datasource_key: str, connection_string: str, query: str, params: Optional[Dict]):
+    """
+    Count one run of a query; its ROLLUP_MIN_HITS-th run within ROLLUP_HIT_WINDOW schedules a rollup.
+
+    Args:
+        key: rollup_key() of the query
+        datasource_key: Engine key of the datasource (for invalidation)
+        connection_string: Normalized connection string the rollup is built from
+        query: Validated SQL
+        params: Bind values
+    """
+    now = time.time()
+    with _lock:
+        if key in _rollups:
+            return
+        entry = _hits.get(key)
+        if entry is None or (entry[0] >= 0 and now - entry[1] > _hit_window):
+            entry = _hits[key] = [0, now, entry[2] if entry else 0]
+            while len(_hits) > _max_tracked:
+                _hits.popitem(last=False)
+        if entry[0] < 0:
+            return
+        entry[0] += 1
+        if entry[0] < _min_hits:
+            return
+        entry[0] = -1
+        executor = _get_executor()
+    executor.submit(_create_rollup, key, datasource_key, connection_string, query, dict(params or {}))
+
+
+def read_rollup(key: str, max_rows: Optional[int] = None) -> Optional[Tuple[List[str], List[tuple], bool, Dict]]:
+    """
+    Answer a query from its rollup.
+
+    Returns:
+        (columns, rows, truncated, rollup details for the response), or None if the
+        query has no current rollup
+    """
+    now = time.time()
+    with _lock:
+        rollup = _rollups.get(key)
+        if rollup is None or rollup.refreshed_at is None or now - rollup.refreshed_at > 3 * _refresh_interval:
+            return None
+        rollup.last_read = now
+        _rollups.move_to_end(key)
+        table, columns, plan, refreshed_at = rollup.table, rollup.columns, rollup.plan, rollup.refreshed_at
+        cursor = _get_db().cursor()
+    try:
+        select = plan["serve_sql"].format(table=table) if plan else f'SELECT * EXCLUDE (_rollup_pos) FROM "{table}" ORDER BY _rollup_pos'
+        if max_rows:
+            select += f" LIMIT {int(max_rows) + 1}"
+        rows = cursor.execute(select).fetchall()
+    except duckdb.Error as e:
+        # Dropped or replaced mid-read: fall back to the source
+        print(f"[ROLLUP-STORE] ⚠️ Rollup read failed, querying the source: {e}")
+        return None
+    finally:
+        cursor.close()
+    truncated = bool(max_rows) and len(rows) > max_rows
+    details = {
+        "refreshed_at": round(refreshed_at, 3),
+        "age_seconds": round(now - refreshed_at, 3),
+        "refresh": "incremental" if plan else "full",
+    }
+    return columns, rows[:max_rows] if truncated else rows, truncated, details
+
+
+def _load_watermarks() -> Dict[str, str]:
+    global _watermarks
+    if _watermarks is None:
+        try:
+            configured = json.loads(os.getenv('ROLLUP_WATERMARKS') or '{}')
+        except ValueError as e:
+            print(f"[ROLLUP-STORE] Could not read ROLLUP_WATERMARKS: {e}")
+            configured = {}
+        _watermarks = {str(table).lower(): column for table, column in configured.items()}
+    return _watermarks
+
+
+def _tokens(sql: str) -> List[tuple]:
+    from query_executor import _SQL_TOKEN_RE
+
+    return [
+        (m.lastgroup, m.group(), m.start(), m.end())
+        for m in _SQL_TOKEN_RE.finditer(sql)
+        if m.lastgroup not in ('space', 'comment')
+    ]
+
+
+def _split_alias(sql: str) -> Tuple[str, Optional[str]]:
+    """(expression, alias) of one select item"""
+    from query_executor import _SQL_KEYWORDS
+
+    tokens = _tokens(sql)
+    if len(tokens) > 2 and tokens[-2][1].upper() == 'AS' and tokens[-1][0] in ('word', 'quoted'):
+        return sql[:tokens[-2][2]].strip(), _strip_identifier(tokens[-1][1])
+    if (len(tokens) > 1 and tokens[-1][0] in ('word', 'quoted') and tokens[-1][1].upper() not in _SQL_KEYWORDS
+            and (tokens[-2][0] in ('word', 'quoted') or tokens[-2][1] == ')')):
+        return sql[:tokens[-1][2]].strip(), _strip_identifier(tokens[-1][1])
+    if all(t[0] in ('word', 'quoted') or t[1] == '.' for t in tokens):
+        # Plain column: the result column is named after it
+        return sql.strip(), _strip_identifier(tokens[-1][1])
+    return sql.strip(), None
+
+
+def _decompose(expression: str) -> Optional[Tuple[str, Optional[str]]]:
+    """('group', None) or (aggregate, argument) for a mergeable select expression, None otherwise"""
+    tokens = _tokens(expression)
+    words = [t[1].upper() for t in tokens if t[0] == 'word']
+    head = words[0] if words else None
+    if (head in ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX') and len(tokens) > 3 and tokens[0][0] == 'word'
+            and tokens[1][1] == '(' and tokens[-1][1] == ')' and 'OVER' not in words
+            and tokens[2][1].upper() != 'DISTINCT'):
+        depth = 0
+        for i, token in enumerate(tokens[1:], 1):
+            depth += token[1] == '('
+            depth -= token[1] == ')'
+            if depth == 0 and i < len(tokens) - 1:
+                return None  # COUNT(a) + 1 and the like
+        return head.lower(), expression[tokens[2][2]:tokens[-1][2]].strip()
+    if any(t[0] == 'word' and t[1].upper() in _AGGREGATES and i + 1 < len(tokens) and tokens[i + 1][1] == '('
+           for i, t in enumerate(tokens)):
+        return None
+    return 'group', None
+
+
+def _clause_items(body: str, clauses: Dict[str, int], word: str) -> Optional[List[str]]:
+    """Comma-separated items of a top-level GROUP BY / ORDER BY clause (None if absent)"""
+    if word not in clauses:
+        return None
+    start = clauses[word]
+    end = min([offset for offset in clauses.values() if offset > start] or [len(body)])
+    tokens = _tokens(body[start:end])[2:]  # Skip GROUP BY / ORDER BY
+    return [body[start + item[0][2]:start + item[-1][3]] for item in _split_items(tokens) if item]
+
+
+def _item_position(reference: str, expressions: List[str], names: List[Optional[str]]) -> Optional[int]:
+    """Select item a GROUP BY / ORDER BY entry refers to (1-based position, alias or same expression)"""
+    from query_executor import normalize_query
+
+    if reference.isdigit():
+        position = int(reference) - 1
+        return position if 0 <= position < len(expressions) else None
+    name = _strip_identifier(reference).lower()
+    for i, alias in enumerate(names):
+        if alias is not None and alias.lower() == name:
+            return i
+    normalized = normalize_query(reference).upper()
+    for i, expression in enumerate(expressions):
+        if normalize_query(expression).upper() == normalized:
+            return i
+    return None
+
+
+def _plan_incremental(info: Dict, dialect: str, quote) -> Optional[Dict]:
+    """Partial-aggregate plan for watermark refreshes, None if the query needs full refreshes"""
+    table = info["table"]
+    watermarks = _load_watermarks()
+    column = watermarks.get(table.lower()) or watermarks.get(_strip_identifier(info["table_parts"][-1]).lower())
+    clauses = info["clauses"]
+    if column is None or info["distinct"] or any(word in clauses for word in ('LIMIT', 'OFFSET', 'FETCH', 'WINDOW', 'FOR')):
+        return None
+    if any(item["kind"] == 'star' for item in info["items"]):
+        return None
+
+    body = info["body"]
+    expressions, names, kinds = [], [], []
+    for start, end in info["item_spans"]:
+        expression, alias = _split_alias(body[start:end])
+        kind = _decompose(expression)
+        if kind is None:
+            return None
+        expressions.append(expression)
+        names.append(alias)
+        kinds.append(kind)
+
+    group_by = _clause_items(body, clauses, 'GROUP') or []
+    positions = [_item_position(reference, expressions, names) for reference in group_by]
+    if any(p is None or kinds[p][0] != 'group' for p in positions):
+        return None
+    if group_by and not all(kind[0] != 'group' or i in positions for i, kind in enumerate(kinds)):
+        return None
+    if not group_by and any(kind[0] == 'group' for kind in kinds):
+        return None
+
+    order = []
+    for entry in _clause_items(body, clauses, 'ORDER') or []:
+        tokens = _tokens(entry)
+        nulls = ''
+        if len(tokens) > 2 and tokens[-2][1].upper() == 'NULLS':
+            nulls = f" NULLS {tokens[-1][1].upper()}"
+            entry = entry[:tokens[-2][2]]
+            tokens = tokens[:-2]
+        direction = 'ASC'
+        if tokens and tokens[-1][1].upper() in ('ASC', 'DESC'):
+            direction = tokens[-1][1].upper()
+            entry = entry[:tokens[-1][2]]
+        position = _item_position(entry.strip(), expressions, names)
+        if position is None:
+            return None
+        if not nulls:
+            # Keep the source database's NULL ordering (PostgreSQL: NULLs sort high)
+            nulls_high = dialect == 'postgresql'
+            nulls = ' NULLS LAST' if (direction == 'ASC') == nulls_high else ' NULLS FIRST'
+        order.append(f"{position + 1} {direction}{nulls}")
+
+    partials, merges, outputs, groups = [], [], [], []
+    for i, (kind, argument) in enumerate(kinds):
+        if kind == 'group':
+            partials.append(f"{expressions[i]} AS _g{i}")
+            groups.append(f"_g{i}")
+            outputs.append(f"_g{i}")
+        elif kind == 'avg':
+            partials += [f"SUM({argument}) AS _s{i}", f"COUNT({argument}) AS _n{i}"]
+            merges += [f"SUM(_s{i}) AS _s{i}", f"SUM(_n{i}) AS _n{i}"]
+            outputs.append(f"_s{i} / NULLIF(_n{i}, 0)")
+        else:
+            partials.append(f"{kind.upper()}({argument}) AS _a{i}")
+            merges.append(f"{_MERGE[kind]}(_a{i}) AS _a{i}")
+            outputs.append(f"_a{i}")
+
+    table_ref = info["alias"] or info["table_parts"][-1]
+    column_ref = f"{table_ref}.{quote(column)}"
+    select = "SELECT " + ", ".join(partials) + " "
+    if info["where_start"] is not None:
+        before = select + body[info["from_start"]:info["where_start"]] + " (" + body[info["where_start"]:info["where_end"]] + ") AND "
+    else:
+        before = select + body[info["from_start"]:info["from_end"]] + " WHERE "
+    # Group expressions spelled out: positions and aliases refer to the original select list
+    after = " GROUP BY " + ", ".join(expressions[i] for i, kind in enumerate(kinds) if kind[0] == 'group') if groups else ""
+    return {
+        "watermark_sql": f"SELECT MAX({quote(column)}) FROM {table}",
+        "partial_sql": (before, after),  # The watermark condition goes in between
+        "column_ref": column_ref,
+        # Output column names without running the query (body has no trailing ; or comment)
+        "columns_sql": f"SELECT * FROM ({body}) AS _rollup_columns LIMIT 0",
+        "merge_sql": (
+            'CREATE OR REPLACE TABLE "{table}" AS SELECT ' + ", ".join(groups + merges)
+            + ' FROM (SELECT * FROM "{table}" UNION ALL BY NAME SELECT * FROM _rollup_delta)'
+            + (" GROUP BY " + ", ".join(groups) if groups else "")
+        ),
+        "serve_sql": 'SELECT ' + ", ".join(outputs) + ' FROM "{table}"' + (" ORDER BY " + ", ".join(order) if order else ""),
+    }
+
+
+def _store(cursor, table: str, columns: List[str], rows: List[tuple], sql: str):
+    """Run sql (CREATE ... FROM _rollup_delta) with rows registered as _rollup_delta"""
+    cursor.register('_rollup_delta', rows_to_dataframe(columns, rows))
+    try:
+        cursor.execute(sql.format(table=table))
+    finally:
+        cursor.unregister('_rollup_delta')
+
+
+def _fetch(conn, sql: str, params: Dict, limit: int) -> Tuple[List[str], List[tuple]]:
+    result = conn.execute(text(sql), params)
+    return list(result.keys()), result.fetchmany(limit + 1)
+
+
+def _build(rollup: _Rollup, incremental: bool):
+    """Rebuild a rollup from scratch, or merge in the rows past its watermark"""
+    plan = rollup.plan
+
+    def run(target: str):
+        with lease_engine(target) as engine, engine.connect() as conn, \
+                running_query(conn, target, None, max_timeout()):
+            if plan is None:
+                return _fetch(conn, rollup.query, rollup.params, _max_rollup_rows), None, []
+            high = conn.execute(text(plan["watermark_sql"])).scalar()
+            condition = f"{plan['column_ref']} <= :rollup_hi"
+            params = {**rollup.params, "rollup_hi": high}
+            if incremental:
+                condition = f"{plan['column_ref']} > :rollup_lo AND " + condition
+                params["rollup_lo"] = rollup.watermark
+            columns = rollup.columns or list(conn.execute(text(plan["columns_sql"]), rollup.params).keys())
+            if high is None:
+                return ([], []), high, columns
+            before, after = plan["partial_sql"]
+            return _fetch(conn, before + condition + after, params, _max_rollup_rows), high, columns
+
+    (columns, rows), high, output_columns = run_read(rollup.connection_string, run)
+    if len(rows) > _max_rollup_rows:
+        raise _NotEligible(f"result has more than {_max_rollup_rows} rows")
+
+    cursor = _get_db().cursor()
+    try:
+        if plan is None:
+            _store(cursor, rollup.table, [f"c{i}" for i in range(len(columns))] + ['_rollup_pos'],
+                   [tuple(row) + (i,) for i, row in enumerate(rows)],
+                   'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM _rollup_delta')
+            output_columns = columns
+        elif not incremental:
+            _store(cursor, rollup.table, columns, rows, 'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM _rollup_delta')
+        elif rows and columns:
+            _store(cursor, rollup.table, columns, rows, plan["merge_sql"])
+        row_count = cursor.execute(f'SELECT COUNT(*) FROM "{rollup.table}"').fetchone()[0]
+    finally:
+        cursor.close()
+
+    now = time.time()
+    with _lock:
+        rollup.columns = output_columns
+        rollup.row_count = row_count
+        if high is not None or not incremental:
+            rollup.watermark = high if plan else None
+        rollup.refreshed_at = now
+        if not incremental:
+            rollup.rebuilt_at = now
+
+
+def _create_rollup(key: str, datasource_key: str, connection_string: str, query: str, params: Dict):
+    rollup = _Rollup(key, datasource_key, connection_string, query, params)
+    try:
+        info = analyze_sample_query(query)
+        if not info["aggregate"]:
+            raise _NotEligible("not an aggregate query")
+        with lease_engine(connection_string) as engine:
+            rollup.plan = _plan_incremental(info, engine.dialect.name, engine.dialect.identifier_preparer.quote)
+        _build(rollup, incremental=False)
+    except (ApproximationError, _NotEligible) as e:
+        # Not a rollup candidate: stays marked in _hits
+        _drop_table(rollup.table)
+        print(f"[ROLLUP-STORE] Query not materialized: {e}")
+        return
+    except Exception as e:
+        _drop_table(rollup.table)
+        with _lock:
+            entry = _hits.get(key)
+            failures = (entry[2] if entry else 0) + 1
+            if failures < _max_build_failures:
+                # Count again; it may succeed later
+                _hits[key] = [0, time.time(), failures]
+            elif entry is not None:
+                entry[2] = failures  # Stays marked not eligible
+        print(f"[ROLLUP-STORE] ❌ Could not build rollup (attempt {failures} of {_max_build_failures}): {e}")
+        return
+
+    with _lock:
+        _rollups[key] = rollup
+        evicted = [_rollups.popitem(last=False)[1] for _ in range(max(0, len(_rollups) - _max_rollups))]
+        _ensure_refresher()
+    for old in evicted:
+        _forget(old)
+    print(f"[ROLLUP-STORE] 📦 Rollup built ({rollup.row_count} rows, "
+          f"{'incremental' if rollup.plan else 'full'} refresh): {query[:80]}")
+
+
+def _refresh(rollup: _Rollup):
+    with _lock:
+        if rollup.building or _rollups.get(rollup.key) is not rollup:
+            return
+        rollup.building = True
+    incremental = rollup.plan is not None and rollup.rebuilt_at is not None and \
+        time.time() - rollup.rebuilt_at < _full_refresh_interval and rollup.watermark is not None
+    try:
+        _build(rollup, incremental)
+    except Exception as e:
+        print(f"[ROLLUP-STORE] ⚠️ Rollup refresh failed ({'incremental' if incremental else 'full'}): {e}")
+        if incremental:
+            # The next refresh rebuilds it from scratch
+            rollup.rebuilt_at = None
+    finally:
+        with _lock:
+            rollup.building = False
+
+
+def _refresher_loop():
+    while True:
+        time.sleep(max(1, min(_refresh_interval, 30)))
+        try:
+            now = time.time()
+            with _lock:
+                idle = [r for r in _rollups.values() if now - r.last_read > _idle_ttl]
+                for rollup in idle:
+                    del _rollups[rollup.key]
+                due = [
+                    r for r in _rollups.values()
+                    if not r.building and (r.refreshed_at is None or now - r.refreshed_at >= _refresh_interval)
+                ]
+                executor = _get_executor()
+            for rollup in idle:
+                _forget(rollup)
+            for rollup in due:
+                executor.submit(_refresh, rollup)
+        except Exception as e:
+            print(f"[ROLLUP-STORE] Refresh loop error: {e}")
+
+
+def _ensure_refresher():
+    """Start the background refresher once per process (caller holds _lock)"""
+    global _refresher_thread
+    if _refresher_thread is None or not _refresher_thread.is_alive():
+        _refresher_thread = threading.Thread(target=_refresher_loop, name="rollup-refresh", daemon=True)
+        _refresher_thread.start()
+
+
+def _drop_table(table: str):
+    with _lock:
+        cursor = _get_db().cursor()
+    try:
+        cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    finally:
+        cursor.close()
+
+
+def _forget(rollup: _Rollup):
+    """Drop a rollup's table; its query has to earn a new rollup"""
+    _drop_table(rollup.table)
+    with _lock:
+        _hits.pop(rollup.key, None)
+
+
+def drop_rollups(datasource_key: Optional[str] = None):
+    """Drop the rollups of one datasource (engine key), or every rollup"""
+    with _lock:
+        dropped = [r for r in _rollups.values() if datasource_key is None or r.datasource_key == datasource_key]
+        for rollup in dropped:
+            del _rollups[rollup.key]
+    for rollup in dropped:
+        _forget(rollup)
+    if dropped:
+        print(f"[ROLLUP-STORE] 🗑️ Dropped {len(dropped)} rollup(s)")
+
+
+def get_rollup_status() -> List[Dict]:
+    """Every rollup of this process, most recently read last"""
+    now = time.time()
+    with _lock:
+        return [
+            {
+                "query": r.query,
+                "params": r.params,
+                "rows": r.row_count,
+                "refresh": "incremental" if r.plan else "full",
+                "watermark": r.watermark,
+                "age_seconds": round(now - r.refreshed_at, 3) if r.refreshed_at else None,
+                "idle_seconds": round(now - r.last_read, 3),
+            }
+            for r in _rollups.values()
+        ]
+
+
+def _reset_after_fork():
+    # The parent's DuckDB connection and threads don't survive fork: start empty
+    global _lock, _db, _executor, _refresher_thread
+    _lock = threading.Lock()
+    _db = None
+    _executor = None
+    _refresher_thread = None
+    _hits.clear()
+    _rollups.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
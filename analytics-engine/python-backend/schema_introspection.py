@@ -3,82 +3,14 @@ SQL Schema Introspection Service
 Uses SQLAlchemy to introspect database schemas
 """
 
-from sqlalchemy import create_engine, inspect, MetaData, Table
+from sqlalchemy import inspect, MetaData, Table
 from sqlalchemy.engine import Engine
 from typing import Dict, List, Optional
+from engine_registry import lease_engine, get_engine_key
+import singleflight
 import json
-import hashlib
-import time
 from urllib.parse import urlparse, urlunparse, quote_plus
 
-# Global engine cache - reuse engines across requests
-_engine_cache: Dict[str, tuple] = {}  # key: (engine, created_at)
-_engine_cache_ttl = 3600  # Keep engines for 1 hour
-
-
-def _get_cache_key(connection_string: str, schema_name: Optional[str] = None) -> str:
-    """Generate consistent cache key from connection string"""
-    normalized = _normalize_connection_string(connection_string)
-    key_parts = [normalized]
-    if schema_name:
-        key_parts.append(f"schema:{schema_name}")
-    key_string = "|".join(key_parts)
-    return hashlib.md5(key_string.encode()).hexdigest()
-
-
-def _get_cached_engine(connection_string: str):
-    """Get cached engine or create new one"""
-    cache_key = _get_cache_key(connection_string)
-    current_time = time.time()
-    
-    # Check if we have a cached engine that's still valid
-    if cache_key in _engine_cache:
-        engine, created_at = _engine_cache[cache_key]
-        if current_time - created_at < _engine_cache_ttl:
-            print(f"[SCHEMA] ✅ Using cached engine (age: {int(current_time - created_at)}s)")
-            return engine
-        else:
-            # Engine expired, dispose it
-            print(f"[SCHEMA] ⏰ Engine cache expired, disposing old engine")
-            try:
-                engine.dispose()
-            except:
-                pass
-            del _engine_cache[cache_key]
-    
-    # Create new engine
-    print(f"[SCHEMA] 🔄 Creating new engine (not cached)")
-    normalized_connection_string = _normalize_connection_string(connection_string)
-    engine = _create_engine_with_pooling(normalized_connection_string)
-    _engine_cache[cache_key] = (engine, current_time)
-    return engine
-
-
-def _create_engine_with_pooling(connection_string: str):
-    """
-    Creates a SQLAlchemy engine with connection pooling and timeout settings.
-    This prevents connection exhaustion and handles transient failures.
-    
-    Args:
-        connection_string: Normalized database connection string
-        
-    Returns:
-        SQLAlchemy Engine instance with pooling configured
-    """
-    return create_engine(
-        connection_string,
-        pool_size=5,  # Number of connections to maintain
-        max_overflow=10,  # Additional connections beyond pool_size
-        pool_timeout=30,  # Seconds to wait for connection from pool
-        pool_recycle=3600,  # Recycle connections after 1 hour
-        pool_pre_ping=True,  # Verify connections before using (detects stale connections)
-        connect_args={
-            'connect_timeout': 10,  # Connection timeout in seconds
-            'read_timeout': 30,  # Read timeout in seconds
-            'write_timeout': 30,  # Write timeout in seconds
-        } if 'mysql' in connection_string else {}
-    )
-
 
 def _normalize_connection_string(connection_string: str) -> str:
     """
@@ -182,41 +114,48 @@ def introspect_sql_schema(
     Returns:
         Dictionary with source_type and tables metadata
     """
-    # Use cached engine or create new one (reuses connections)
-    engine = _get_cached_engine(connection_string)
-    inspector = inspect(engine)
-    
+    # Concurrent introspections of the same schema share one walk
+    flight_key = f"introspect:{get_engine_key(connection_string)}:{schema_name or ''}"
+    return singleflight.do(flight_key, _introspect_sql_schema, connection_string, schema_name)
+
+
+def _introspect_sql_schema(connection_string: str, schema_name: Optional[str]) -> Dict:
+    """Walk the schema with the SQLAlchemy inspector"""
     tables_metadata = []
     
-    # Get all table names
-    table_names = inspector.get_table_names(schema=schema_name)
-    
-    for table_name in table_names:
-        columns_metadata = []
-        
-        # Get columns for this table
-        columns = inspector.get_columns(table_name, schema=schema_name)
-        
-        for column in columns:
-            columns_metadata.append({
-                "name": column["name"],
-                "description": f"Column {column['name']} of type {column['type']}",
-                "type": str(column["type"])
+    # Lease the shared engine (reuses connections, never disposed mid-introspection)
+    with lease_engine(connection_string) as engine:
+        inspector = inspect(engine)
+        
+        # Get all table names
+        table_names = inspector.get_table_names(schema=schema_name)
+        
+        for table_name in table_names:
+            columns_metadata = []
+            
+            # Get columns for this table
+            columns = inspector.get_columns(table_name, schema=schema_name)
+            
+            for column in columns:
+                columns_metadata.append({
+                    "name": column["name"],
+                    "description": f"Column {column['name']} of type {column['type']}",
+                    "type": str(column["type"])
+                })
+            
+            # Get table comment if available
+            table_comment = None
+            try:
+                table_info = inspector.get_table_comment(table_name, schema=schema_name)
+                table_comment = table_info.get("text") if table_info else None
+            except:
+                pass
+            
+            tables_metadata.append({
+                "name": table_name,
+                "description": table_comment or f"Table {table_name}",
+                "columns": columns_metadata
             })
-        
-        # Get table comment if available
-        table_comment = None
-        try:
-            table_info = inspector.get_table_comment(table_name, schema=schema_name)
-            table_comment = table_info.get("text") if table_info else None
-        except:
-            pass
-        
-        tables_metadata.append({
-            "name": table_name,
-            "description": table_comment or f"Table {table_name}",
-            "columns": columns_metadata
-        })
     
     return {
         "source_type": "SQL_DB",
@@ -0,0 +1,174 @@
+"""
+Result Serialization
+Converts query results to JSON-serializable values column by column.
+
+The converter for a column is chosen once, from the set of Python types present
+in it (one C-level pass), then applied to the whole column:
+- int / float / str / bool columns are passed through untouched
+- single-type columns (datetime, Decimal, bytes, ...) map one converter, no isinstance chain
+- mixed columns fall back to serialize_value() per cell
+
+Driver type codes in cursor.description differ per DBAPI (and SQLite has none),
+so the value types are the portable source of truth.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+import base64
+import pandas as pd
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.b64encode(value).decode('utf-8')
+
+
+def serialize_value(value: Any) -> Any:
+    """
+    Convert Python objects to JSON-serializable types.
+
+    Handles:
+    - datetime, date, time -> ISO format strings
+    - timedelta -> total seconds (float)
+    - Decimal -> float
+    - bytes -> base64 encoded string
+    - Other types -> as-is
+    """
+    if value is None:
+        return None
+    elif isinstance(value, datetime):
+        return value.isoformat()
+    elif isinstance(value, date):
+        return value.isoformat()
+    elif isinstance(value, time):
+        return value.isoformat()
+    elif isinstance(value, timedelta):
+        return value.total_seconds()
+    elif isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return _b64encode(bytes(value))
+    elif isinstance(value, (dict, list)):
+        # Recursively serialize nested structures
+        if isinstance(value, dict):
+            return {k: serialize_value(v) for k, v in value.items()}
+        else:
+            return [serialize_value(item) for item in value]
+    else:
+        return value
+
+
+# Values of these exact types are already JSON-serializable
+_PASSTHROUGH_TYPES = frozenset((type(None), int, float, str, bool))
+
+# Exact type -> converter (type() dispatch: datetime must not hit the date converter)
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    timedelta: timedelta.total_seconds,
+    Decimal: float,
+    bytes: _b64encode,
+    bytearray: lambda value: _b64encode(bytes(value)),
+    memoryview: lambda value: _b64encode(value.tobytes()),
+    pd.Timestamp: pd.Timestamp.isoformat,
+    pd.Timedelta: pd.Timedelta.total_seconds,
+}
+
+
+def column_converter(column_types: set) -> Optional[Callable[[Any], Any]]:
+    """
+    Pick the converter for a column from the set of value types in it (None values excluded).
+
+    Returns:
+        None if the column needs no conversion, otherwise a function for its non-null values
+    """
+    if column_types <= _PASSTHROUGH_TYPES:
+        return None
+    value_types = column_types - {type(None)}
+    if len(value_types) == 1:
+        converter = _CONVERTERS.get(next(iter(value_types)))
+        if converter is not None:
+            return converter
+    return serialize_value
+
+
+def serialize_column(values: Sequence[Any]) -> List[Any]:
+    """Serialize one column of values with a single converter chosen for the whole column"""
+    column_types = set(map(type, values))
+    converter = column_converter(column_types)
+    if converter is None:
+        return values if isinstance(values, list) else list(values)
+    if type(None) in column_types:
+        return [None if value is None else converter(value) for value in values]
+    return list(map(converter, values))
+
+
+def serialize_columns(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[List[Any]]:
+    """Transpose rows and serialize each column; returns one value list per column"""
+    if not rows:
+        return [[] for _ in columns]
+    return [serialize_column(values) for values in zip(*rows)]
+
+
+def serialize_rows(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict]:
+    """Convert result rows to a list of {column: value} dictionaries"""
+    if not rows:
+        return []
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*serialize_columns(keys, rows))]
+
+
+def serialize_row_lists(rows: Sequence[Sequence[Any]]) -> List[List[Any]]:
+    """Serialize rows but keep each row as a list of values in column order (streaming chunks)"""
+    if not rows:
+        return []
+    return [list(row) for row in zip(*(serialize_column(values) for values in zip(*rows)))]
+
+
+def serialize_dataframe(df: pd.DataFrame) -> List[Dict]:
+    """
+    Convert a DataFrame to a list of {column: value} dictionaries.
+
+    Missing values (NaN/NaT/None) become None using one vectorized mask per column
+    instead of a pd.isna() call per cell.
+    """
+    if df.empty:
+        return []
+    column_values = []
+    for _, series in df.items():
+        if series.dtype.kind in 'iub':
+            # Integer / bool dtypes cannot hold missing values
+            column_values.append(series.tolist())
+            continue
+        values = series.astype(object).where(series.notna(), None).tolist()
+        column_values.append(serialize_column(values))
+    keys = list(df.columns)
+    return [dict(zip(keys, row)) for row in zip(*column_values)]
+
+
+# Nullable pandas dtypes for single-type columns: NULLs stay NULL instead of turning ints into floats
+_FRAME_DTYPES = {int: 'Int64', float: 'Float64', bool: 'boolean'}
+
+
+def rows_to_dataframe(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> pd.DataFrame:
+    """
+    DataFrame of result rows that keeps each column's type (for registering rows in DuckDB).
+
+    pd.DataFrame.from_records infers float64 for an integer column holding a NULL;
+    here int / float / bool columns get nullable dtypes and every other column stays
+    object, so DuckDB types it from the values (DECIMAL, DATE, TIMESTAMP, HUGEINT, ...).
+    """
+    column_values = zip(*rows) if rows else [() for _ in columns]
+    data = {}
+    for i, values in enumerate(column_values):
+        value_types = set(map(type, values)) - {type(None)}
+        dtype = _FRAME_DTYPES.get(value_types.pop()) if len(value_types) == 1 else None
+        try:
+            data[i] = pd.Series(list(values), dtype=dtype or object)
+        except (OverflowError, TypeError):
+            # Integers past int64
+            data[i] = pd.Series(list(values), dtype=object)
+    frame = pd.DataFrame(data)
+    frame.columns = list(columns)
+    return frame
@@ -0,0 +1,106 @@
+"""
+Request Coalescing (singleflight)
+Identical calls that arrive while one is already in flight wait for that
+"leader" call and share its result (or its error) instead of hitting the
+database again. Protects the database from thundering-herd dashboard loads.
+
+Keys must identify the call completely (datasource + normalized query, etc.).
+Nothing is cached: once the leader finishes, the next call runs again.
+"""
+
+from typing import Any, Callable, Dict
+import asyncio
+import os
+import threading
+
+_lock = threading.Lock()
+_calls: Dict[str, "_Call"] = {}  # key: in-flight sync call
+_async_calls: Dict[tuple, asyncio.Future] = {}  # (event loop id, key): in-flight async call
+
+
+class _Call:
+    """One in-flight call that followers wait on"""
+
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+def do(key: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run fn(*args, **kwargs) unless an identical call (same key) is already running,
+    in which case wait for it and return its result or raise its error.
+    """
+    with _lock:
+        call = _calls.get(key)
+        if call is not None:
+            call.followers += 1
+            leader = False
+        else:
+            call = _Call()
+            _calls[key] = call
+            leader = True
+
+    if not leader:
+        print(f"[SINGLEFLIGHT] ⏳ Joining in-flight call {key[:40]}")
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn(*args, **kwargs)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        if call.followers:
+            print(f"[SINGLEFLIGHT] 🤝 Shared result with {call.followers} coalesced call(s) {key[:40]}")
+        call.done.set()
+
+
+async def do_async(key: str, coro_fn: Callable, *args, **kwargs) -> Any:
+    """Async counterpart of do(): coalesces identical awaits on the same event loop"""
+    loop = asyncio.get_running_loop()
+    flight_key = (id(loop), key)
+    future = _async_calls.get(flight_key)
+    if future is not None:
+        print(f"[SINGLEFLIGHT] ⏳ Joining in-flight call {key[:40]}")
+        # shield: a cancelled follower must not cancel the leader's work
+        return await asyncio.shield(future)
+
+    future = loop.create_future()
+    _async_calls[flight_key] = future
+    try:
+        result = await coro_fn(*args, **kwargs)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark retrieved so an un-awaited failure doesn't log "exception was never retrieved"
+        future.exception()
+        raise
+    finally:
+        del _async_calls[flight_key]
+
+
+def _reset_after_fork():
+    """In-flight calls belong to the parent's threads; a forked child starts with none"""
+    global _lock
+    _lock = threading.Lock()
+    _calls.clear()
+    _async_calls.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -4,10 +4,17 @@ Queries INFORMATION_SCHEMA directly for efficient metadata retrieval
 Works efficiently with 200+ tables
 
 CONNECTION & CACHING:
-- Engines are cached globally and reused across requests (1 hour TTL)
-- Schema metadata is cached to avoid repeated introspection (5 minutes TTL)
+- Engines are shared with the other services via engine_registry (1 hour TTL)
+- Schema metadata is cached to avoid repeated introspection (5 minutes TTL); past the TTL the
+  stale entry is served while one background refresh replaces it, up to CATALOG_MAX_STALENESS
 - This prevents "disconnection" issues and improves performance
-- Use force_refresh=True to bypass cache when schema changes
+- Use force_refresh=True to bypass cache when schema changes (also drops cached query results)
+- Refreshes are incremental: only tables whose column-definition fingerprint changed are re-read
+- Cached metadata persists to a local SQLite file (CATALOG_CACHE_FILE, created 0600 in a
+  per-user directory), so restarted or sibling workers serve it without walking
+  INFORMATION_SCHEMA and revalidate it once it expires
+- PostgreSQL row counts are planner estimates (rowCountEstimated); CATALOG_EXACT_COUNT_TABLES
+  get exact counts from a budgeted background job, cached separately
 
 CRITICAL: COMPLETE METADATA
 - This service ALWAYS returns ALL columns for each table (no limits)
@@ -16,19 +23,53 @@ CRITICAL: COMPLETE METADATA
 - This ensures queries can use any column, not just the first N columns
 """
 
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import bindparam, text, inspect
+from sqlalchemy.engine import Connection
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 from schema_introspection import _normalize_connection_string
+from engine_registry import lease_engine, clear_engines
+from query_executor import invalidate_result_cache
+from query_control import running_query, QueryTimeoutError
+from replica_routing import run_read
+from serialization import serialize_value
+import singleflight
 import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
 import time
-
-# Global engine cache - reuse engines across requests
-_engine_cache: Dict[str, tuple] = {}  # key: (engine, created_at)
-_engine_cache_ttl = 3600  # Keep engines for 1 hour
+import zlib
 
 # Global schema metadata cache - avoid re-introspecting on every request
 _schema_cache: Dict[str, tuple] = {}  # key: (metadata, created_at)
 _schema_cache_ttl = 300  # Cache schema for 5 minutes
+# Past the TTL an entry is still served (while one background refresh replaces it) up to this age
+_schema_max_staleness = int(os.getenv('CATALOG_MAX_STALENESS', 3600))  # Seconds
+_revalidate_lock = threading.Lock()
+_revalidating: set = set()  # catalog cache keys with a background refresh in progress
+# Refreshes (TTL expiry or force_refresh) re-read only the columns of tables whose fingerprint changed
+_incremental_refresh = os.getenv('CATALOG_INCREMENTAL_REFRESH', 'on').lower() in ('1', 'on', 'true', 'yes')
+
+# Catalogs persist to a local SQLite file so restarts and sibling workers start warm ("off" disables).
+# It holds schema details, so it is created 0600, by default in a per-user 0700 directory
+_catalog_store_dir = os.path.join(tempfile.gettempdir(), f"analytics-catalog-{getattr(os, 'getuid', lambda: 'user')()}")
+_catalog_store_path = os.getenv('CATALOG_CACHE_FILE', os.path.join(_catalog_store_dir, 'catalog.sqlite3'))
+_catalog_store_enabled = _catalog_store_path.lower() not in ('', 'off', 'none')
+_catalog_store_ready = False
+_CATALOG_FORMAT_VERSION = 1  # Bump when the shape of the cached metadata changes: older rows are ignored
+
+# PostgreSQL catalog row counts are planner estimates; these tables also get an exact
+# COUNT(*) in the background, under a time budget per run ("table" or "schema.table")
+_exact_count_tables = [t.strip() for t in os.getenv('CATALOG_EXACT_COUNT_TABLES', '').split(',') if t.strip()]
+_exact_count_budget = float(os.getenv('CATALOG_EXACT_COUNT_BUDGET', 30))  # Seconds per run
+_exact_count_ttl = int(os.getenv('CATALOG_EXACT_COUNT_TTL', 3600))  # Seconds
+
+_exact_counts_lock = threading.Lock()
+_exact_counts: Dict[str, Dict[str, tuple]] = {}  # catalog cache key: {table: (row count, counted_at)}
+_exact_counts_running: set = set()  # catalog cache keys with a counting run in progress
 
 
 def _get_cache_key(connection_string: str, database_name: Optional[str] = None, schema_name: Optional[str] = None) -> str:
@@ -43,83 +84,197 @@ def _get_cache_key(connection_string: str, database_name: Optional[str] = None,
     return hashlib.md5(key_string.encode()).hexdigest()
 
 
-def _get_cached_engine(connection_string: str):
-    """Get cached engine or create new one"""
-    cache_key = _get_cache_key(connection_string)
-    current_time = time.time()
-    
-    # Check if we have a cached engine that's still valid
-    if cache_key in _engine_cache:
-        engine, created_at = _engine_cache[cache_key]
-        if current_time - created_at < _engine_cache_ttl:
-            print(f"[SYSTEM-CATALOG] ✅ Using cached engine (age: {int(current_time - created_at)}s)")
-            return engine
-        else:
-            # Engine expired, dispose it
-            print(f"[SYSTEM-CATALOG] ⏰ Engine cache expired, disposing old engine")
-            try:
-                engine.dispose()
-            except:
-                pass
-            del _engine_cache[cache_key]
-    
-    # Create new engine
-    print(f"[SYSTEM-CATALOG] 🔄 Creating new engine (not cached)")
-    normalized_connection_string = _normalize_connection_string(connection_string)
-    engine = _create_engine_with_pooling(normalized_connection_string)
-    _engine_cache[cache_key] = (engine, current_time)
-    return engine
+def _prepare_catalog_store():
+    """
+    Create the store's directory (0700) and file (0600) before SQLite does with the default umask.
+
+    Raises:
+        OSError: the directory can't be created, or the default one belongs to another user
+    """
+    global _catalog_store_ready
+    if _catalog_store_ready:
+        return
+    directory = os.path.dirname(os.path.abspath(_catalog_store_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if directory == os.path.abspath(_catalog_store_dir) and hasattr(os, 'getuid') \
+            and os.stat(directory).st_uid != os.getuid():
+        raise PermissionError(f"{directory} belongs to another user")
+    # O_CREAT without O_TRUNC: an existing store is left as it is (the WAL files SQLite adds copy its mode)
+    os.close(os.open(_catalog_store_path, os.O_RDWR | os.O_CREAT, 0o600))
+    _catalog_store_ready = True
+
+
+@contextmanager
+def _catalog_store():
+    """Open the persistent catalog store (one short-lived SQLite connection per use, safe across workers)"""
+    _prepare_catalog_store()
+    store = sqlite3.connect(_catalog_store_path, timeout=5)
+    try:
+        store.execute("PRAGMA journal_mode=WAL")
+        store.execute("""
+            CREATE TABLE IF NOT EXISTS catalog (
+                cache_key TEXT PRIMARY KEY,
+                format_version INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                metadata BLOB NOT NULL
+            )
+        """)
+        yield store
+        store.commit()
+    finally:
+        store.close()
+
+
+def _load_persisted_metadata(cache_key: str, newer_than: Optional[float] = None) -> Optional[tuple]:
+    """(metadata, fetched_at) from the persistent store, or None (also when it is not newer than newer_than)"""
+    if not _catalog_store_enabled:
+        return None
+    try:
+        with _catalog_store() as store:
+            # fetched_at is compared first: the blob of a row that is not newer is never read
+            row = store.execute(
+                "SELECT fetched_at, metadata FROM catalog WHERE cache_key = ? AND format_version = ? AND fetched_at > ?",
+                (cache_key, _CATALOG_FORMAT_VERSION, -1.0 if newer_than is None else newer_than)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[1])), row[0]
+    except (sqlite3.Error, OSError, zlib.error, ValueError) as e:
+        print(f"[SYSTEM-CATALOG] ⚠️ Could not read persisted schema metadata: {e}")
+        return None
+
+
+def _persist_metadata(cache_key: str, metadata: Dict, fetched_at: float):
+    """Write metadata to the persistent store unless a newer copy is already there"""
+    if not _catalog_store_enabled:
+        return
+    try:
+        blob = zlib.compress(json.dumps(metadata, default=serialize_value).encode())
+        with _catalog_store() as store:
+            store.execute("""
+                INSERT INTO catalog (cache_key, format_version, fetched_at, metadata) VALUES (?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    format_version = excluded.format_version,
+                    fetched_at = excluded.fetched_at,
+                    metadata = excluded.metadata
+                WHERE excluded.fetched_at >= catalog.fetched_at OR catalog.format_version != excluded.format_version
+            """, (cache_key, _CATALOG_FORMAT_VERSION, fetched_at, blob))
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        print(f"[SYSTEM-CATALOG] ⚠️ Could not persist schema metadata: {e}")
+
+
+def _cached_entry(cache_key: str) -> Optional[tuple]:
+    """
+    (metadata, created_at) for a catalog, from memory or the persistent store.
+
+    The store is read only on a miss or once the in-memory copy has expired, and wins when it is
+    newer: after a restart, or when a sibling worker already refreshed this catalog.
+    """
+    entry = _schema_cache.get(cache_key)
+    if entry is None or time.time() - entry[1] >= _schema_cache_ttl:
+        persisted = _load_persisted_metadata(cache_key, entry[1] if entry else None)
+        if persisted:
+            print(f"[SYSTEM-CATALOG] 📂 Loaded persisted schema metadata (age: {int(time.time() - persisted[1])}s)")
+            entry = _schema_cache[cache_key] = persisted
+    return entry
+
 
+def _catalog_flight_key(connection_string: str, database_name: Optional[str], schema_name: Optional[str], include_system_tables: bool) -> str:
+    """Singleflight key shared by every fetch of one catalog (sync, async and background)"""
+    return f"catalog:{_get_cache_key(connection_string, database_name, schema_name)}:{include_system_tables}"
 
-def _get_cached_schema_metadata(connection_string: str, database_name: Optional[str] = None, schema_name: Optional[str] = None):
-    """Get cached schema metadata or return None"""
+
+def _get_cached_schema_metadata(
+    connection_string: str,
+    database_name: Optional[str] = None,
+    schema_name: Optional[str] = None,
+    include_system_tables: bool = False
+):
+    """
+    Get cached schema metadata or return None.
+
+    An entry past the TTL but within CATALOG_MAX_STALENESS is still returned (stale-while-revalidate)
+    and a background refresh swaps in the new metadata; older entries return None for a blocking fetch.
+    """
     cache_key = _get_cache_key(connection_string, database_name, schema_name)
+    entry = _cached_entry(cache_key)
     current_time = time.time()
     
-    if cache_key in _schema_cache:
-        metadata, created_at = _schema_cache[cache_key]
-        if current_time - created_at < _schema_cache_ttl:
-            print(f"[SYSTEM-CATALOG] ✅ Using cached schema metadata (age: {int(current_time - created_at)}s, {len(metadata.get('tables', []))} tables)")
+    if entry is not None:
+        metadata, created_at = entry
+        age = current_time - created_at
+        if age < _schema_cache_ttl:
+            print(f"[SYSTEM-CATALOG] ✅ Using cached schema metadata (age: {int(age)}s, {len(metadata.get('tables', []))} tables)")
+            return metadata
+        elif age < _schema_max_staleness:
+            print(f"[SYSTEM-CATALOG] ⏳ Serving stale schema metadata (age: {int(age)}s) while it refreshes")
+            _revalidate_in_background(connection_string, database_name, schema_name, include_system_tables)
             return metadata
         else:
-            # Schema expired
+            # Schema expired (kept as the baseline of the incremental refresh that replaces it)
             print(f"[SYSTEM-CATALOG] ⏰ Schema cache expired")
-            del _schema_cache[cache_key]
     
     return None
 
 
+def _revalidate_in_background(
+    connection_string: str,
+    database_name: Optional[str],
+    schema_name: Optional[str],
+    include_system_tables: bool
+):
+    """Start one background refresh of a stale catalog (the cache entry is replaced when it lands)"""
+    cache_key = _get_cache_key(connection_string, database_name, schema_name)
+    with _revalidate_lock:
+        if cache_key in _revalidating:
+            return
+        _revalidating.add(cache_key)
+    
+    def run():
+        try:
+            singleflight.do(
+                _catalog_flight_key(connection_string, database_name, schema_name, include_system_tables),
+                _fetch_catalog_metadata,
+                connection_string,
+                database_name,
+                schema_name,
+                include_system_tables
+            )
+        except Exception as e:
+            # Keep serving the stale entry; a blocking fetch takes over past CATALOG_MAX_STALENESS
+            print(f"[SYSTEM-CATALOG] ⚠️ Background schema refresh failed: {e}")
+        finally:
+            with _revalidate_lock:
+                _revalidating.discard(cache_key)
+    
+    threading.Thread(target=run, name="catalog-revalidate", daemon=True).start()
+
+
+def _previous_schema_metadata(connection_string: str, database_name: Optional[str] = None, schema_name: Optional[str] = None):
+    """Cached metadata of any age to refresh incrementally from, or None"""
+    if not _incremental_refresh:
+        return None
+    entry = _cached_entry(_get_cache_key(connection_string, database_name, schema_name))
+    return entry[0] if entry else None
+
+
 def _cache_schema_metadata(connection_string: str, metadata: Dict, database_name: Optional[str] = None, schema_name: Optional[str] = None):
     """Cache schema metadata"""
     cache_key = _get_cache_key(connection_string, database_name, schema_name)
-    _schema_cache[cache_key] = (metadata, time.time())
+    fetched_at = time.time()
+    _schema_cache[cache_key] = (metadata, fetched_at)
+    _persist_metadata(cache_key, metadata, fetched_at)
     print(f"[SYSTEM-CATALOG] 💾 Cached schema metadata ({len(metadata.get('tables', []))} tables)")
 
 
-def _create_engine_with_pooling(connection_string: str):
-    """
-    Creates a SQLAlchemy engine with connection pooling and timeout settings.
-    This prevents connection exhaustion and handles transient failures.
-    
-    Args:
-        connection_string: Normalized database connection string
-        
-    Returns:
-        SQLAlchemy Engine instance with pooling configured
-    """
-    return create_engine(
-        connection_string,
-        pool_size=5,  # Number of connections to maintain
-        max_overflow=10,  # Additional connections beyond pool_size
-        pool_timeout=30,  # Seconds to wait for connection from pool
-        pool_recycle=3600,  # Recycle connections after 1 hour
-        pool_pre_ping=True,  # Verify connections before using (detects stale connections)
-        connect_args={
-            'connect_timeout': 10,  # Connection timeout in seconds
-            'read_timeout': 30,  # Read timeout in seconds
-            'write_timeout': 30,  # Write timeout in seconds
-        } if 'mysql' in connection_string else {}
-    )
+@contextmanager
+def _connect(connectable):
+    """Yield a connection from an Engine, or an already-open Connection as-is (async run_sync path)"""
+    if isinstance(connectable, Connection):
+        yield connectable
+    else:
+        with connectable.connect() as conn:
+            yield conn
 
 
 def detect_database_type(connection_string: str) -> str:
@@ -134,91 +289,141 @@ def detect_database_type(connection_string: str) -> str:
     return 'unknown'
 
 
+def _group_by_table(rows) -> Dict[str, List[tuple]]:
+    """Column rows (table name first) grouped per table, table name dropped, order kept"""
+    grouped: Dict[str, List[tuple]] = {}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(tuple(row[1:]))
+    return grouped
+
+
+def _tables_to_fetch(tables_result, previous: Optional[Dict]) -> tuple:
+    """
+    Compare table fingerprints (last column of each tables row) against a previous catalog.
+
+    Returns:
+        (previous tables by name, set of names whose columns must be re-read or None for all of them)
+    """
+    if not previous:
+        return {}, None
+    previous_tables = {t["name"]: t for t in previous.get("tables", [])}
+    changed = [
+        row[0] for row in tables_result
+        if row[-1] is None or previous_tables.get(row[0], {}).get("fingerprint") != row[-1]
+    ]
+    changed = set(changed)
+    removed = len(set(previous_tables) - {row[0] for row in tables_result})
+    print(f"[SYSTEM-CATALOG] 🔄 Incremental refresh: {len(changed)}/{len(tables_result)} tables changed, {removed} removed")
+    return previous_tables, changed
+
+
+def _fetch_columns(conn, columns_sql: str, params: Dict, table_column: str, changed: Optional[set]) -> Dict[str, List[tuple]]:
+    """Run the bulk columns query for the whole schema, only the changed tables, or not at all"""
+    if changed is not None and not changed:
+        return {}
+    if changed is None:
+        columns_query = text(columns_sql.format(table_filter=""))
+    else:
+        columns_query = text(columns_sql.format(table_filter=f"AND {table_column} IN :changed_tables")).bindparams(
+            bindparam("changed_tables", expanding=True)
+        )
+        params = {**params, "changed_tables": sorted(changed)}
+    return _group_by_table(conn.execute(columns_query, params))
+
+
 def query_system_catalog_mysql(
     engine,
     database_name: Optional[str] = None,
-    include_system_tables: bool = False
+    include_system_tables: bool = False,
+    previous: Optional[Dict] = None
 ) -> Dict:
-    """Query MySQL INFORMATION_SCHEMA"""
+    """
+    Query MySQL INFORMATION_SCHEMA (engine may also be an open Connection).
+
+    With a previous catalog of the same schema, only tables whose fingerprint (CREATE_TIME plus a
+    checksum of the column definitions) changed have their columns re-read; the rest are reused.
+    """
     tables_metadata = []
     
-    with engine.connect() as conn:
+    with _connect(engine) as conn:
         # Get database name from connection if not provided
         if not database_name:
             result = conn.execute(text("SELECT DATABASE()"))
             database_name = result.scalar()
         
-        # Query INFORMATION_SCHEMA.TABLES
-        tables_query = text("""
+        # Query INFORMATION_SCHEMA.TABLES, with a per-table fingerprint of its column definitions
+        table_type_filter = "" if include_system_tables else "AND t.TABLE_TYPE = 'BASE TABLE'"
+        tables_query = text(f"""
             SELECT 
-                TABLE_NAME,
-                TABLE_COMMENT,
-                TABLE_ROWS,
-                DATA_LENGTH + INDEX_LENGTH as TABLE_SIZE
-            FROM INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_SCHEMA = :db_name
-        """)
-        
-        if not include_system_tables:
-            tables_query = text("""
+                t.TABLE_NAME,
+                t.TABLE_COMMENT,
+                t.TABLE_ROWS,
+                t.DATA_LENGTH + t.INDEX_LENGTH as TABLE_SIZE,
+                CONCAT_WS(':', t.CREATE_TIME, f.COLUMN_COUNT, f.COLUMN_CHECKSUM) as FINGERPRINT
+            FROM INFORMATION_SCHEMA.TABLES t
+            LEFT JOIN (
                 SELECT 
                     TABLE_NAME,
-                    TABLE_COMMENT,
-                    TABLE_ROWS,
-                    DATA_LENGTH + INDEX_LENGTH as TABLE_SIZE
-                FROM INFORMATION_SCHEMA.TABLES
+                    COUNT(*) as COLUMN_COUNT,
+                    SUM(CRC32(CONCAT_WS('|', ORDINAL_POSITION, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE,
+                                        COLUMN_KEY, COALESCE(COLUMN_DEFAULT, '<null>'), COLUMN_COMMENT))) as COLUMN_CHECKSUM
+                FROM INFORMATION_SCHEMA.COLUMNS
                 WHERE TABLE_SCHEMA = :db_name
-                AND TABLE_TYPE = 'BASE TABLE'
-            """)
+                GROUP BY TABLE_NAME
+            ) f ON f.TABLE_NAME = t.TABLE_NAME
+            WHERE t.TABLE_SCHEMA = :db_name
+            {table_type_filter}
+        """)
+        
+        tables_result = conn.execute(tables_query, {"db_name": database_name}).fetchall()
+        previous_tables, changed = _tables_to_fetch(tables_result, previous)
         
-        tables_result = conn.execute(tables_query, {"db_name": database_name})
+        # All columns of the schema (or of the changed tables) in one round trip, grouped per table below
+        columns_by_table = _fetch_columns(conn, """
+            SELECT 
+                TABLE_NAME,
+                COLUMN_NAME,
+                DATA_TYPE,
+                IS_NULLABLE,
+                COLUMN_KEY,
+                COLUMN_DEFAULT,
+                COLUMN_COMMENT,
+                ORDINAL_POSITION
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = :db_name
+            {table_filter}
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, {"db_name": database_name}, "TABLE_NAME", changed)
         
         for table_row in tables_result:
             table_name = table_row[0]
             table_comment = table_row[1] or f"Table {table_name}"
             row_count = table_row[2] or 0
             table_size = table_row[3] or 0
+            fingerprint = table_row[4]
             
-            # Query columns for this table
-            columns_query = text("""
-                SELECT 
-                    COLUMN_NAME,
-                    DATA_TYPE,
-                    IS_NULLABLE,
-                    COLUMN_KEY,
-                    COLUMN_DEFAULT,
-                    COLUMN_COMMENT,
-                    ORDINAL_POSITION
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = :db_name
-                AND TABLE_NAME = :table_name
-                ORDER BY ORDINAL_POSITION
-            """)
-            
-            columns_result = conn.execute(
-                columns_query,
-                {"db_name": database_name, "table_name": table_name}
-            )
-            
-            columns_metadata = []
-            column_count = 0
-            for col_row in columns_result:
-                col_name, data_type, is_nullable, col_key, col_default, col_comment, ordinal = col_row
+            if changed is not None and table_name not in changed:
+                columns_metadata = previous_tables[table_name]["columns"]
+            else:
+                columns_metadata = []
+                column_count = 0
+                for col_row in columns_by_table.get(table_name, ()):
+                    col_name, data_type, is_nullable, col_key, col_default, col_comment, ordinal = col_row
+                    
+                    columns_metadata.append({
+                        "name": col_name,
+                        "type": data_type,
+                        "description": col_comment or f"Column {col_name} ({data_type})",
+                        "isNullable": is_nullable == "YES",
+                        "isPrimaryKey": col_key == "PRI",
+                        "defaultValue": col_default,
+                        "ordinalPosition": ordinal,
+                    })
+                    column_count += 1
                 
-                columns_metadata.append({
-                    "name": col_name,
-                    "type": data_type,
-                    "description": col_comment or f"Column {col_name} ({data_type})",
-                    "isNullable": is_nullable == "YES",
-                    "isPrimaryKey": col_key == "PRI",
-                    "defaultValue": col_default,
-                    "ordinalPosition": ordinal,
-                })
-                column_count += 1
-            
-            # Log column count for debugging (ensure ALL columns are fetched)
-            if column_count > 0:
-                print(f"[SYSTEM-CATALOG] Table {table_name}: {column_count} columns fetched (COMPLETE)")
+                # Log column count for debugging (ensure ALL columns are fetched)
+                if column_count > 0:
+                    print(f"[SYSTEM-CATALOG] Table {table_name}: {column_count} columns fetched (COMPLETE)")
             
             tables_metadata.append({
                 "name": table_name,
@@ -226,6 +431,7 @@ def query_system_catalog_mysql(
                 "columns": columns_metadata,  # ALL columns - no limits
                 "rowCount": row_count,
                 "sizeBytes": table_size,
+                "fingerprint": fingerprint,
             })
     
     return {
@@ -237,94 +443,104 @@ def query_system_catalog_mysql(
 def query_system_catalog_postgresql(
     engine,
     schema_name: Optional[str] = None,
-    include_system_tables: bool = False
+    include_system_tables: bool = False,
+    previous: Optional[Dict] = None
 ) -> Dict:
-    """Query PostgreSQL information_schema"""
+    """
+    Query PostgreSQL information_schema (engine may also be an open Connection).
+
+    With a previous catalog of the same schema, only tables whose fingerprint (an md5 over their
+    pg_attribute rows and column defaults) changed have their columns re-read; the rest are reused.
+    """
     tables_metadata = []
     schema_name = schema_name or "public"
     
-    with engine.connect() as conn:
-        # Query information_schema.tables
-        tables_query = text("""
+    with _connect(engine) as conn:
+        # Row counts are planner estimates (reltuples, or n_live_tup before the first ANALYZE):
+        # COUNT(*) per table reads every heap page of the schema
+        table_type_filter = "" if include_system_tables else "AND table_type = 'BASE TABLE'"
+        tables_query = text(f"""
             SELECT 
                 table_name,
-                obj_description(c.oid, 'pg_class') as table_comment
+                obj_description(c.oid, 'pg_class') as table_comment,
+                CASE WHEN c.reltuples > 0 THEN c.reltuples::bigint
+                     ELSE COALESCE(s.n_live_tup, 0) END as row_estimate,
+                pg_total_relation_size(c.oid) as size_bytes,
+                f.fingerprint
             FROM information_schema.tables t
             JOIN pg_class c ON c.relname = t.table_name
             JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = :schema_name
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            LEFT JOIN LATERAL (
+                SELECT md5(string_agg(
+                    a.attnum || ':' || a.attname || ':' || a.atttypid || ':' || a.atttypmod || ':' ||
+                    a.attnotnull || ':' || COALESCE(pg_get_expr(d.adbin, d.adrelid), '<null>'),
+                    ',' ORDER BY a.attnum
+                )) as fingerprint
+                FROM pg_attribute a
+                LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            ) f ON true
             WHERE table_schema = :schema_name
+            {table_type_filter}
         """)
         
-        if not include_system_tables:
-            tables_query = text("""
-                SELECT 
-                    table_name,
-                    obj_description(c.oid, 'pg_class') as table_comment
-                FROM information_schema.tables t
-                JOIN pg_class c ON c.relname = t.table_name
-                JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = :schema_name
-                WHERE table_schema = :schema_name
-                AND table_type = 'BASE TABLE'
-            """)
+        tables_result = conn.execute(tables_query, {"schema_name": schema_name}).fetchall()
+        previous_tables, changed = _tables_to_fetch(tables_result, previous)
         
-        tables_result = conn.execute(tables_query, {"schema_name": schema_name})
+        # All columns of the schema (or of the changed tables) in one round trip, grouped per table below
+        columns_by_table = _fetch_columns(conn, """
+            SELECT 
+                table_name,
+                column_name,
+                data_type,
+                is_nullable,
+                column_default,
+                ordinal_position
+            FROM information_schema.columns
+            WHERE table_schema = :schema_name
+            {table_filter}
+            ORDER BY table_name, ordinal_position
+        """, {"schema_name": schema_name}, "table_name", changed)
         
         for table_row in tables_result:
             table_name = table_row[0]
             table_comment = table_row[1] or f"Table {table_name}"
+            row_count = int(table_row[2] or 0)
+            table_size = table_row[3] or 0
+            fingerprint = table_row[4]
             
-            # Get row count
-            count_query = text(f'SELECT COUNT(*) FROM "{schema_name}"."{table_name}"')
-            try:
-                row_count = conn.execute(count_query).scalar()
-            except:
-                row_count = 0
-            
-            # Query columns
-            columns_query = text("""
-                SELECT 
-                    column_name,
-                    data_type,
-                    is_nullable,
-                    column_default,
-                    ordinal_position
-                FROM information_schema.columns
-                WHERE table_schema = :schema_name
-                AND table_name = :table_name
-                ORDER BY ordinal_position
-            """)
-            
-            columns_result = conn.execute(
-                columns_query,
-                {"schema_name": schema_name, "table_name": table_name}
-            )
-            
-            columns_metadata = []
-            column_count = 0
-            for col_row in columns_result:
-                col_name, data_type, is_nullable, col_default, ordinal = col_row
+            if changed is not None and table_name not in changed:
+                columns_metadata = previous_tables[table_name]["columns"]
+            else:
+                columns_metadata = []
+                column_count = 0
+                for col_row in columns_by_table.get(table_name, ()):
+                    col_name, data_type, is_nullable, col_default, ordinal = col_row
+                    
+                    columns_metadata.append({
+                        "name": col_name,
+                        "type": data_type,
+                        "description": f"Column {col_name} ({data_type})",
+                        "isNullable": is_nullable == "YES",
+                        "isPrimaryKey": False,  # Would need separate query for PKs
+                        "defaultValue": col_default,
+                        "ordinalPosition": ordinal,
+                    })
+                    column_count += 1
                 
-                columns_metadata.append({
-                    "name": col_name,
-                    "type": data_type,
-                    "description": f"Column {col_name} ({data_type})",
-                    "isNullable": is_nullable == "YES",
-                    "isPrimaryKey": False,  # Would need separate query for PKs
-                    "defaultValue": col_default,
-                    "ordinalPosition": ordinal,
-                })
-                column_count += 1
-            
-            # Log column count for debugging (ensure ALL columns are fetched)
-            if column_count > 0:
-                print(f"[SYSTEM-CATALOG] Table {table_name}: {column_count} columns fetched (COMPLETE)")
+                # Log column count for debugging (ensure ALL columns are fetched)
+                if column_count > 0:
+                    print(f"[SYSTEM-CATALOG] Table {table_name}: {column_count} columns fetched (COMPLETE)")
             
             tables_metadata.append({
                 "name": table_name,
                 "description": table_comment,
                 "columns": columns_metadata,  # ALL columns - no limits
                 "rowCount": row_count,
-                "sizeBytes": 0,  # Would need pg_total_relation_size query
+                "rowCountEstimated": True,  # Until an exact count (CATALOG_EXACT_COUNT_TABLES) lands
+                "sizeBytes": table_size,
+                "fingerprint": fingerprint,
             })
     
     return {
@@ -333,6 +549,104 @@ def query_system_catalog_postgresql(
     }
 
 
+def _exact_count_candidates(metadata: Dict, schema_name: str) -> List[str]:
+    """Configured tables present in this catalog, in configured order"""
+    present = {t["name"] for t in metadata.get("tables", [])}
+    candidates = []
+    for entry in _exact_count_tables:
+        schema, _, table = entry.rpartition('.')
+        if (not schema or schema == schema_name) and table in present and table not in candidates:
+            candidates.append(table)
+    return candidates
+
+
+def _apply_exact_counts(cache_key: str, metadata: Dict):
+    """Replace row estimates with exact counts that are still fresh"""
+    now = time.time()
+    with _exact_counts_lock:
+        counts = dict(_exact_counts.get(cache_key, {}))
+    for table in metadata.get("tables", []):
+        counted = counts.get(table["name"])
+        if counted and now - counted[1] < _exact_count_ttl:
+            table["rowCount"] = counted[0]
+            table["rowCountEstimated"] = False
+
+
+def _count_exact_rows(connection_string: str, schema_name: str, cache_key: str, tables: List[str]):
+    """Background job: COUNT(*) the given tables (on a replica when there is one) until the budget runs out"""
+    deadline = time.time() + _exact_count_budget
+    counted = 0
+    try:
+        for table_name in tables:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            def run(target: str):
+                with lease_engine(target) as engine, engine.connect() as conn, \
+                        running_query(conn, target, None, remaining):
+                    quote = engine.dialect.identifier_preparer.quote
+                    return conn.execute(text(f"SELECT COUNT(*) FROM {quote(schema_name)}.{quote(table_name)}")).scalar()
+
+            try:
+                row_count = run_read(connection_string, run)
+            except QueryTimeoutError:
+                break
+            except Exception as e:
+                print(f"[SYSTEM-CATALOG] ⚠️ Exact row count failed for {table_name}: {e}")
+                continue
+            with _exact_counts_lock:
+                _exact_counts.setdefault(cache_key, {})[table_name] = (int(row_count or 0), time.time())
+            counted += 1
+    finally:
+        with _exact_counts_lock:
+            _exact_counts_running.discard(cache_key)
+    print(f"[SYSTEM-CATALOG] 🔢 Exact row counts: {counted}/{len(tables)} tables within {_exact_count_budget:.0f}s budget")
+
+    # Patch the catalog served from cache in place
+    cached = _schema_cache.get(cache_key)
+    if cached:
+        _apply_exact_counts(cache_key, cached[0])
+
+
+def _schedule_exact_counts(connection_string: str, metadata: Dict, cache_key: str, schema_name: str):
+    """Start a counting run for configured tables whose exact count is missing or stale"""
+    now = time.time()
+    with _exact_counts_lock:
+        if cache_key in _exact_counts_running:
+            return
+        counts = _exact_counts.get(cache_key, {})
+        stale = [
+            table for table in _exact_count_candidates(metadata, schema_name)
+            if table not in counts or now - counts[table][1] >= _exact_count_ttl
+        ]
+        if not stale:
+            return
+        _exact_counts_running.add(cache_key)
+    threading.Thread(
+        target=_count_exact_rows,
+        args=(connection_string, schema_name, cache_key, stale),
+        name="catalog-exact-counts",
+        daemon=True
+    ).start()
+
+
+def _store_catalog_metadata(connection_string: str, metadata: Dict, database_name: Optional[str], schema_name: Optional[str]):
+    """Cache freshly fetched catalog metadata (shared by the sync and async fetch paths)"""
+    if _exact_count_tables and detect_database_type(connection_string) == 'postgresql':
+        cache_key = _get_cache_key(connection_string, database_name, schema_name)
+        _apply_exact_counts(cache_key, metadata)
+        _schedule_exact_counts(connection_string, metadata, cache_key, schema_name or "public")
+    
+    # Cache the metadata
+    _cache_schema_metadata(connection_string, metadata, database_name, schema_name)
+    
+    # Log total columns fetched to ensure completeness
+    total_tables = len(metadata.get('tables', []))
+    total_columns = sum(len(t.get('columns', [])) for t in metadata.get('tables', []))
+    print(f"[SYSTEM-CATALOG] ✅ Complete metadata fetched: {total_tables} tables, {total_columns} total columns (ALL columns included)")
+
+
 def get_system_catalog_metadata(
     connection_string: str,
     database_name: Optional[str] = None,
@@ -353,32 +667,47 @@ def get_system_catalog_metadata(
     """
     # Check cache first (unless force_refresh is True)
     if not force_refresh:
-        cached_metadata = _get_cached_schema_metadata(connection_string, database_name, schema_name)
+        cached_metadata = _get_cached_schema_metadata(connection_string, database_name, schema_name, include_system_tables)
         if cached_metadata:
             return cached_metadata
+    else:
+        # Schema may have changed - cached query results for this datasource are suspect too
+        invalidate_result_cache(connection_string)
     
+    # Concurrent fetches of the same catalog share one walk of INFORMATION_SCHEMA
+    return singleflight.do(
+        _catalog_flight_key(connection_string, database_name, schema_name, include_system_tables),
+        _fetch_catalog_metadata,
+        connection_string,
+        database_name,
+        schema_name,
+        include_system_tables
+    )
+
+
+def _fetch_catalog_metadata(
+    connection_string: str,
+    database_name: Optional[str],
+    schema_name: Optional[str],
+    include_system_tables: bool
+) -> Dict:
+    """Walk the system catalog and cache the result"""
     db_type = detect_database_type(connection_string)
     
-    # Use cached engine or create new one
-    engine = _get_cached_engine(connection_string)
+    previous = _previous_schema_metadata(connection_string, database_name, schema_name)
     
     if db_type == 'mysql':
-        metadata = query_system_catalog_mysql(engine, database_name, include_system_tables)
+        with lease_engine(connection_string) as engine:
+            metadata = query_system_catalog_mysql(engine, database_name, include_system_tables, previous)
     elif db_type == 'postgresql':
-        metadata = query_system_catalog_postgresql(engine, schema_name, include_system_tables)
+        with lease_engine(connection_string) as engine:
+            metadata = query_system_catalog_postgresql(engine, schema_name, include_system_tables, previous)
     else:
         # Fallback to SQLAlchemy introspection
         from schema_introspection import introspect_sql_schema
         metadata = introspect_sql_schema(connection_string, schema_name)
     
-    # Cache the metadata
-    _cache_schema_metadata(connection_string, metadata, database_name, schema_name)
-    
-    # Log total columns fetched to ensure completeness
-    total_tables = len(metadata.get('tables', []))
-    total_columns = sum(len(t.get('columns', [])) for t in metadata.get('tables', []))
-    print(f"[SYSTEM-CATALOG] ✅ Complete metadata fetched: {total_tables} tables, {total_columns} total columns (ALL columns included)")
-    
+    _store_catalog_metadata(connection_string, metadata, database_name, schema_name)
     return metadata
 
 
@@ -391,45 +720,45 @@ def get_tables_metadata(
     """Get metadata for specific tables only"""
     db_type = detect_database_type(connection_string)
     
-    # Use cached engine or create new one
-    engine = _get_cached_engine(connection_string)
-    inspector = inspect(engine)
-    
     tables_metadata = []
     
-    for table_name in table_names:
-        try:
-            columns_metadata = []
-            columns = inspector.get_columns(table_name, schema=schema_name)
-            
-            column_count = 0
-            for column in columns:
-                columns_metadata.append({
-                    "name": column["name"],
-                    "type": str(column["type"]),
-                    "description": f"Column {column['name']} of type {column['type']}",
-                })
-                column_count += 1
-            
-            # Log column count for debugging (ensure ALL columns are fetched)
-            if column_count > 0:
-                print(f"[SYSTEM-CATALOG] Table {table_name}: {column_count} columns fetched (COMPLETE)")
-            
-            table_comment = None
+    # Lease the shared engine for the duration of the inspection
+    with lease_engine(connection_string) as engine:
+        inspector = inspect(engine)
+        
+        for table_name in table_names:
             try:
-                table_info = inspector.get_table_comment(table_name, schema=schema_name)
-                table_comment = table_info.get("text") if table_info else None
-            except:
-                pass
-            
-            tables_metadata.append({
-                "name": table_name,
-                "description": table_comment or f"Table {table_name}",
-                "columns": columns_metadata  # ALL columns - no limits
-            })
-        except Exception as e:
-            print(f"[SYSTEM-CATALOG] Error getting metadata for {table_name}: {e}")
-            continue
+                columns_metadata = []
+                columns = inspector.get_columns(table_name, schema=schema_name)
+                
+                column_count = 0
+                for column in columns:
+                    columns_metadata.append({
+                        "name": column["name"],
+                        "type": str(column["type"]),
+                        "description": f"Column {column['name']} of type {column['type']}",
+                    })
+                    column_count += 1
+                
+                # Log column count for debugging (ensure ALL columns are fetched)
+                if column_count > 0:
+                    print(f"[SYSTEM-CATALOG] Table {table_name}: {column_count} columns fetched (COMPLETE)")
+                
+                table_comment = None
+                try:
+                    table_info = inspector.get_table_comment(table_name, schema=schema_name)
+                    table_comment = table_info.get("text") if table_info else None
+                except:
+                    pass
+                
+                tables_metadata.append({
+                    "name": table_name,
+                    "description": table_comment or f"Table {table_name}",
+                    "columns": columns_metadata  # ALL columns - no limits
+                })
+            except Exception as e:
+                print(f"[SYSTEM-CATALOG] Error getting metadata for {table_name}: {e}")
+                continue
     
     return tables_metadata
 
@@ -443,11 +772,9 @@ def get_table_statistics(
     """Get table statistics (row counts, sizes)"""
     db_type = detect_database_type(connection_string)
     
-    # Use cached engine or create new one
-    engine = _get_cached_engine(connection_string)
     statistics = {}
     
-    with engine.connect() as conn:
+    with lease_engine(connection_string) as engine, engine.connect() as conn:
         if db_type == 'mysql':
             if not database_name:
                 result = conn.execute(text("SELECT DATABASE()"))
@@ -531,12 +858,9 @@ def validate_table_exists(
     """Check if table exists in database"""
     db_type = detect_database_type(connection_string)
     
-    # Use cached engine or create new one
-    engine = _get_cached_engine(connection_string)
-    inspector = inspect(engine)
-    
     try:
-        tables = inspector.get_table_names(schema=schema_name)
+        with lease_engine(connection_string) as engine:
+            tables = inspect(engine).get_table_names(schema=schema_name)
         return table_name in tables
     except:
         return False
@@ -544,13 +868,7 @@ def validate_table_exists(
 
 def clear_engine_cache():
     """Clear all cached engines (useful for testing or when connections change)"""
-    global _engine_cache
-    for cache_key, (engine, _) in list(_engine_cache.items()):
-        try:
-            engine.dispose()
-        except:
-            pass
-    _engine_cache.clear()
+    clear_engines()
     print("[SYSTEM-CATALOG] 🗑️ Engine cache cleared")
 
 
@@ -558,5 +876,23 @@ def clear_schema_cache():
     """Clear all cached schema metadata (useful when schema changes)"""
     global _schema_cache
     _schema_cache.clear()
+    if _catalog_store_enabled:
+        try:
+            with _catalog_store() as store:
+                store.execute("DELETE FROM catalog")
+        except (sqlite3.Error, OSError) as e:
+            print(f"[SYSTEM-CATALOG] ⚠️ Could not clear persisted schema metadata: {e}")
     print("[SYSTEM-CATALOG] 🗑️ Schema cache cleared")
 
+
+def _reset_after_fork():
+    # The counting / refresh threads don't survive fork: the child starts its own on the next fetch
+    global _exact_counts_lock, _revalidate_lock
+    _exact_counts_lock = threading.Lock()
+    _exact_counts_running.clear()
+    _revalidate_lock = threading.Lock()
+    _revalidating.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
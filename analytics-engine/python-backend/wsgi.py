@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production serving
+
+Run with a pre-fork multi-worker server (Linux/macOS):
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`python api_server.py` starts the single-process development server instead.
+"""
+
+from api_server import app
+
+__all__ = ["app"]